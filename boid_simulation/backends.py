@@ -0,0 +1,351 @@
+"""
+Interchangeable engines for the simulation step.
+
+Every backend advances the same SwarmState (plain NumPy arrays) with the
+rules of Boid in boidfinalwobstacles.py:
+
+    object  the reference implementation, Simulation.update over Boid objects
+    numpy   a vectorized engine that finds neighbours through a uniform grid
+            of cells as large as the largest radius, so the step costs
+            O(n * neighbours) instead of O(n^2) per flock
+
+Backends are created by name with create_backend(), and BACKENDS lists
+the registered ones, so benchmarks and equivalence checks can loop over all
+of them.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+# Force weights used by Boid.apply_flocking and Boid.apply_avoidance
+SEPARATION_WEIGHT = 1.5
+ALIGNMENT_WEIGHT = 1.0
+COHESION_WEIGHT = 1.0
+AVOID_WEIGHT = 3.0
+AVOID_BUFFER = 20  # Extra clearance around obstacles, beyond the boid's size
+
+# ------------------------------
+# Swarm State Class
+# ------------------------------
+class SwarmState:
+    """
+    Simulation state as arrays. Per boid: positions and velocities (n, 2)
+    and flock_index (n,) into the per-flock arrays max_speed, max_force and
+    size. Obstacles are obstacle_positions (m, 2) and obstacle_radius (m,).
+    """
+    def __init__(self, positions, velocities, flock_index, max_speed, max_force, size,
+                 obstacle_positions, obstacle_radius, width, height, flock_ids=None, colors=None):
+        self.positions = np.asarray(positions, dtype='float64').reshape(-1, 2)
+        self.velocities = np.asarray(velocities, dtype='float64').reshape(-1, 2)
+        self.flock_index = np.asarray(flock_index, dtype='int64')
+        self.max_speed = np.asarray(max_speed, dtype='float64')
+        self.max_force = np.asarray(max_force, dtype='float64')
+        self.size = np.asarray(size, dtype='float64')
+        self.obstacle_positions = np.asarray(obstacle_positions, dtype='float64').reshape(-1, 2)
+        self.obstacle_radius = np.asarray(obstacle_radius, dtype='float64')
+        self.width = width
+        self.height = height
+        self.flock_ids = list(flock_ids) if flock_ids is not None else list(range(1, len(self.max_speed) + 1))
+        self.colors = list(colors) if colors is not None else ['blue'] * len(self.max_speed)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def copy(self):
+        return SwarmState(self.positions.copy(), self.velocities.copy(), self.flock_index.copy(),
+                          self.max_speed.copy(), self.max_force.copy(), self.size.copy(),
+                          self.obstacle_positions.copy(), self.obstacle_radius.copy(),
+                          self.width, self.height, self.flock_ids, self.colors)
+
+    @classmethod
+    def random(cls, num_boids, num_flocks=1, num_obstacles=0, width=800, height=600, seed=None,
+               max_speed=4.0, max_force=0.05, size=3):
+        """
+        Builds a random state the way Simulation.add_flock does, drawing the
+        same values from np.random for the same seed, with num_boids split
+        evenly over num_flocks. Obstacles get random positions and radii of
+        20 to 60, like "Add Multiple Obstacles" (without the overlap check).
+        """
+        if seed is not None:
+            np.random.seed(seed)
+        counts = [num_boids // num_flocks + (1 if i < num_boids % num_flocks else 0) for i in range(num_flocks)]
+        positions, velocities = [], []
+        for count in counts:
+            # add_flock draws x, y, angle and speed per boid, in that order
+            draws = np.random.random_sample((count, 4))
+            positions.append(np.column_stack((width * draws[:, 0], height * draws[:, 1])))
+            angle = 2 * np.pi * draws[:, 2]
+            speed = 1 + (max_speed - 1) * draws[:, 3]
+            velocities.append(np.column_stack((np.cos(angle), np.sin(angle))) * speed[:, None])
+        obstacle_positions = np.column_stack((np.random.uniform(50, width - 50, num_obstacles),
+                                              np.random.uniform(50, height - 50, num_obstacles)))
+        obstacle_radius = np.random.randint(20, 60, num_obstacles)
+        return cls(np.concatenate(positions), np.concatenate(velocities),
+                   np.repeat(np.arange(num_flocks), counts),
+                   [max_speed] * num_flocks, [max_force] * num_flocks, [size] * num_flocks,
+                   obstacle_positions, obstacle_radius, width, height)
+
+    @classmethod
+    def from_simulation(cls, simulation):
+        flocks = simulation.flocks
+        index = {flock.flock_id: i for i, flock in enumerate(flocks)}
+        boids = simulation.boids
+        obstacles = simulation.obstacles
+        return cls([boid.position for boid in boids], [boid.velocity for boid in boids],
+                   [index[boid.flock.flock_id] for boid in boids],
+                   [flock.max_speed for flock in flocks], [flock.max_force for flock in flocks],
+                   [flock.size for flock in flocks],
+                   [obstacle.position for obstacle in obstacles], [obstacle.radius for obstacle in obstacles],
+                   simulation.width, simulation.height,
+                   flock_ids=[flock.flock_id for flock in flocks], colors=[flock.color for flock in flocks])
+
+    def to_simulation(self):
+        """
+        Builds an equivalent Simulation of Boid objects, with boid ids in state order.
+        """
+        from boidfinalwobstacles import Boid, Flock, Simulation
+        simulation = Simulation(width=self.width, height=self.height)
+        for i, flock_id in enumerate(self.flock_ids):
+            simulation.flocks.append(Flock(flock_id, self.colors[i], max_speed=float(self.max_speed[i]),
+                                           max_force=float(self.max_force[i]), size=int(self.size[i])))
+        simulation.next_flock_id = max(self.flock_ids or [0]) + 1
+        for boid_id in range(len(self)):
+            flock = simulation.flocks[self.flock_index[boid_id]]
+            boid = Boid(boid_id, self.positions[boid_id], self.velocities[boid_id], flock)
+            flock.add_boid(boid)
+            simulation.boids.append(boid)
+        for position, radius in zip(self.obstacle_positions, self.obstacle_radius):
+            simulation.add_obstacle(position, int(radius))
+        return simulation
+
+    def apply_to(self, simulation):
+        # Copies positions and velocities back onto the simulation's Boid objects
+        for boid, position, velocity in zip(simulation.boids, self.positions, self.velocities):
+            boid.position[:] = position
+            boid.velocity[:] = velocity
+
+# ------------------------------
+# Object Backend Class
+# ------------------------------
+class ObjectBackend:
+    """
+    The reference: Simulation.update on Boid objects built from the state.
+    """
+    name = 'object'
+
+    def __init__(self, state):
+        self.simulation = state.to_simulation()
+
+    def step(self, separation_radius, alignment_radius, cohesion_radius):
+        self.simulation.update(separation_radius, alignment_radius, cohesion_radius)
+
+    def snapshot(self):
+        return SwarmState.from_simulation(self.simulation)
+
+def _grid_pairs(query_keys, valid, table_keys, table_values, max_pairs):
+    """
+    Yields chunks of (i, j) pairs matching each query i (with a valid key)
+    to every table value whose key equals query_keys[i]. table_keys must be
+    sorted. Chunks hold about max_pairs pairs, to bound memory.
+    """
+    lo = np.searchsorted(table_keys, query_keys, 'left')
+    counts = np.where(valid, np.searchsorted(table_keys, query_keys, 'right') - lo, 0)
+    total = np.cumsum(counts)
+    if len(total) == 0 or total[-1] == 0:
+        return
+    splits = np.searchsorted(total, np.arange(max_pairs, total[-1], max_pairs), 'left') + 1
+    bounds = np.unique(np.concatenate(([0], splits, [len(counts)])))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        chunk_counts = counts[start:stop]
+        size = int(chunk_counts.sum())
+        if size == 0:
+            continue
+        i = np.repeat(np.arange(start, stop), chunk_counts)
+        first = np.cumsum(chunk_counts) - chunk_counts
+        position = np.repeat(lo[start:stop] - first, chunk_counts) + np.arange(size)
+        yield i, table_values[position]
+
+def _steer(vectors, active, velocities, max_speed, max_force):
+    """
+    Vectorized Boid.steer for the rows where active is True; other rows are zero.
+    """
+    steering = np.zeros_like(vectors)
+    vectors = vectors[active]
+    norm = np.sqrt(vectors[:, 0] * vectors[:, 0] + vectors[:, 1] * vectors[:, 1])[:, None]
+    steer = vectors / norm * max_speed[active][:, None] - velocities[active]
+    steer_norm = np.sqrt(steer[:, 0] * steer[:, 0] + steer[:, 1] * steer[:, 1])[:, None]
+    limit = max_force[active][:, None]
+    steering[active] = np.where(steer_norm > limit, steer / np.where(steer_norm > 0, steer_norm, 1) * limit, steer)
+    return steering
+
+def _norm(vectors):
+    return np.sqrt(vectors[:, 0] * vectors[:, 0] + vectors[:, 1] * vectors[:, 1])
+
+# ------------------------------
+# NumPy Grid Backend Class
+# ------------------------------
+class GridBackend:
+    """
+    Vectorized step over a uniform grid. Boids are keyed by (flock, cell),
+    so the neighbours of a boid are looked up in the 3x3 block of cells of
+    its own flock around it. Obstacles are registered in every cell their
+    avoidance buffer overlaps. Forces are summed per boid with np.bincount
+    in chunks of at most max_pairs candidate pairs.
+    """
+    name = 'numpy'
+
+    def __init__(self, state, max_pairs=4000000, timings=None):
+        self.state = state.copy()
+        self.max_pairs = max_pairs
+        self.timings = timings  # Optional PhaseTimer, filled like Simulation.timings
+
+    def snapshot(self):
+        return self.state.copy()
+
+    def step(self, separation_radius, alignment_radius, cohesion_radius):
+        state = self.state
+        clock = self.timings.clock if self.timings is not None else None
+        start = clock() if clock else 0.0
+        max_speed = state.max_speed[state.flock_index]
+        max_force = state.max_force[state.flock_index]
+        acceleration = np.zeros_like(state.positions)
+        acceleration += self._flocking_forces(separation_radius, alignment_radius, cohesion_radius,
+                                              max_speed, max_force)
+        flocked = clock() if clock else 0.0
+        acceleration += AVOID_WEIGHT * self._avoidance(max_speed, max_force)
+        avoided = clock() if clock else 0.0
+        self._integrate(acceleration, max_speed)
+        if clock:
+            self.timings.record('flocking', start, flocked)
+            self.timings.record('avoidance', flocked, avoided)
+            self.timings.record('integration', avoided, clock())
+
+    def _cells(self, cell_size):
+        state = self.state
+        grid_width = int(np.ceil(state.width / cell_size)) + 1
+        grid_height = int(np.ceil(state.height / cell_size)) + 1
+        cx = np.clip(np.floor(state.positions[:, 0] / cell_size).astype('int64'), 0, grid_width - 1)
+        cy = np.clip(np.floor(state.positions[:, 1] / cell_size).astype('int64'), 0, grid_height - 1)
+        return cx, cy, grid_width, grid_height
+
+    def _flocking_forces(self, separation_radius, alignment_radius, cohesion_radius, max_speed, max_force):
+        state = self.state
+        positions, velocities = state.positions, state.velocities
+        n = len(positions)
+        radius = max(separation_radius, alignment_radius, cohesion_radius)
+        cx, cy, grid_width, grid_height = self._cells(max(radius, 1.0))
+        keys = (state.flock_index * grid_height + cy) * grid_width + cx
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        sums = {name: np.zeros((n, 2)) for name in ('separation', 'alignment', 'cohesion')}
+        totals = {name: np.zeros(n) for name in sums}
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                nx, ny = cx + dx, cy + dy
+                valid = (nx >= 0) & (nx < grid_width) & (ny >= 0) & (ny < grid_height)
+                query = (state.flock_index * grid_height + ny) * grid_width + nx
+                for i, j in _grid_pairs(query, valid, sorted_keys, order, self.max_pairs):
+                    diff_x = positions[i, 0] - positions[j, 0]
+                    diff_y = positions[i, 1] - positions[j, 1]
+                    distance = np.sqrt(diff_x * diff_x + diff_y * diff_y)
+                    keep = (i != j) & (distance < radius)
+                    i, j = i[keep], j[keep]
+                    diff_x, diff_y, distance = diff_x[keep], diff_y[keep], distance[keep]
+                    near = distance < separation_radius
+                    # Separation pushes away along the unit vector (zero for coincident boids)
+                    weight = np.where(distance[near] > 0, distance[near], 1.0)
+                    self._accumulate(sums['separation'], totals['separation'], i[near],
+                                     diff_x[near] / weight, diff_y[near] / weight, n)
+                    near = distance < alignment_radius
+                    self._accumulate(sums['alignment'], totals['alignment'], i[near],
+                                     velocities[j[near], 0], velocities[j[near], 1], n)
+                    near = distance < cohesion_radius
+                    self._accumulate(sums['cohesion'], totals['cohesion'], i[near],
+                                     positions[j[near], 0], positions[j[near], 1], n)
+
+        forces = np.zeros_like(positions)
+        for name, weight in (('separation', SEPARATION_WEIGHT), ('alignment', ALIGNMENT_WEIGHT),
+                             ('cohesion', COHESION_WEIGHT)):
+            total = totals[name]
+            mean = sums[name] / np.maximum(total, 1)[:, None]
+            if name == 'cohesion':
+                mean = mean - positions
+            active = (total > 0) & (_norm(mean) > 0)
+            forces += weight * _steer(mean, active, velocities, max_speed, max_force)
+        return forces
+
+    @staticmethod
+    def _accumulate(sums, totals, i, x, y, n):
+        if len(i):
+            sums[:, 0] += np.bincount(i, x, minlength=n)
+            sums[:, 1] += np.bincount(i, y, minlength=n)
+            totals += np.bincount(i, minlength=n)
+
+    def _avoidance(self, max_speed, max_force):
+        state = self.state
+        positions = state.positions
+        n = len(positions)
+        if len(state.obstacle_radius) == 0 or n == 0:
+            return np.zeros_like(positions)
+        buffers = state.obstacle_radius[None, :] + state.size[:, None] + AVOID_BUFFER  # Per flock and obstacle
+        reach = state.obstacle_radius + state.size.max() + AVOID_BUFFER
+        cell_size = max(float(np.median(reach)), 1.0)
+        cx, cy, grid_width, grid_height = self._cells(cell_size)
+
+        # Register each obstacle in every cell its largest buffer overlaps
+        x0 = np.clip(np.floor((state.obstacle_positions[:, 0] - reach) / cell_size).astype('int64'), 0, grid_width - 1)
+        x1 = np.clip(np.floor((state.obstacle_positions[:, 0] + reach) / cell_size).astype('int64'), 0, grid_width - 1)
+        y0 = np.clip(np.floor((state.obstacle_positions[:, 1] - reach) / cell_size).astype('int64'), 0, grid_height - 1)
+        y1 = np.clip(np.floor((state.obstacle_positions[:, 1] + reach) / cell_size).astype('int64'), 0, grid_height - 1)
+        table_keys, table_values = [], []
+        for obstacle in range(len(reach)):
+            gx, gy = np.meshgrid(np.arange(x0[obstacle], x1[obstacle] + 1), np.arange(y0[obstacle], y1[obstacle] + 1))
+            table_keys.append((gy * grid_width + gx).ravel())
+            table_values.append(np.full(gx.size, obstacle, dtype='int64'))
+        table_keys = np.concatenate(table_keys)
+        table_values = np.concatenate(table_values)
+        order = np.argsort(table_keys, kind='stable')
+
+        steering = np.zeros_like(positions)
+        query = cy * grid_width + cx
+        for i, o in _grid_pairs(query, np.ones(n, dtype=bool), table_keys[order], table_values[order], self.max_pairs):
+            diff_x = positions[i, 0] - state.obstacle_positions[o, 0]
+            diff_y = positions[i, 1] - state.obstacle_positions[o, 1]
+            distance = np.sqrt(diff_x * diff_x + diff_y * diff_y)
+            near = distance < buffers[state.flock_index[i], o]
+            weight = np.where(distance[near] > 0, distance[near], 1.0)
+            if near.any():
+                steering[:, 0] += np.bincount(i[near], diff_x[near] / weight, minlength=n)
+                steering[:, 1] += np.bincount(i[near], diff_y[near] / weight, minlength=n)
+        return _steer(steering, _norm(steering) > 0, state.velocities, max_speed, max_force)
+
+    def _integrate(self, acceleration, max_speed):
+        # Boid.update followed by Boid.edges
+        state = self.state
+        velocities = state.velocities
+        velocities += acceleration
+        speed = _norm(velocities)
+        fast = speed > max_speed
+        velocities[fast] = velocities[fast] / speed[fast][:, None] * max_speed[fast][:, None]
+        positions = state.positions
+        positions += velocities
+        for axis, limit in ((0, state.width), (1, state.height)):
+            high = positions[:, axis] >= limit
+            low = ~high & (positions[:, axis] <= 0)
+            positions[high, axis] = limit
+            positions[low, axis] = 0
+            velocities[high | low, axis] *= -1
+
+BACKENDS = OrderedDict([
+    (ObjectBackend.name, ObjectBackend),
+    (GridBackend.name, GridBackend),
+])
+
+def create_backend(name, state, **options):
+    """
+    Creates the named backend, advancing a copy of `state`.
+    """
+    if name not in BACKENDS:
+        raise ValueError("Unknown backend '{}' (available: {})".format(name, ', '.join(BACKENDS)))
+    return BACKENDS[name](state, **options)
@@ -0,0 +1,84 @@
+"""
+Measures CSV export throughput in rows/second.
+
+Compares the original pandas path (DataFrame built from a list of dicts, then
+to_csv) with the vectorized writer in csv_writer.py, plain and gzip-compressed.
+
+    python benchmark_export.py --boids 2000 --frames 500
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from csv_writer import write_csv
+from recording import RECORD_COLUMNS
+
+def make_blocks(num_boids, num_frames, num_flocks, seed=0):
+    # Synthetic recorded frames with the same columns and dtypes as record_data
+    random_state = np.random.RandomState(seed)
+    boid_ids = np.arange(num_boids, dtype='int64')
+    flock_ids = (boid_ids % num_flocks + 1).astype('int64')
+    blocks = []
+    for frame in range(num_frames):
+        blocks.append({
+            'frame': np.full(num_boids, frame, dtype='int64'),
+            'boid_id': boid_ids,
+            'flock_id': flock_ids,
+            'x': random_state.uniform(0, 800, num_boids),
+            'y': random_state.uniform(0, 600, num_boids),
+            'vx': random_state.uniform(-4, 4, num_boids),
+            'vy': random_state.uniform(-4, 4, num_boids),
+        })
+    return blocks
+
+def to_records(blocks):
+    # The list-of-dicts layout the original export_to_csv consumed
+    records = []
+    for block in blocks:
+        columns = [block[column].tolist() for column in RECORD_COLUMNS]
+        records.extend(dict(zip(RECORD_COLUMNS, row)) for row in zip(*columns))
+    return records
+
+def time_it(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CSV export throughput.")
+    parser.add_argument('--boids', type=int, default=1000)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--flocks', type=int, default=4)
+    parser.add_argument('--precision', type=int, default=4)
+    parser.add_argument('--skip-pandas', action='store_true', help="Skip the slow list-of-dicts baseline")
+    args = parser.parse_args()
+
+    blocks = make_blocks(args.boids, args.frames, args.flocks)
+    colors = {flock_id: 'blue' for flock_id in range(1, args.flocks + 1)}
+    rows = args.boids * args.frames
+    print("Exporting {:,} rows ({} boids x {} frames)".format(rows, args.boids, args.frames))
+
+    directory = tempfile.mkdtemp()
+    results = []
+    if not args.skip_pandas:
+        records = to_records(blocks)
+        path = os.path.join(directory, 'pandas.csv')
+        elapsed = time_it(lambda: pd.DataFrame(records).to_csv(path, index=False))
+        results.append(('pandas list-of-dicts', elapsed, path))
+    for name, filename in (('vectorized', 'fast.csv'), ('vectorized gzip', 'fast.csv.gz')):
+        path = os.path.join(directory, filename)
+        elapsed = time_it(lambda: write_csv(blocks, path, float_precision=args.precision, colors=colors))
+        results.append((name, elapsed, path))
+
+    for name, elapsed, path in results:
+        size_mb = os.path.getsize(path) / 1e6
+        print("{:<22} {:8.3f} s {:>14,.0f} rows/s {:8.1f} MB".format(name, elapsed, rows / elapsed, size_mb))
+        os.remove(path)
+    os.rmdir(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Measures the cost of one simulation step across backends and problem sizes.
+
+By default each axis (boids, flocks, obstacles, radii) is swept on its own
+around a baseline configuration, giving one scaling curve per axis and
+backend; --full runs every combination instead. The world grows with the
+number of boids so that the density of boids stays constant. Configurations
+a backend is predicted to need more than --max-step-seconds per step for are
+skipped, so the O(n^2) object backend does not stall the run.
+
+Results are written as JSON. With --compare, the run is checked against an
+earlier results file and exits with status 1 when any configuration got
+slower by more than --threshold:
+
+    python benchmark_step.py --output data/bench_step.json
+    python benchmark_step.py --backends numpy --compare data/bench_step.json --threshold 1.2
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from backends import BACKENDS, SwarmState, create_backend
+
+RADII = OrderedDict([
+    ('small', (10, 20, 20)),
+    ('default', (25, 50, 50)),
+    ('large', (50, 100, 100)),
+])
+
+# How the step time of each backend grows with the number of boids, for skipping
+SCALING = {'object': 2.0, 'numpy': 1.0}
+
+def int_list(text):
+    return [int(value) for value in text.split(',') if value]
+
+def world_size(num_boids, density):
+    """
+    A 4:3 world holding `density` boids per 100x100 area, at least 800x600.
+    """
+    area = num_boids / float(density) * 100 * 100
+    width = max(800, int(round(np.sqrt(area * 4 / 3.0))))
+    return width, max(600, int(round(width * 3 / 4.0)))
+
+def configurations(args):
+    """
+    Returns the configurations to run as dicts of boids, flocks, obstacles and radii.
+    """
+    if args.full:
+        combos = itertools.product(args.boids, args.flocks, args.obstacles, args.radii)
+        return [OrderedDict(zip(('boids', 'flocks', 'obstacles', 'radii'), combo)) for combo in combos]
+    baseline = OrderedDict([('boids', args.base_boids), ('flocks', args.base_flocks),
+                            ('obstacles', args.base_obstacles), ('radii', 'default')])
+    configs = []
+    for axis in ('boids', 'flocks', 'obstacles', 'radii'):
+        for value in getattr(args, axis):
+            config = OrderedDict(baseline)
+            config[axis] = value
+            if config not in configs:
+                configs.append(config)
+    return configs
+
+def config_key(result):
+    return (result['backend'], result['boids'], result['flocks'], result['obstacles'], result['radii'])
+
+def predict_seconds(backend, config, results):
+    """
+    Extrapolates the step time from the largest smaller run of this backend
+    that differs only in the number of boids. None if there is no such run.
+    """
+    best = None
+    for result in results:
+        if (result['backend'] == backend and result['status'] == 'ok' and result['boids'] < config['boids'] and
+                (result['flocks'], result['obstacles'], result['radii']) ==
+                (config['flocks'], config['obstacles'], config['radii'])):
+            if best is None or result['boids'] > best['boids']:
+                best = result
+    if best is None:
+        return None
+    growth = (config['boids'] / float(best['boids'])) ** SCALING.get(backend, 2.0)
+    return best['median_ms'] / 1000.0 * growth
+
+def measure(backend_name, config, args):
+    width, height = world_size(config['boids'], args.density)
+    radii = RADII[config['radii']]
+    state = SwarmState.random(config['boids'], config['flocks'], config['obstacles'], width, height, seed=args.seed)
+    backend = create_backend(backend_name, state)
+    for _ in range(args.warmup):
+        backend.step(*radii)
+    times = []
+    started = time.perf_counter()
+    while len(times) < args.steps:
+        start = time.perf_counter()
+        backend.step(*radii)
+        times.append(time.perf_counter() - start)
+        if time.perf_counter() - started > args.max_step_seconds:
+            break  # Enough samples for a slow configuration
+    median = float(np.median(times))
+    return OrderedDict([
+        ('width', width), ('height', height), ('radii_values', list(radii)), ('status', 'ok'),
+        ('steps', len(times)),
+        ('median_ms', median * 1000.0),
+        ('min_ms', float(np.min(times)) * 1000.0),
+        ('max_ms', float(np.max(times)) * 1000.0),
+        ('boid_steps_per_s', config['boids'] / median if median > 0 else 0.0),
+    ])
+
+def scaling_curves(results, args):
+    """
+    {axis: {backend: [[value, median_ms], ...]}} for the sweep of each axis.
+    """
+    baseline = {'boids': args.base_boids, 'flocks': args.base_flocks, 'obstacles': args.base_obstacles,
+                'radii': 'default'}
+    curves = OrderedDict()
+    for axis in ('boids', 'flocks', 'obstacles', 'radii'):
+        curves[axis] = OrderedDict()
+        for result in results:
+            others = all(result[other] == baseline[other] for other in baseline if other != axis)
+            if result['status'] == 'ok' and others:
+                curves[axis].setdefault(result['backend'], []).append([result[axis], result['median_ms']])
+    return curves
+
+def find_regressions(results, baseline_path, threshold, min_ms):
+    with open(baseline_path) as f:
+        baseline = {config_key(result): result for result in json.load(f)['results'] if result['status'] == 'ok'}
+    regressions = []
+    for result in results:
+        previous = baseline.get(config_key(result))
+        if result['status'] != 'ok' or previous is None:
+            continue
+        ratio = result['median_ms'] / previous['median_ms']
+        # Ignore tiny absolute changes, which are mostly timer noise
+        if ratio > threshold and result['median_ms'] - previous['median_ms'] > min_ms:
+            regressions.append(OrderedDict([
+                ('backend', result['backend']), ('boids', result['boids']), ('flocks', result['flocks']),
+                ('obstacles', result['obstacles']), ('radii', result['radii']),
+                ('baseline_ms', previous['median_ms']), ('median_ms', result['median_ms']), ('ratio', ratio),
+            ]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation step across backends and sizes.")
+    parser.add_argument('--backends', default=','.join(BACKENDS), help="Comma-separated backends to run")
+    parser.add_argument('--boids', type=int_list, default=[100, 1000, 10000, 100000, 1000000])
+    parser.add_argument('--flocks', type=int_list, default=[1, 4, 16, 64])
+    parser.add_argument('--obstacles', type=int_list, default=[0, 10, 100, 1000])
+    parser.add_argument('--radii', type=lambda text: text.split(','), default=list(RADII),
+                        help="Radius presets: {}".format(', '.join(RADII)))
+    parser.add_argument('--base-boids', type=int, default=1000, help="Boids while sweeping the other axes")
+    parser.add_argument('--base-flocks', type=int, default=4)
+    parser.add_argument('--base-obstacles', type=int, default=10)
+    parser.add_argument('--full', action='store_true', help="Run every combination instead of per-axis sweeps")
+    parser.add_argument('--density', type=float, default=5.0, help="Boids per 100x100 area of the world")
+    parser.add_argument('--steps', type=int, default=5, help="Timed steps per configuration")
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--max-step-seconds', type=float, default=10.0,
+                        help="Skip configurations predicted to take longer than this per step")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="JSON results file")
+    parser.add_argument('--compare', default=None, help="Earlier JSON results to check for regressions")
+    parser.add_argument('--threshold', type=float, default=1.25, help="Slowdown ratio counted as a regression")
+    parser.add_argument('--min-ms', type=float, default=0.5, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    backends = [name for name in args.backends.split(',') if name]
+    for name in backends:
+        if name not in BACKENDS:
+            parser.error("unknown backend '{}' (available: {})".format(name, ', '.join(BACKENDS)))
+    for preset in args.radii:
+        if preset not in RADII:
+            parser.error("unknown radius preset '{}' (available: {})".format(preset, ', '.join(RADII)))
+
+    results = []
+    print("{:<8} {:>8} {:>6} {:>9} {:>8} {:>12} {:>16}".format(
+        'backend', 'boids', 'flocks', 'obstacles', 'radii', 'median ms', 'boid-steps/s'))
+    for config in sorted(configurations(args), key=lambda c: (c['boids'], c['flocks'], c['obstacles'], c['radii'])):
+        for name in backends:
+            result = OrderedDict([('backend', name)])
+            result.update(config)
+            predicted = predict_seconds(name, config, results)
+            if predicted is not None and predicted > args.max_step_seconds:
+                result['status'] = 'skipped'
+                result['predicted_ms'] = predicted * 1000.0
+                print("{:<8} {:>8} {:>6} {:>9} {:>8} {:>12}".format(
+                    name, config['boids'], config['flocks'], config['obstacles'], config['radii'], 'skipped'))
+            else:
+                result.update(measure(name, config, args))
+                print("{:<8} {:>8} {:>6} {:>9} {:>8} {:>12.2f} {:>16,.0f}".format(
+                    name, config['boids'], config['flocks'], config['obstacles'], config['radii'],
+                    result['median_ms'], result['boid_steps_per_s']))
+            results.append(result)
+            sys.stdout.flush()
+
+    report = OrderedDict([
+        ('benchmark', 'simulation_step'),
+        ('created', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('machine', OrderedDict([('python', platform.python_version()), ('numpy', np.__version__),
+                                 ('platform', platform.platform()), ('processor', platform.processor()),
+                                 ('cpu_count', os.cpu_count())])),
+        ('settings', vars(args)),
+        ('results', results),
+        ('curves', scaling_curves(results, args) if not args.full else None),
+    ])
+    regressions = []
+    if args.compare:
+        regressions = find_regressions(results, args.compare, args.threshold, args.min_ms)
+        report['regressions'] = regressions
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print("Results written to {}".format(args.output))
+    if regressions:
+        for regression in regressions:
+            print("REGRESSION {backend} boids={boids} flocks={flocks} obstacles={obstacles} radii={radii}: "
+                  "{baseline_ms:.2f} -> {median_ms:.2f} ms ({ratio:.2f}x)".format(**regression))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
+import functools
 import os
 import tkinter as tk
-from tkinter import ttk, colorchooser, messagebox, simpledialog
+from tkinter import ttk, colorchooser, messagebox, simpledialog, filedialog
+import threading
 import time
 import numpy as np
 import pandas as pd
@@ -9,6 +11,19 @@ from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 import seaborn as sns
 
+from export_writer import ExportWriter
+from recording import RecordingBuffer
+from canvas_batch import RenderStats, move_ovals, recolor_changed, set_state
+from raster import RasterRenderer, color_to_rgb, to_ppm
+from density import DensityRenderer
+from spatial_grid import SpatialGrid
+from viewport import Camera
+from scheduler import FrameScheduler
+from phase_timer import PhaseTimer
+from profiler import profiler
+from replay import ReplayWindow, prepare_trajectory, show_error
+from trajectory import write_trajectory
+
 # ------------------------------
 # Boid Class
 # ------------------------------
@@ -48,20 +63,26 @@ class Boid:
             self.velocity[1] *= -1
 
     def flocking(self, boids, separation_radius, alignment_radius, cohesion_radius, obstacles):
+        self.apply_flocking(boids, separation_radius, alignment_radius, cohesion_radius)
+        self.apply_avoidance(obstacles)
+
+    def apply_flocking(self, boids, separation_radius, alignment_radius, cohesion_radius):
         separation = self.separation(boids, separation_radius)
         alignment = self.alignment(boids, alignment_radius)
         cohesion = self.cohesion(boids, cohesion_radius)
-        avoid = self.avoid_obstacles(obstacles)
 
         # Weights for behaviors
         separation_weight = 1.5
         alignment_weight = 1.0
         cohesion_weight = 1.0
-        avoid_weight = 3.0  # Higher weight for obstacle avoidance
 
         self.apply_force(separation * separation_weight)
         self.apply_force(alignment * alignment_weight)
         self.apply_force(cohesion * cohesion_weight)
+
+    def apply_avoidance(self, obstacles):
+        avoid = self.avoid_obstacles(obstacles)
+        avoid_weight = 3.0  # Higher weight for obstacle avoidance
         self.apply_force(avoid * avoid_weight)
 
     def separation(self, boids, radius):
@@ -159,14 +180,16 @@ class Obstacle:
 # Simulation Class
 # ------------------------------
 class Simulation:
-    def __init__(self, width=800, height=600):
+    def __init__(self, width=800, height=600, recording_policy=None, memory_budget=None, spill_dir=None):
         self.width = width
         self.height = height
         self.flocks = []
         self.boids = []
         self.obstacles = []  # List to hold obstacles
         self.next_flock_id = 1
-        self.data_records = []  # List to hold snapshot data
+        # Recorded frames, filtered by the recording policy; beyond memory_budget bytes, older frames spill to disk
+        self.data_records = RecordingBuffer(recording_policy, memory_budget=memory_budget, spill_dir=spill_dir)
+        self.timings = PhaseTimer(('flocking', 'avoidance', 'integration', 'record_data'))  # Rolling per-phase timings
 
     def add_flock(self, color, num_boids=30, max_speed=4, max_force=0.05, size=3):
         flock = Flock(flock_id=self.next_flock_id, color=color, max_speed=max_speed, max_force=max_force, size=size)
@@ -187,54 +210,118 @@ class Simulation:
         self.obstacles.append(obstacle)
 
     def update(self, separation_radius, alignment_radius, cohesion_radius):
+        # Forces only read positions and velocities, so applying avoidance in a second
+        # pass gives the same result as Boid.flocking while letting each phase be timed
+        clock = self.timings.clock
+        start = clock()
         for flock in self.flocks:
             for boid in flock.boids:
-                boid.flocking(flock.boids, separation_radius, alignment_radius, cohesion_radius, self.obstacles)
+                boid.apply_flocking(flock.boids, separation_radius, alignment_radius, cohesion_radius)
+        flocked = clock()
+        for boid in self.boids:
+            boid.apply_avoidance(self.obstacles)
+        avoided = clock()
         for boid in self.boids:
             boid.update()
             boid.edges(self.width, self.height)
+        self.timings.record('flocking', start, flocked)
+        self.timings.record('avoidance', flocked, avoided)
+        self.timings.record('integration', avoided, clock())
 
     def record_data(self, frame_number):
-        # Record the state of all boids at the current frame
-        for boid in self.boids:
-            record = {
-                'frame': frame_number,
-                'boid_id': boid.id,
-                'flock_id': boid.flock.flock_id,
-                'x': boid.position[0],
-                'y': boid.position[1],
-                'vx': boid.velocity[0],
-                'vy': boid.velocity[1]
-            }
-            self.data_records.append(record)
-
-    def export_to_csv(self):
+        # Record the state of the boids at the current frame, as allowed by the recording policy
+        with self.timings.measure('record_data'):
+            self.data_records.record(frame_number, self.boids)
+
+    def metrics(self):
+        """
+        Per-phase timings (see PhaseTimer.metrics) plus the boid count and
+        recording memory and spill volume, for headless runs and the GUI's HUD.
+        """
+        records = self.data_records
+        return {
+            'phases': self.timings.metrics(),
+            'boids': len(self.boids),
+            'recorded_rows': len(records),
+            'recording_bytes': records.nbytes(),
+            'spilled_frames': records.spilled_frames(),
+            'spilled_bytes': records.spilled_nbytes(),
+            'memory_budget': records.memory_budget,
+        }
+
+    def start_export(self, filename='boid_simulation_data.csv', float_precision=4, compress=False):
+        """
+        Starts exporting a snapshot of the recorded data on background threads.
+        The CSV uses the boid_simulation_datav2.csv columns (including flock color);
+        a filename ending in .gz or compress=True writes it gzip-compressed.
+        Returns the ExportWriter so callers can poll progress or cancel it.
+        """
         # Define the data directory
         data_dir = 'data'
         # Create the data directory if it doesn't exist
         os.makedirs(data_dir, exist_ok=True)
         # Construct the full file path
-        filename = 'boid_simulation_data.csv'
         file_path = os.path.join(data_dir, filename)
-        # Convert data_records to DataFrame and export to CSV
-        df = pd.DataFrame(self.data_records)
-        df.to_csv(file_path, index=False)
-        print("Data exported to {}".format(file_path))
+        # Snapshot the records so the simulation can keep recording during export
+        blocks = self.data_records.snapshot()
+        colors = {flock.flock_id: flock.color for flock in self.flocks}
+        writer = ExportWriter(blocks, file_path, colors=colors, float_precision=float_precision, compress=compress)
+        return writer.start()
+
+    def trajectory_export(self, filename='boid_simulation_data.traj'):
+        """
+        Snapshots the recorded data and the flock settings, and returns a function
+        that writes them to an indexed .traj file and returns its path. Call this
+        on the thread that records; the returned function can run on any thread.
+        """
+        data_dir = 'data'
+        os.makedirs(data_dir, exist_ok=True)
+        file_path = os.path.join(data_dir, filename)
+        # Snapshot the records so the simulation can keep recording while the file is written
+        blocks = self.data_records.snapshot()
+        flocks = {flock.flock_id: {'color': flock.color, 'size': flock.size} for flock in self.flocks}
+        return functools.partial(write_trajectory, blocks, file_path, self.width, self.height, flocks)
+
+    def export_to_trajectory(self, filename='boid_simulation_data.traj'):
+        """
+        Writes the recorded data to an indexed .traj file for replay in the GUI.
+        Returns the file path.
+        """
+        return self.trajectory_export(filename)()
+
+    def export_to_csv(self):
+        # Export synchronously by waiting on the background writer
+        writer = self.start_export()
+        writer.wait()
+        if writer.error is not None:
+            raise writer.error
+        print("Data exported to {}".format(writer.file_path))
 
 # ------------------------------
 # GUI Class
 # ------------------------------
 class BoidGUI:
-    def __init__(self, root, simulation):
+    GLYPH_SIZE = 8   # Screen pixels per aggregated glyph cell
+    LOD_ZOOM = 0.5   # Below this zoom, boids are drawn as per-cell glyphs
+    CULL_CELLS = 64  # Culling grid cells across the world's longer side, whatever the zoom
+
+    def __init__(self, root, simulation, view_width=800, view_height=600):
         self.root = root
         self.simulation = simulation
         self.running = False
         self.start_time = None  # To track when the simulation starts
         self.frame_number = 0   # To track the current frame for data recording
+        self.export_writer = None  # Background export in progress, if any
+
+        # The canvas shows the world through a camera, so worlds larger than the view can be zoomed and panned
+        view_width = min(view_width, simulation.width)
+        view_height = min(view_height, simulation.height)
+        self.camera = Camera(view_width, view_height, simulation.width, simulation.height)
+        self.pan_anchor = None
 
         # Set up the main window with a fixed size
-        window_width = simulation.width + 400  # Extra width for control panel
-        window_height = simulation.height + 50   # Adjusted for optimal layout
+        window_width = view_width + 400  # Extra width for control panel
+        window_height = view_height + 50   # Adjusted for optimal layout
         self.root.geometry("{}x{}".format(window_width, window_height))
         self.root.resizable(False, False)  # Prevent resizing to maintain layout
 
@@ -243,15 +330,23 @@ class BoidGUI:
         main_frame.pack(fill=tk.BOTH, expand=1, padx=10, pady=10)
 
         # Create Canvas for visualization on the Left
-        self.canvas = tk.Canvas(main_frame, width=simulation.width, height=simulation.height, bg='black')
+        self.canvas = tk.Canvas(main_frame, width=view_width, height=view_height, bg='black')
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=1)
 
+        # Mouse wheel zooms around the cursor, dragging pans, double-click fits the whole world
+        self.canvas.bind('<MouseWheel>', lambda event: self.zoom_view(1.25 if event.delta > 0 else 0.8, event.x, event.y))
+        self.canvas.bind('<Button-4>', lambda event: self.zoom_view(1.25, event.x, event.y))  # X11 wheel up
+        self.canvas.bind('<Button-5>', lambda event: self.zoom_view(0.8, event.x, event.y))   # X11 wheel down
+        self.canvas.bind('<ButtonPress-1>', self.start_pan)
+        self.canvas.bind('<B1-Motion>', self.drag_pan)
+        self.canvas.bind('<Double-Button-1>', lambda event: self.fit_view())
+
         # Create Control Panel Frame on the Right
         control_panel = ttk.Frame(main_frame, width=350)
         control_panel.pack(side=tk.RIGHT, fill=tk.Y, padx=(10, 0))
 
         # Configure grid for control panel
-        for i in range(20):
+        for i in range(24):
             control_panel.rowconfigure(i, weight=1)
         control_panel.columnconfigure(1, weight=1)
 
@@ -361,8 +456,79 @@ class BoidGUI:
         self.status_label = ttk.Label(control_panel, text="Status: Ready")
         self.status_label.grid(row=18, column=0, columnspan=2, pady=5)
 
+        # Replay Buttons
+        replay_frame = ttk.Frame(control_panel)
+        replay_frame.grid(row=19, column=0, columnspan=2, pady=5)
+        self.save_replay_button = ttk.Button(replay_frame, text="Save Replay", command=self.save_replay)
+        self.save_replay_button.pack(side=tk.LEFT, padx=5)
+        self.open_replay_button = ttk.Button(replay_frame, text="Open Replay", command=self.open_replay)
+        self.open_replay_button.pack(side=tk.LEFT, padx=5)
+        self.replay_window = None
+
+        # Renderer Selection: canvas items per boid, one raster image for all boids, or a density heatmap
+        ttk.Label(control_panel, text="Renderer:").grid(row=20, column=0, sticky=tk.W, pady=5)
+        renderer_frame = ttk.Frame(control_panel)
+        renderer_frame.grid(row=20, column=1, sticky=tk.EW, pady=5)
+        self.renderer_mode = tk.StringVar(value="Canvas")
+        renderer_box = ttk.Combobox(renderer_frame, textvariable=self.renderer_mode,
+                                    values=("Canvas", "Raster", "Density"), width=8, state='readonly')
+        renderer_box.pack(side=tk.LEFT)
+        renderer_box.bind('<<ComboboxSelected>>', lambda event: self.apply_renderer())
+        self.density_trails = tk.BooleanVar(value=False)
+        ttk.Checkbutton(renderer_frame, text="Trails", variable=self.density_trails,
+                        command=self.update_density_decay).pack(side=tk.LEFT, padx=5)
+
+        # Simulation Rate: steps per second independent of the display rate, or "Max" for full speed
+        ttk.Label(control_panel, text="Sim Rate:").grid(row=21, column=0, sticky=tk.W, pady=5)
+        rate_frame = ttk.Frame(control_panel)
+        rate_frame.grid(row=21, column=1, sticky=tk.EW, pady=5)
+        self.sim_rate = tk.StringVar(value="60")
+        rate_box = ttk.Combobox(rate_frame, textvariable=self.sim_rate, values=("15", "30", "60", "120", "240", "Max"),
+                                width=6, state='readonly')
+        rate_box.pack(side=tk.LEFT)
+        rate_box.bind('<<ComboboxSelected>>', lambda event: self.update_sim_rate())
+        self.interpolate = tk.BooleanVar(value=True)
+        ttk.Checkbutton(rate_frame, text="Interpolate", variable=self.interpolate).pack(side=tk.LEFT, padx=5)
+        self.scheduler = FrameScheduler(sim_rate=60.0, display_rate=60.0)
+        self.previous_positions = None  # Boid positions before the latest step, for interpolation
+
+        # View Controls
+        view_frame = ttk.Frame(control_panel)
+        view_frame.grid(row=22, column=0, columnspan=2, pady=5)
+        ttk.Button(view_frame, text="Fit View", command=self.fit_view).pack(side=tk.LEFT, padx=5)
+        self.view_label = ttk.Label(view_frame, text=self.camera.summary())
+        self.view_label.pack(side=tk.LEFT, padx=5)
+        self.show_hud = tk.BooleanVar(value=False)
+        ttk.Checkbutton(view_frame, text="HUD", variable=self.show_hud, command=self.update_hud).pack(side=tk.LEFT, padx=5)
+        self.hud_item = None
+        self.hud_updated = 0.0
+        self.last_render = None
+
+        # Profiling Controls: a trace-event timeline, or cProfile over a fixed number of frames
+        profile_frame = ttk.Frame(control_panel)
+        profile_frame.grid(row=23, column=0, columnspan=2, pady=5)
+        self.trace_button = ttk.Button(profile_frame, text="Record Trace", command=self.toggle_trace)
+        self.trace_button.pack(side=tk.LEFT, padx=5)
+        # cProfile counts GUI frames, so it can only be started while the simulation runs
+        self.cprofile_button = ttk.Button(profile_frame, text="Profile 300 Frames", command=self.profile_frames,
+                                          state=tk.DISABLED)
+        self.cprofile_button.pack(side=tk.LEFT, padx=5)
+
+        self.raster = RasterRenderer(view_width, view_height, background='black')
+        self.raster_image = tk.PhotoImage(width=view_width, height=view_height)
+        self.raster_item = self.canvas.create_image(0, 0, image=self.raster_image, anchor=tk.NW,
+                                                    state=tk.HIDDEN, tags=('raster',))
+        self.density = DensityRenderer(view_width, view_height, cell_size=4)
+        self.obstacle_items = []   # (obstacle, canvas item) pairs
+        self.hidden_ovals = set()  # Boid ovals currently hidden by culling or level of detail
+        self.glyph_items = []      # Pool of per-cell glyphs drawn at low zoom
+        self.glyph_colors = []     # Fill color of each glyph, None while hidden
+        self.visible_boids = 0
+
         # Initialize boid representations on the canvas with colors
         self.boid_reprs = {}
+        self.boid_colors = {}  # Fill color last sent to Tk for each oval
+        self.render_stats = RenderStats()  # Measured cost of update_canvas
         for boid in self.simulation.boids:
             x, y = boid.position
             boid_id = boid.id
@@ -371,9 +537,13 @@ class BoidGUI:
             oval = self.canvas.create_oval(
                 x - boid.flock.size, y - boid.flock.size,
                 x + boid.flock.size, y + boid.flock.size,
-                fill=color, outline=''
+                fill=color, outline='', tags=('boid',)
             )
             self.boid_reprs[boid_id] = oval
+            self.boid_colors[oval] = color
+        for obstacle in self.simulation.obstacles:
+            self.draw_obstacle(obstacle)
+        self.update_canvas()  # Place everything through the camera
 
     def get_boid_color(self, boid):
         # Return boid's flock color
@@ -420,9 +590,99 @@ class BoidGUI:
             oval = self.canvas.create_oval(
                 x - boid.flock.size, y - boid.flock.size,
                 x + boid.flock.size, y + boid.flock.size,
-                fill=boid.flock.color, outline=''
+                fill=boid.flock.color, outline='', tags=('boid',),
+                state=tk.HIDDEN if self.renderer_mode.get() != 'Canvas' else tk.NORMAL
             )
             self.boid_reprs[boid.id] = oval
+            self.boid_colors[oval] = boid.flock.color
+        self.update_canvas()
+
+    def draw_obstacle(self, obstacle):
+        x, y = self.camera.world_to_screen(obstacle.position[0], obstacle.position[1])
+        radius = obstacle.radius * self.camera.zoom
+        item = self.canvas.create_oval(
+            x - radius, y - radius,
+            x + radius, y + radius,
+            fill=obstacle.color, outline='grey', width=2, tags=('obstacle',),
+            state=tk.HIDDEN if self.renderer_mode.get() != 'Canvas' else tk.NORMAL
+        )
+        self.obstacle_items.append((obstacle, item))
+
+    def update_obstacle_items(self):
+        # Obstacles do not move, so their items are only repositioned when the camera changes
+        if self.obstacle_items:
+            obstacles = [obstacle for obstacle, _ in self.obstacle_items]
+            x, y = self.camera.world_to_screen([o.position[0] for o in obstacles], [o.position[1] for o in obstacles])
+            radius = np.array([o.radius for o in obstacles], dtype='float64') * self.camera.zoom
+            move_ovals(self.canvas, [item for _, item in self.obstacle_items], x, y, radius)
+
+    def screen_obstacles(self):
+        # Obstacles as (x, y, radius, color) in view coordinates, for the raster and density renderers
+        obstacles = []
+        for o in self.simulation.obstacles:
+            x, y = self.camera.world_to_screen(o.position[0], o.position[1])
+            obstacles.append((float(x), float(y), max(1, int(round(o.radius * self.camera.zoom))), o.color))
+        return obstacles
+
+    def start_pan(self, event):
+        self.pan_anchor = (event.x, event.y)
+
+    def drag_pan(self, event):
+        if self.pan_anchor is None:
+            return
+        self.camera.pan(event.x - self.pan_anchor[0], event.y - self.pan_anchor[1])
+        self.pan_anchor = (event.x, event.y)
+        self.camera_changed()
+
+    def zoom_view(self, factor, x, y):
+        self.camera.zoom_at(factor, x, y)
+        self.camera_changed()
+
+    def fit_view(self):
+        self.camera.fit()
+        self.camera_changed()
+
+    def camera_changed(self):
+        self.density.clear()  # Trails from the previous view would smear across the new one
+        self.update_obstacle_items()
+        if self.replay_window is not None:
+            # A replay owns the canvas while it is open, so repaint its current frame instead
+            self.replay_window.redraw()
+            return
+        self.update_canvas()
+        self.update_view_label()
+
+    def update_hud(self):
+        """
+        Draws the performance overlay: FPS, per-phase p50/p99 times, boid
+        count and recording memory. Refreshed twice a second while running.
+        """
+        self.hud_updated = time.perf_counter()
+        if not self.show_hud.get():
+            if self.hud_item is not None:
+                self.canvas.itemconfigure(self.hud_item, state=tk.HIDDEN)
+            return
+        metrics = self.simulation.metrics()
+        phases = metrics['phases']
+        frame_ms = phases['frame']['p50_ms'] if 'frame' in phases else 0.0
+        recording = "recording {:.1f} MB".format(metrics['recording_bytes'] / 1e6)
+        if metrics['spilled_bytes']:
+            recording += " (+{:.1f} MB on disk)".format(metrics['spilled_bytes'] / 1e6)
+        lines = ["FPS {:.1f}  boids {}  drawn {}  {}".format(
+            1000.0 / frame_ms if frame_ms else 0.0, metrics['boids'], self.visible_boids, recording)]
+        lines.append("{:<13} {:>10} {:>10}".format("phase", "p50 ms", "p99 ms"))
+        for phase, values in phases.items():
+            if phase != 'frame':
+                lines.append("{:<13} {:>10.2f} {:>10.2f}".format(phase, values['p50_ms'], values['p99_ms']))
+        text = "\n".join(lines)
+        if self.hud_item is None:
+            self.hud_item = self.canvas.create_text(8, 8, anchor=tk.NW, fill='white', font=('Courier', 9), tags=('hud',))
+        self.canvas.itemconfigure(self.hud_item, text=text, state=tk.NORMAL)
+        self.canvas.tag_raise(self.hud_item)
+
+    def update_view_label(self):
+        self.view_label.config(text="{}, {}/{} boids drawn".format(
+            self.camera.summary(), self.visible_boids, len(self.simulation.boids)))
 
     def initialize_obstacles(self):
         # Removed default obstacles as per user request
@@ -455,11 +715,8 @@ class BoidGUI:
             self.simulation.add_obstacle(position=(x, y), radius=radius, color=color)
 
             # Draw obstacle on canvas
-            circle = self.canvas.create_oval(
-                x - radius, y - radius,
-                x + radius, y + radius,
-                fill=color, outline='grey', width=2
-            )
+            self.draw_obstacle(self.simulation.obstacles[-1])
+            self.update_canvas()
         except Exception as e:
             messagebox.showerror("Error", "An error occurred while adding obstacle:\n{}".format(e))
 
@@ -494,11 +751,8 @@ class BoidGUI:
                     break
                 self.simulation.add_obstacle(position=(x, y), radius=radius, color=color)
                 # Draw obstacle on canvas
-                circle = self.canvas.create_oval(
-                    x - radius, y - radius,
-                    x + radius, y + radius,
-                    fill=color, outline='grey', width=2
-                )
+                self.draw_obstacle(self.simulation.obstacles[-1])
+            self.update_canvas()
         except Exception as e:
             messagebox.showerror("Error", "An error occurred while adding multiple obstacles:\n{}".format(e))
 
@@ -507,12 +761,18 @@ class BoidGUI:
             self.running = True
             self.start_button.config(state=tk.DISABLED)
             self.pause_button.config(state=tk.NORMAL)
-            self.export_button.config(state=tk.DISABLED)
+            if self.export_writer is None:
+                # Exports run in the background, so they stay available while running
+                self.export_button.config(state=tk.NORMAL)
             self.reset_button.config(state=tk.DISABLED)
+            if not profiler.profiling_frames():
+                self.cprofile_button.config(state=tk.NORMAL)
             self.status_label.config(text="Status: Running")
             # Record the start time
             if not self.start_time:
                 self.start_time = time.time()
+            self.scheduler.resume()
+            self.last_render = None  # Do not count the pause as a frame
             self.run_simulation()
             self.update_timer()
 
@@ -521,76 +781,400 @@ class BoidGUI:
             self.running = False
             self.start_button.config(state=tk.NORMAL)
             self.pause_button.config(state=tk.DISABLED)
-            self.export_button.config(state=tk.NORMAL)
+            if self.export_writer is None:
+                self.export_button.config(state=tk.NORMAL)
             self.reset_button.config(state=tk.NORMAL)
+            # No frames run while paused, so a running profile reports what it has
+            profiler.stop_profile()
+            self.cprofile_button.config(state=tk.DISABLED)
             self.status_label.config(text="Status: Paused")
 
+    def update_sim_rate(self):
+        rate = self.sim_rate.get()
+        self.scheduler.set_sim_rate(None if rate == "Max" else float(rate))
+
+    def boid_positions(self, boids):
+        return np.array([boid.position for boid in boids], dtype='float64').reshape(len(boids), 2)
+
     def run_simulation(self):
         if self.running:
-            start_time_loop = time.time()
-
-            # Update simulation with current parameters
+            frame_start = profiler.clock()
+            # Let the scheduler decide how many fixed simulation steps this frame runs
+            steps = self.scheduler.begin_frame()
             separation_radius = self.separation_radius.get()
             alignment_radius = self.alignment_radius.get()
             cohesion_radius = self.cohesion_radius.get()
-            self.simulation.update(separation_radius, alignment_radius, cohesion_radius)
-
-            # Update canvas with new boid positions
-            self.update_canvas()
-
-            # Record data for export
-            self.frame_number += 1
-            self.simulation.record_data(self.frame_number)
-
-            # Calculate elapsed time and schedule next update
-            elapsed_time = time.time() - start_time_loop
-            target_delay = 1.0 / 60.0  # Aim for ~60 FPS
-            delay = max(1, int((target_delay - elapsed_time) * 1000))  # in milliseconds
-            self.root.after(delay, self.run_simulation)  # Update approximately every 16ms
+            step_start = time.perf_counter()
+            for step in range(steps):
+                if step == steps - 1 and self.interpolate.get():
+                    self.previous_positions = self.boid_positions(self.simulation.boids)
+                # Update simulation with current parameters
+                self.simulation.update(separation_radius, alignment_radius, cohesion_radius)
+
+                # Record data for export
+                self.frame_number += 1
+                self.simulation.record_data(self.frame_number)
+            self.scheduler.record_steps(steps, time.perf_counter() - step_start)
+
+            # Update canvas with new boid positions, unless this frame is too late to be worth drawing
+            if self.scheduler.should_render():
+                render_start = time.perf_counter()
+                self.update_canvas()
+                render_end = time.perf_counter()
+                self.scheduler.record_render(render_end - render_start)
+                timings = self.simulation.timings
+                timings.record('update_canvas', render_start, render_end)
+                if self.last_render is not None:
+                    timings.add('frame', render_end - self.last_render)
+                self.last_render = render_end
+                if render_end - self.hud_updated >= 0.5:
+                    self.update_hud()
+
+            profiler.complete('frame', frame_start, profiler.clock(), 'gui', steps=steps)
+            profiler.frame_done()
+
+            # Schedule the next frame at the display deadline (~60 FPS)
+            self.root.after(self.scheduler.next_delay_ms(), self.run_simulation)
+
+    def toggle_trace(self):
+        if not profiler.enabled:
+            profiler.start()
+            self.trace_button.config(text="Save Trace")
+            return
+        profiler.stop()
+        self.trace_button.config(text="Record Trace")
+        file_path = filedialog.asksaveasfilename(
+            title="Save Trace", initialdir='data', initialfile='boid_trace.json', defaultextension='.json',
+            filetypes=[("Chrome trace", "*.json"), ("All files", "*.*")])
+        if file_path:
+            profiler.save_trace(file_path)
+            messagebox.showinfo("Trace Saved", "Saved {:,} events to {}.\nOpen it in chrome://tracing or ui.perfetto.dev.".format(
+                len(profiler.events), file_path))
+
+    def profile_frames(self, frames=300):
+        if profiler.profiling_frames() or not self.running:
+            return
+        self.cprofile_button.config(state=tk.DISABLED)
+        profiler.profile_frames(frames, callback=self.show_profile_report)
+
+    def show_profile_report(self, report):
+        self.cprofile_button.config(state=tk.NORMAL if self.running else tk.DISABLED)
+        window = tk.Toplevel(self.root)
+        window.title("Profile Report")
+        text = tk.Text(window, width=120, height=40, font=('Courier', 9))
+        text.insert(tk.END, report)
+        text.config(state=tk.DISABLED)
+        text.pack(fill=tk.BOTH, expand=1)
+
+    def render_positions(self, boids):
+        """
+        Positions to draw: the current state, or when the simulation runs slower than
+        the display, a blend of the previous and current state by the scheduler's alpha.
+        """
+        positions = self.boid_positions(boids)
+        previous = self.previous_positions
+        if self.running and self.interpolate.get() and previous is not None and previous.shape == positions.shape:
+            positions = previous + self.scheduler.alpha * (positions - previous)
+        return positions
+
+    def update_density_decay(self):
+        # With trails on, each density frame keeps 90% of the previous histogram
+        self.density.decay = 0.9 if self.density_trails.get() else 0.0
+        self.density.clear()
+
+    def apply_renderer(self):
+        # Show either the per-boid canvas items or the image used by the raster and density renderers
+        raster = self.renderer_mode.get() != 'Canvas'
+        self.density.clear()
+        self.canvas.itemconfigure('boid', state=tk.HIDDEN if raster else tk.NORMAL)
+        self.canvas.itemconfigure('obstacle', state=tk.HIDDEN if raster else tk.NORMAL)
+        self.canvas.itemconfigure('raster', state=tk.NORMAL if raster else tk.HIDDEN)
+        self.canvas.itemconfigure('glyph', state=tk.HIDDEN)
+        self.hidden_ovals = set(self.boid_reprs.values()) if raster else set()
+        self.glyph_colors = [None] * len(self.glyph_items)
+        self.update_canvas()
 
     def update_canvas(self):
-        for boid in self.simulation.boids:
-            x, y = boid.position
-            oval = self.boid_reprs.get(boid.id)
-            if oval:
-                # Update position
-                self.canvas.coords(
-                    oval,
-                    x - boid.flock.size, y - boid.flock.size,
-                    x + boid.flock.size, y + boid.flock.size
-                )
-                # Update color in case it changes (optional)
-                self.canvas.itemconfig(oval, fill=boid.flock.color)
+        if self.renderer_mode.get() == 'Raster':
+            self.update_raster()
+            return
+        if self.renderer_mode.get() == 'Density':
+            self.update_density()
+            return
+        self.render_stats.start()
+        boids = [boid for boid in self.simulation.boids if boid.id in self.boid_reprs]
+        visible = []
+        if boids:
+            ovals = [self.boid_reprs[boid.id] for boid in boids]
+            positions = self.render_positions(boids)
+            grid = self.build_grid(positions)
+            if self.camera.zoom < self.LOD_ZOOM:
+                # Level of detail: boids would be specks at this zoom, so draw one glyph per occupied cell
+                self.show_ovals(ovals, visible)
+                self.visible_boids = self.draw_glyphs(grid, positions, boids)
+                self.render_stats.stop(self.visible_boids)
+                return
+            visible = self.cull(grid).tolist()
+            self.show_ovals(ovals, visible)
+            ovals = [ovals[i] for i in visible]
+            boids = [boids[i] for i in visible]
+            x, y = self.camera.world_to_screen(positions[visible, 0], positions[visible, 1])
+            sizes = np.array([boid.flock.size for boid in boids], dtype='float64') * self.camera.zoom
+            # Update all positions with a single batched Tcl evaluation
+            move_ovals(self.canvas, ovals, x, y, sizes)
+            # Only touch fill colors that actually changed since the last frame
+            for boid, oval in zip(boids, ovals):
+                color = self.get_boid_color(boid)
+                if self.boid_colors.get(oval) != color:
+                    self.canvas.itemconfig(oval, fill=color)
+                    self.boid_colors[oval] = color
+        self.hide_glyphs()
+        self.visible_boids = len(visible)
+        self.render_stats.stop(len(visible))
+
+    def build_grid(self, positions):
+        # Culling index with a fixed world cell size, so its size does not grow with the zoom
+        cell_size = max(self.simulation.width, self.simulation.height) / float(self.CULL_CELLS)
+        grid = SpatialGrid(self.simulation.width, self.simulation.height, cell_size)
+        return grid.build(positions[:, 0], positions[:, 1])
+
+    def cull(self, grid):
+        """
+        Indices of the boids inside the camera's view, including boids whose
+        disk only partly overlaps it.
+        """
+        margin = max([flock.size for flock in self.simulation.flocks] or [0])
+        return grid.query_rect(*self.camera.visible_rect(margin))
+
+    def show_ovals(self, ovals, visible):
+        # Show the ovals at the visible indices and hide the rest, touching only items that change state
+        shown = set(ovals[i] for i in visible)
+        hidden = set(ovals) - shown
+        set_state(self.canvas, hidden - self.hidden_ovals, tk.HIDDEN)
+        set_state(self.canvas, shown & self.hidden_ovals, tk.NORMAL)
+        self.hidden_ovals = hidden
+
+    def draw_glyphs(self, grid, positions, boids):
+        """
+        Draws one square per occupied cell in view, in the color of the flock
+        with the most boids there and with an area proportional to the count.
+        Returns the number of boids the glyphs stand for.
+
+        Only the boids the culling grid finds in the view are binned, into
+        glyph cells covering the view and aligned to the world origin.
+        """
+        cell_size = self.GLYPH_SIZE / self.camera.zoom
+        x0, y0, x1, y1 = self.camera.visible_rect()
+        left, top = np.floor(x0 / cell_size) * cell_size, np.floor(y0 / cell_size) * cell_size
+        width = np.ceil((x1 - left) / cell_size) * cell_size
+        height = np.ceil((y1 - top) / cell_size) * cell_size
+        visible = grid.query_rect(left, top, left + width, top + height)
+        if len(visible) == 0:
+            self.hide_glyphs()
+            return 0
+        glyphs = SpatialGrid(width, height, cell_size).build(positions[visible, 0] - left, positions[visible, 1] - top)
+        flocks = self.simulation.flocks
+        index = {flock.flock_id: i for i, flock in enumerate(flocks)}
+        labels = np.array([index[boids[i].flock.flock_id] for i in visible.tolist()], dtype='int64')
+        per_flock = glyphs.cell_labels(labels, len(flocks))
+        counts = per_flock.sum(axis=0)
+        cy, cx = np.nonzero(counts)
+        cell_counts = counts[cy, cx]
+        dominant = per_flock[:, cy, cx].argmax(axis=0)
+        x, y = self.camera.world_to_screen(left + (cx + 0.5) * cell_size, top + (cy + 0.5) * cell_size)
+        half = self.GLYPH_SIZE / 2.0 * np.sqrt(cell_counts / float(max(cell_counts.max(), 1) if len(cell_counts) else 1))
+        while len(self.glyph_items) < len(cell_counts):
+            self.glyph_items.append(self.canvas.create_rectangle(0, 0, 0, 0, outline='', tags=('glyph',)))
+            self.glyph_colors.append(None)
+        items = self.glyph_items[:len(cell_counts)]
+        move_ovals(self.canvas, items, x, y, np.maximum(half, 1.0))
+        set_state(self.canvas, [item for item, color in zip(items, self.glyph_colors) if color is None], tk.NORMAL)
+        recolor_changed(self.canvas, items, [flocks[i].color for i in dominant.tolist()], self.glyph_colors)
+        self.hide_glyphs(start=len(cell_counts))
+        return int(cell_counts.sum())
+
+    def hide_glyphs(self, start=0):
+        hide = [i for i in range(start, len(self.glyph_items)) if self.glyph_colors[i] is not None]
+        set_state(self.canvas, [self.glyph_items[i] for i in hide], tk.HIDDEN)
+        for i in hide:
+            self.glyph_colors[i] = None
+
+    def visible_points(self, boids):
+        """
+        Culled boids for the image renderers: their indices and their
+        positions in view coordinates.
+        """
+        positions = self.render_positions(boids)
+        visible = self.cull(self.build_grid(positions)) if boids else np.empty(0, dtype='int64')
+        x, y = self.camera.world_to_screen(positions[visible, 0], positions[visible, 1])
+        self.visible_boids = len(visible)
+        return visible.tolist(), x, y
+
+    def update_raster(self):
+        self.render_stats.start()
+        self.raster.set_obstacles(self.screen_obstacles())  # Only redraws the background when obstacles or the view changed
+        visible, x, y = self.visible_points(self.simulation.boids)
+        boids = [self.simulation.boids[i] for i in visible]
+        sizes = np.array([boid.flock.size for boid in boids], dtype='float64') * self.camera.zoom
+        sizes = np.maximum(np.rint(sizes), 1).astype('int64')
+        colors = np.array([color_to_rgb(self.get_boid_color(boid)) for boid in boids], dtype='uint8').reshape(len(boids), 3)
+        frame = self.raster.render(x, y, sizes, colors)
+        # Blit the whole framebuffer to the PhotoImage in one call
+        self.raster_image.tk.call(self.raster_image.name, 'put', to_ppm(frame), '-format', 'ppm')
+        self.render_stats.stop(len(boids))
+
+    def update_density(self):
+        self.render_stats.start()
+        self.density.set_obstacles(self.screen_obstacles())
+        flocks = self.simulation.flocks
+        visible, x, y = self.visible_points(self.simulation.boids)
+        boids = [self.simulation.boids[i] for i in visible]
+        index = {flock.flock_id: i for i, flock in enumerate(flocks)}
+        flock_index = np.array([index[boid.flock.flock_id] for boid in boids], dtype='int64')
+        colors = [color_to_rgb(flock.color) for flock in flocks]
+        frame = self.density.render(x, y, flock_index, colors)
+        self.raster_image.tk.call(self.raster_image.name, 'put', to_ppm(frame), '-format', 'ppm')
+        self.render_stats.stop(len(boids))
 
     def export_data(self):
-        try:
-            self.simulation.export_to_csv()
-            messagebox.showinfo("Export Successful", "Simulation data has been exported successfully.")
+        # The export button doubles as a cancel button while an export is in progress
+        if self.export_writer is not None:
+            self.export_writer.cancel()
             self.export_button.config(state=tk.DISABLED)
+            return
+        try:
+            self.export_writer = self.simulation.start_export()
         except Exception as e:
             print("Error exporting data:", e)
             messagebox.showerror("Export Error", "An error occurred while exporting data:\n{}".format(e))
+            return
+        self.export_button.config(text="Cancel Export")
+        self.poll_export()
+
+    def poll_export(self):
+        # Report background export progress without blocking the Tk thread
+        writer = self.export_writer
+        if writer is None:
+            return
+        self.status_label.config(text="Status: {}".format(writer.status_text()))
+        if writer.is_running():
+            self.root.after(200, self.poll_export)
+            return
+        self.export_writer = None
+        self.export_button.config(text="Export CSV", state=tk.NORMAL if self.running else tk.DISABLED)
+        if writer.state == 'done':
+            print("Data exported to {}".format(writer.file_path))
+            messagebox.showinfo("Export Successful", "Simulation data has been exported successfully.\n{}".format(writer.status_text()))
+        elif writer.state == 'error':
+            print("Error exporting data:", writer.error)
+            messagebox.showerror("Export Error", "An error occurred while exporting data:\n{}".format(writer.error))
+        elif writer.state == 'cancelled' and not self.running:
+            # Allow retrying a cancelled export while paused
+            self.export_button.config(state=tk.NORMAL)
+
+    def save_replay(self):
+        # Write the recorded frames to a .traj file in the background
+        self.save_replay_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Status: Saving replay...")
+        result = {}
+        # Snapshot on the Tk thread, which keeps recording while the worker writes
+        write = self.simulation.trajectory_export()
+
+        def save():
+            try:
+                result['path'] = write()
+            except Exception as e:
+                result['error'] = e
+
+        def poll():
+            if thread.is_alive():
+                self.root.after(100, poll)
+                return
+            self.save_replay_button.config(state=tk.NORMAL)
+            if 'error' in result:
+                messagebox.showerror("Replay Error", "An error occurred while saving the replay:\n{}".format(result['error']))
+                self.status_label.config(text="Status: Ready")
+            else:
+                self.status_label.config(text="Status: Replay saved to {}".format(result['path']))
+
+        thread = threading.Thread(target=save, name='replay-save')
+        thread.daemon = True
+        thread.start()
+        poll()
+
+    def open_replay(self):
+        if self.replay_window is not None:
+            return
+        file_path = filedialog.askopenfilename(
+            title="Open Recording", initialdir='data',
+            filetypes=[("Recordings", "*.traj *.csv"), ("All files", "*.*")])
+        if not file_path:
+            return
+        # Replays take over the canvas, so stop the live simulation first
+        self.pause_simulation()
+        self.open_replay_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Status: Loading replay...")
+        prepare_trajectory(file_path, self.show_replay, self.root)
+
+    def show_replay(self, traj_path, error):
+        if error is None:
+            try:
+                self.replay_window = ReplayWindow(self.root, self.canvas, traj_path, self.camera,
+                                                  on_close=self.close_replay)
+                self.start_button.config(state=tk.DISABLED)
+                self.status_label.config(text="Status: Replaying")
+                return
+            except Exception as e:
+                error = e
+        show_error(error)
+        self.close_replay()
+
+    def close_replay(self):
+        self.replay_window = None
+        self.apply_renderer()
+        self.update_hud()
+        self.open_replay_button.config(state=tk.NORMAL)
+        self.start_button.config(state=tk.NORMAL)
+        self.status_label.config(text="Status: Paused" if self.start_time else "Status: Ready")
 
     def reset_simulation(self):
         if messagebox.askyesno("Reset Simulation", "Are you sure you want to reset the simulation?"):
             self.running = False
+            if self.export_writer is not None:
+                self.export_writer.cancel()
+                self.export_writer = None
             self.start_button.config(state=tk.NORMAL)
             self.pause_button.config(state=tk.DISABLED)
-            self.export_button.config(state=tk.DISABLED)
+            self.export_button.config(text="Export CSV", state=tk.DISABLED)
             self.reset_button.config(state=tk.DISABLED)
+            profiler.stop_profile(report=False)
+            self.cprofile_button.config(state=tk.DISABLED)
             self.status_label.config(text="Status: Ready")
 
             # Clear simulation data
             self.simulation.flocks.clear()
             self.simulation.boids.clear()
             self.simulation.obstacles.clear()
-            self.simulation.data_records = []
+            self.simulation.data_records.clear()
             self.simulation.next_flock_id = 1
             self.frame_number = 0
+            self.previous_positions = None
+            self.scheduler.reset()
 
             # Clear canvas except obstacles
             self.canvas.delete("all")
             self.boid_reprs.clear()
+            self.boid_colors.clear()
+            self.obstacle_items = []
+            self.hidden_ovals = set()
+            self.glyph_items = []
+            self.glyph_colors = []
+            self.hud_item = None
+            self.last_render = None
+            self.simulation.timings.clear()
+            self.raster_item = self.canvas.create_image(0, 0, image=self.raster_image, anchor=tk.NW,
+                                                        state=tk.HIDDEN, tags=('raster',))
+            self.apply_renderer()
 
             # Re-initialize obstacles (none, as per user request)
             self.initialize_obstacles()
@@ -607,7 +1191,9 @@ class BoidGUI:
             minutes = (elapsed_seconds % 3600) // 60
             seconds = elapsed_seconds % 60
             time_string = "{:02d}:{:02d}:{:02d}".format(hours, minutes, seconds)
-            self.timer_label.config(text="Elapsed Time: {}".format(time_string))
+            self.timer_label.config(text="Elapsed Time: {}\n{}\n{}".format(
+                time_string, self.render_stats.summary(), self.scheduler.summary()))
+            self.update_view_label()
             # Schedule the next timer update after 1 second
             self.root.after(1000, self.update_timer)
 
@@ -620,6 +1206,12 @@ def main():
 
     # Initialize simulation
     simulation = Simulation(width=800, height=600)
+    # For long runs, a recording policy keeps recording cost and memory bounded, e.g. with
+    # import recording
+    # Simulation(width=800, height=600, recording_policy=recording.CombinedPolicy(
+    #     recording.FrameDecimation(every=5), recording.FlockSampling(fraction=0.25),
+    #     recording.RollingWindow(seconds=600)))
+    # and memory_budget=200 * 1024 ** 2 keeps at most ~200 MB in memory, spilling older frames to disk.
 
     # Add initial flock
     simulation.add_flock(color="blue", num_boids=30, max_speed=4.0, max_force=0.05, size=3)
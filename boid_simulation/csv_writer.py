@@ -0,0 +1,112 @@
+import gzip
+import itertools
+
+import numpy as np
+
+from recording import RECORD_COLUMNS, concat_blocks
+
+# Column order of boid_simulation_datav2.csv, as read by DBScan_analysis.ipynb
+CSV_COLUMNS = ['frame', 'boid_id', 'flock_id', 'color', 'x', 'y', 'vx', 'vy']
+
+# Id and frame columns are downcast before formatting to save chunk memory, which is lossless
+DOWNCAST_DTYPES = {
+    'frame': 'int32',
+    'boid_id': 'int32',
+    'flock_id': 'int32',
+}
+
+# Only downcast with downcast_floats=True: float32 keeps about 7 significant
+# digits, so at 4 decimals positions past about 1000 lose their last digit
+FLOAT32_DTYPES = {
+    'x': 'float32',
+    'y': 'float32',
+    'vx': 'float32',
+    'vy': 'float32',
+}
+
+def csv_columns(colors=None):
+    # The color column is only written when flock colors are known
+    return CSV_COLUMNS if colors is not None else RECORD_COLUMNS
+
+def open_csv(file_path, compress=False, compresslevel=1):
+    """
+    Opens a text file for CSV output, gzip-compressed if requested or if the
+    path ends in .gz. The default compression level favours export speed.
+    """
+    if compress or file_path.endswith('.gz'):
+        return gzip.open(file_path, 'wt', compresslevel=compresslevel, newline='')
+    return open(file_path, 'w', newline='')
+
+def header_line(columns):
+    return ','.join(columns) + '\n'
+
+def downcast_block(block, downcast_floats=False):
+    dtypes = dict(DOWNCAST_DTYPES, **FLOAT32_DTYPES) if downcast_floats else DOWNCAST_DTYPES
+    return {column: values.astype(dtypes.get(column, values.dtype), copy=False)
+            for column, values in block.items()}
+
+def color_column(flock_ids, colors):
+    # Look colors up once per distinct flock instead of once per row
+    flocks, inverse = np.unique(flock_ids, return_inverse=True)
+    palette = np.array([colors.get(int(flock_id), '') for flock_id in flocks], dtype=object)
+    return palette[inverse]
+
+def format_block(block, columns, float_precision=4, colors=None):
+    """
+    Formats a whole column block as CSV text (without header) in one pass.
+    The values are interleaved row-major and fed to a single %-format over a
+    repeated row template, so the per-value formatting happens in C rather
+    than in a Python loop per row.
+    """
+    n = len(block['frame'])
+    if n == 0:
+        return ''
+    float_format = '%.{}f'.format(int(float_precision))
+    formats = []
+    values = []
+    for column in columns:
+        if column == 'color':
+            formats.append('%s')
+            values.append(color_column(block['flock_id'], colors).tolist())
+            continue
+        array = block[column]
+        formats.append(float_format if array.dtype.kind == 'f' else '%d')
+        values.append(array.tolist())
+    row_format = ','.join(formats) + '\n'
+    return (row_format * n) % tuple(itertools.chain.from_iterable(zip(*values)))
+
+def iter_csv_chunks(blocks, chunk_size=50000, float_precision=4, colors=None, downcast_floats=False):
+    """
+    Yields (number of rows, CSV text) for consecutive chunks of about
+    chunk_size rows, starting with the header line. downcast_floats formats
+    positions and velocities from float32 copies, which halves their chunk
+    memory but rounds large values.
+    """
+    columns = csv_columns(colors)
+    yield 0, header_line(columns)
+    pending = []
+    pending_rows = 0
+    for block in blocks:
+        pending.append(block)
+        pending_rows += len(block['frame'])
+        if pending_rows >= chunk_size:
+            chunk = downcast_block(concat_blocks(pending), downcast_floats)
+            yield pending_rows, format_block(chunk, columns, float_precision, colors)
+            pending = []
+            pending_rows = 0
+    if pending:
+        chunk = downcast_block(concat_blocks(pending), downcast_floats)
+        yield pending_rows, format_block(chunk, columns, float_precision, colors)
+
+def write_csv(blocks, file_path, chunk_size=50000, float_precision=4, colors=None, compress=False,
+              downcast_floats=False):
+    """
+    Writes recorded column blocks to a CSV file synchronously.
+    Returns the number of data rows written.
+    """
+    rows = 0
+    with open_csv(file_path, compress) as f:
+        for num_rows, text in iter_csv_chunks(blocks, chunk_size, float_precision, colors, downcast_floats):
+            f.write(text)
+            rows += num_rows
+    return rows
@@ -0,0 +1,112 @@
+"""
+Density heatmap rendering for very large populations.
+
+Instead of drawing every boid, positions are binned per flock into a coarse
+2D histogram with one np.bincount call, and the histogram is turned into a
+heatmap in each flock's color. The cost of drawing depends on the number of
+cells and screen pixels, not on the number of boids. With a decay factor the
+histogram is accumulated across frames, so moving flocks leave fading trails.
+"""
+import numpy as np
+
+from raster import RasterRenderer, color_to_rgb
+
+# ------------------------------
+# Density Renderer Class
+# ------------------------------
+class DensityRenderer:
+    """
+    Bins boids into cells of cell_size pixels and renders the per-flock
+    counts as a heatmap. decay is the fraction of the previous histogram
+    kept each frame (0 shows only the current frame).
+    """
+    def __init__(self, width, height, cell_size=4, decay=0.0, background='black'):
+        self.width = int(width)
+        self.height = int(height)
+        self.cell_size = int(cell_size)
+        self.grid_width = -(-self.width // self.cell_size)
+        self.grid_height = -(-self.height // self.cell_size)
+        self.decay = decay
+        self.background_color = np.array(color_to_rgb(background), dtype='float32')
+        self.counts = None  # (flocks, grid_height, grid_width) accumulated counts
+        self.peak = 0.0     # Slowly decaying reference for the color scale, so brightness does not flicker
+        self.obstacle_layer = RasterRenderer(self.width, self.height, background=background)
+        self.obstacle_mask = None
+        self.obstacle_pixels = None
+
+    def clear(self):
+        self.counts = None
+        self.peak = 0.0
+
+    def histogram(self, x, y, flock_index, num_flocks):
+        """
+        Returns the (num_flocks, grid_height, grid_width) boid counts per cell.
+        flock_index gives each boid's flock as an integer in range(num_flocks).
+        """
+        cx = np.clip((np.asarray(x, dtype='float64') // self.cell_size).astype('int64'), 0, self.grid_width - 1)
+        cy = np.clip((np.asarray(y, dtype='float64') // self.cell_size).astype('int64'), 0, self.grid_height - 1)
+        cells = (np.asarray(flock_index, dtype='int64') * self.grid_height + cy) * self.grid_width + cx
+        counts = np.bincount(cells, minlength=num_flocks * self.grid_height * self.grid_width)
+        return counts.reshape(num_flocks, self.grid_height, self.grid_width)
+
+    def accumulate(self, x, y, flock_index, num_flocks):
+        counts = self.histogram(x, y, flock_index, num_flocks).astype('float32')
+        if self.decay and self.counts is not None and self.counts.shape == counts.shape:
+            self.counts *= self.decay
+            self.counts += counts
+        else:
+            # First frame, no decay, or the number of flocks changed
+            self.counts = counts
+        return self.counts
+
+    def set_obstacles(self, obstacles):
+        """
+        Caches the obstacle pixels drawn over the heatmap. obstacles is a
+        sequence of (x, y, radius, color), as for RasterRenderer.
+        """
+        if self.obstacle_layer.set_obstacles(obstacles) or self.obstacle_mask is None:
+            layer = self.obstacle_layer.visible(self.obstacle_layer.background)
+            mask = np.any(layer != self.background_color.astype('uint8'), axis=2)
+            self.obstacle_mask = mask
+            self.obstacle_pixels = layer[mask]
+
+    def cell_colors(self, counts, flock_colors):
+        """
+        Maps per-flock counts to a (grid_height, grid_width, 3) uint8 image.
+        Each cell gets the count-weighted mix of its flocks' colors, with a
+        brightness on a log scale so sparse cells stay visible next to dense ones.
+        """
+        intensity = np.log1p(counts)
+        self.peak = max(float(intensity.max()) if intensity.size else 0.0, self.peak * 0.98)
+        if self.peak > 0:
+            intensity /= self.peak
+        total = intensity.sum(axis=0)
+        colors = np.asarray(flock_colors, dtype='float32').reshape(-1, 3)
+        mix = np.tensordot(intensity, colors, axes=([0], [0])) / np.maximum(total, 1e-6)[:, :, None]
+        weight = np.minimum(total, 1.0)[:, :, None]
+        image = self.background_color * (1.0 - weight) + mix * weight
+        return np.clip(image, 0, 255).astype('uint8')
+
+    def render(self, x, y, flock_index, flock_colors):
+        """
+        Bins one frame of boids and returns the heatmap as a (height, width, 3)
+        uint8 array. flock_colors is a sequence of RGB values, one per flock.
+        """
+        counts = self.accumulate(x, y, flock_index, len(flock_colors))
+        cells = self.cell_colors(counts, flock_colors)
+        # Scale cells up to screen pixels
+        frame = np.repeat(np.repeat(cells, self.cell_size, axis=0), self.cell_size, axis=1)[:self.height, :self.width]
+        if self.obstacle_mask is not None:
+            frame[self.obstacle_mask] = self.obstacle_pixels
+        return frame
+
+    def render_boids(self, boids, flocks):
+        """
+        Convenience wrapper binning Boid objects by their flock's position in flocks.
+        """
+        index = {flock.flock_id: i for i, flock in enumerate(flocks)}
+        n = len(boids)
+        positions = np.array([boid.position for boid in boids], dtype='float64').reshape(n, 2)
+        flock_index = np.array([index[boid.flock.flock_id] for boid in boids], dtype='int64')
+        colors = [color_to_rgb(flock.color) for flock in flocks]
+        return self.render(positions[:, 0], positions[:, 1], flock_index, colors)
@@ -0,0 +1,168 @@
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from csv_writer import iter_csv_chunks, open_csv
+from profiler import profiler
+from recording import block_rows
+
+# ------------------------------
+# Export Writer Class
+# ------------------------------
+class ExportWriter:
+    """
+    Exports recorded column blocks to a CSV file on background threads.
+
+    A formatter thread converts chunks of blocks into CSV text (see
+    csv_writer.py) and hands them to a writer thread through a bounded
+    queue, so memory held by pending chunks stays capped. The writer streams
+    into a temporary file in the target directory and renames it into place
+    only once the export finishes, so readers never see a half-written file.
+    Progress and throughput can be polled from any thread.
+    """
+
+    def __init__(self, blocks, file_path, colors=None, float_precision=4, compress=False,
+                 chunk_size=50000, queue_size=4, downcast_floats=False):
+        self.blocks = blocks
+        self.file_path = file_path
+        self.colors = colors
+        self.float_precision = float_precision
+        self.downcast_floats = downcast_floats  # See csv_writer.iter_csv_chunks
+        self.compress = compress or file_path.endswith('.gz')
+        self.chunk_size = max(1, int(chunk_size))
+        self.rows_total = sum(block_rows(block) for block in blocks)
+        self.rows_written = 0
+        self.bytes_written = 0  # Uncompressed CSV bytes
+        self.file_size = None   # Bytes on disk once the export is done
+        self.state = 'pending'  # 'running', 'done', 'cancelled' or 'error'
+        self.error = None
+        self.start_time = None
+        self.end_time = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._cancel = threading.Event()
+        self._formatter = threading.Thread(target=self._format_chunks, name='export-formatter')
+        self._writer = threading.Thread(target=self._write_chunks, name='export-writer')
+        self._formatter.daemon = True
+        self._writer.daemon = True
+
+    def start(self):
+        self.state = 'running'
+        self.start_time = time.time()
+        self._formatter.start()
+        self._writer.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        self._writer.join(timeout)
+        return not self._writer.is_alive()
+
+    def is_running(self):
+        return self.state in ('pending', 'running')
+
+    def progress(self):
+        # Fraction of rows written so far, between 0 and 1
+        if self.rows_total == 0:
+            return 1.0 if self.state == 'done' else 0.0
+        return self.rows_written / float(self.rows_total)
+
+    def throughput(self):
+        """
+        Returns (rows per second, megabytes per second) measured since the export started.
+        """
+        if self.start_time is None:
+            return 0.0, 0.0
+        end_time = self.end_time if self.end_time is not None else time.time()
+        elapsed = max(end_time - self.start_time, 1e-9)
+        return self.rows_written / elapsed, self.bytes_written / elapsed / 1e6
+
+    def status_text(self):
+        rows_per_sec, mb_per_sec = self.throughput()
+        if self.state == 'running':
+            return "Exporting {:.0%} ({:,} rows, {:,.0f} rows/s, {:.1f} MB/s)".format(
+                self.progress(), self.rows_written, rows_per_sec, mb_per_sec)
+        if self.state == 'done':
+            return "Exported {:,} rows, {:.1f} MB ({:,.0f} rows/s, {:.1f} MB/s)".format(
+                self.rows_written, (self.file_size or 0) / 1e6, rows_per_sec, mb_per_sec)
+        if self.state == 'cancelled':
+            return "Export cancelled"
+        if self.state == 'error':
+            return "Export failed: {}".format(self.error)
+        return "Export pending"
+
+    def _put(self, item):
+        # Block on the bounded queue but stay responsive to cancellation
+        while not self._cancel.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _format_chunks(self):
+        try:
+            chunks = iter_csv_chunks(self.blocks, self.chunk_size, self.float_precision, self.colors,
+                                     self.downcast_floats)
+            start = profiler.clock()
+            for num_rows, text in chunks:
+                profiler.complete('format chunk', start, profiler.clock(), 'export', rows=num_rows)
+                if self._cancel.is_set():
+                    break
+                if not self._put((num_rows, text)):
+                    break
+                start = profiler.clock()
+        except Exception as e:
+            self.error = e
+            self._cancel.set()
+        finally:
+            # The writer always waits for this sentinel, even after cancellation
+            self._queue.put(None)
+
+    def _write_chunks(self):
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        temp_path = None
+        drained = False
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(self.file_path), suffix='.tmp')
+            os.close(fd)
+            with open_csv(temp_path, self.compress) as f:
+                while True:
+                    item = self._queue.get()
+                    if item is None:
+                        drained = True
+                        break
+                    if self._cancel.is_set():
+                        continue  # Drain the queue so the formatter can finish
+                    num_rows, text = item
+                    with profiler.span('write chunk', 'export', rows=num_rows):
+                        f.write(text)
+                    self.rows_written += num_rows
+                    self.bytes_written += len(text)
+            if self._cancel.is_set():
+                os.remove(temp_path)
+                self.state = 'error' if self.error is not None else 'cancelled'
+            else:
+                # Make sure the data is on disk before the rename makes it visible
+                with profiler.span('fsync and rename', 'export'):
+                    fd = os.open(temp_path, os.O_RDWR)
+                    os.fsync(fd)
+                    os.close(fd)
+                    os.replace(temp_path, self.file_path)
+                self.file_size = os.path.getsize(self.file_path)
+                self.state = 'done'
+        except Exception as e:
+            self.error = e
+            self.state = 'error'
+            self._cancel.set()
+            # Unblock the formatter if it is still waiting on a full queue
+            while not drained:
+                drained = self._queue.get() is None
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+        finally:
+            self.end_time = time.time()
@@ -0,0 +1,203 @@
+"""
+Renders simulation runs to image sequences or raw video without a display.
+
+Frames are rasterized with raster.py on a pool of worker processes, either
+from a recorded .traj file (each worker memory-maps the file and reads only
+its own frames) or from a live Simulation stepped in this process, whose
+positions are streamed to the workers. Output is a numbered PNG sequence or
+a single raw rgb24 stream that ffmpeg can encode:
+
+    python headless_render.py --trajectory data/boid_simulation_data.traj --out frames
+    python headless_render.py --flocks 3 --boids 300 --frames 3600 --format raw --out clip.rgb
+    ffmpeg -f rawvideo -pix_fmt rgb24 -s 800x600 -r 60 -i clip.rgb clip.mp4
+"""
+import argparse
+import multiprocessing
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from raster import RasterRenderer, color_to_rgb
+from trajectory import TrajectoryReader
+
+def encode_png(frame, compresslevel=1):
+    """
+    Encodes an (height, width, 3) uint8 frame as an 8-bit RGB PNG.
+    """
+    height, width = frame.shape[:2]
+    scanlines = np.zeros((height, 1 + width * 3), dtype='uint8')  # Filter byte 0 on every row
+    scanlines[:, 1:] = frame.reshape(height, width * 3)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(scanlines.tobytes(), compresslevel)) + chunk(b'IEND', b''))
+
+# ------------------------------
+# Worker Process State
+# ------------------------------
+_worker = {}
+
+def _init_worker(width, height, obstacles, trajectory_path):
+    _worker['renderer'] = RasterRenderer(width, height)
+    _worker['renderer'].set_obstacles(obstacles)
+    _worker['reader'] = TrajectoryReader(trajectory_path) if trajectory_path else None
+    _worker['palettes'] = {}
+
+def _output(frame, index, out, fmt):
+    if fmt == 'png':
+        with open(os.path.join(out, 'frame_{:06d}.png'.format(index)), 'wb') as f:
+            f.write(encode_png(frame))
+        return None
+    return frame.tobytes()
+
+def _render_points(x, y, radius, colors, index, out, fmt):
+    frame = _worker['renderer'].render(x, y, radius, colors)
+    return _output(frame, index, out, fmt)
+
+def _render_trajectory_frame(index, out, fmt):
+    reader = _worker['reader']
+    rows = reader.read_frame(index)
+    flock_ids, inverse = np.unique(rows['flock_id'], return_inverse=True)
+    key = tuple(flock_ids.tolist())
+    if key not in _worker['palettes']:
+        infos = [reader.flocks.get(int(flock_id), {}) for flock_id in flock_ids]
+        _worker['palettes'][key] = (
+            np.array([info.get('size', 3) for info in infos], dtype='int64'),
+            np.array([color_to_rgb(info.get('color', 'white')) for info in infos], dtype='uint8').reshape(-1, 3),
+        )
+    sizes, colors = _worker['palettes'][key]
+    return _render_points(rows['x'], rows['y'], sizes[inverse], colors[inverse], index, out, fmt)
+
+def _render_trajectory_batch(indices, out, fmt):
+    return [_render_trajectory_frame(index, out, fmt) for index in indices]
+
+def _render_points_batch(batch, out, fmt):
+    return [_render_points(x, y, radius, colors, index, out, fmt) for index, x, y, radius, colors in batch]
+
+# ------------------------------
+# Frame Sources
+# ------------------------------
+def trajectory_batches(reader, batch_size, start=0, stop=None):
+    stop = len(reader) if stop is None else min(stop, len(reader))
+    for first in range(start, stop, batch_size):
+        yield list(range(first, min(first + batch_size, stop)))
+
+def simulation_batches(simulation, num_frames, batch_size, radii=(25, 50, 50)):
+    """
+    Steps a live simulation and yields batches of (index, x, y, radius, colors).
+    """
+    batch = []
+    for index in range(num_frames):
+        simulation.update(*radii)
+        boids = simulation.boids
+        positions = np.array([boid.position for boid in boids], dtype='float32').reshape(len(boids), 2)
+        radius = np.array([boid.flock.size for boid in boids], dtype='int64')
+        colors = np.array([color_to_rgb(boid.flock.color) for boid in boids], dtype='uint8').reshape(len(boids), 3)
+        batch.append((index, positions[:, 0], positions[:, 1], radius, colors))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def render(batches, render_batch, out, fmt, width, height, obstacles=(), trajectory_path=None,
+           workers=None, max_in_flight=None):
+    """
+    Renders batches on a process pool, writing results in frame order.
+    Returns the number of frames rendered.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    if fmt == 'png':
+        os.makedirs(out, exist_ok=True)
+    raw_file = open(out, 'wb') if fmt == 'raw' else None
+    rendered = 0
+    pending = []
+
+    def collect(result):
+        results = result.get()
+        if raw_file is not None:
+            for data in results:
+                raw_file.write(data)
+        return len(results)
+
+    pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                initargs=(width, height, list(obstacles), trajectory_path))
+    try:
+        for batch in batches:
+            pending.append(pool.apply_async(render_batch, (batch, out, fmt)))
+            # Bound the work queued ahead of the writer, and keep raw output in order
+            while len(pending) >= max_in_flight:
+                rendered += collect(pending.pop(0))
+        for result in pending:
+            rendered += collect(result)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        if raw_file is not None:
+            raw_file.close()
+    return rendered
+
+def build_simulation(args):
+    # Imported here so trajectory rendering does not load the GUI module at all
+    from boidfinalwobstacles import Simulation
+    np.random.seed(args.seed)
+    simulation = Simulation(width=args.width, height=args.height)
+    colors = ['blue', 'red', 'green', 'yellow', 'orange', 'purple', 'cyan', 'magenta']
+    for i in range(args.flocks):
+        simulation.add_flock(color=colors[i % len(colors)], num_boids=args.boids)
+    return simulation
+
+def main():
+    parser = argparse.ArgumentParser(description="Render boid runs to PNG sequences or raw video without a display.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--trajectory', help="Recorded .traj file to render")
+    source.add_argument('--flocks', type=int, default=2, help="Number of flocks for a live simulation")
+    parser.add_argument('--boids', type=int, default=30, help="Boids per flock for a live simulation")
+    parser.add_argument('--frames', type=int, default=600, help="Frames to simulate for a live simulation")
+    parser.add_argument('--start', type=int, default=0, help="First trajectory frame to render")
+    parser.add_argument('--stop', type=int, default=None, help="Trajectory frame to stop before (default: all)")
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=('png', 'raw'), default='png')
+    parser.add_argument('--out', required=True, help="Output directory for png, or file for raw rgb24")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch', type=int, default=16, help="Frames per worker task")
+    parser.add_argument('--fps', type=float, default=60.0, help="Playback rate, used for the footage-time report")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.trajectory:
+        reader = TrajectoryReader(args.trajectory)
+        width, height = reader.width, reader.height
+        batches = trajectory_batches(reader, args.batch, args.start, args.stop)
+        count = render(batches, _render_trajectory_batch, args.out, args.format, width, height,
+                       trajectory_path=args.trajectory, workers=args.workers)
+    else:
+        simulation = build_simulation(args)
+        width, height = simulation.width, simulation.height
+        obstacles = [(o.position[0], o.position[1], o.radius, o.color) for o in simulation.obstacles]
+        batches = simulation_batches(simulation, args.frames, args.batch)
+        count = render(batches, _render_points_batch, args.out, args.format, width, height,
+                       obstacles=obstacles, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    footage_minutes = count / args.fps / 60.0
+    print("Rendered {} frames ({}x{}) in {:.1f} s: {:.0f} frames/s, {:.1f} s per minute of footage at {:g} FPS".format(
+        count, width, height, elapsed, count / elapsed if elapsed else 0.0,
+        elapsed / footage_minutes if footage_minutes else 0.0, args.fps))
+    if not args.trajectory:
+        print("Simulation step phases:\n{}".format(simulation.timings.summary()))
+    if args.format == 'raw':
+        print("Encode with: ffmpeg -f rawvideo -pix_fmt rgb24 -s {}x{} -r {:g} -i {} out.mp4".format(
+            width, height, args.fps, args.out))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Low-overhead timing of the phases of a simulation frame.
+
+Each phase keeps a rolling histogram of its most recent samples in
+logarithmic buckets about 10% wide: adding a sample is a couple of array
+writes, and percentiles are read from the bucket counts without sorting.
+"""
+import math
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from profiler import profiler
+
+# ------------------------------
+# Rolling Histogram Class
+# ------------------------------
+class RollingHistogram:
+    """
+    Histogram of the last `window` samples (in seconds) over log-spaced
+    buckets from `low` to `high`. Samples outside the range are clamped
+    to the first or last bucket.
+    """
+    def __init__(self, window=600, low=1e-6, high=10.0, growth=1.1):
+        self.window = window
+        self.low = low
+        self.log_growth = math.log(growth)
+        self.num_buckets = int(math.ceil(math.log(high / low) / self.log_growth)) + 1
+        self.counts = np.zeros(self.num_buckets, dtype='int64')
+        self.ring = np.zeros(window, dtype='int64')  # Bucket of each sample in the window
+        self.position = 0
+        self.size = 0
+        self.total = 0.0    # Sum of all samples ever added
+        self.samples = 0    # Number of samples ever added
+        self.last = 0.0
+
+    def add(self, value):
+        bucket = int(math.log(value / self.low) / self.log_growth) + 1 if value > self.low else 0
+        if bucket >= self.num_buckets:
+            bucket = self.num_buckets - 1
+        if self.size == self.window:
+            self.counts[self.ring[self.position]] -= 1  # Evict the oldest sample
+        else:
+            self.size += 1
+        self.ring[self.position] = bucket
+        self.counts[bucket] += 1
+        self.position = (self.position + 1) % self.window
+        self.total += value
+        self.samples += 1
+        self.last = value
+
+    def clear(self):
+        self.counts[:] = 0
+        self.position = 0
+        self.size = 0
+        self.total = 0.0
+        self.samples = 0
+        self.last = 0.0
+
+    def percentile(self, q):
+        """
+        Approximate q-th percentile (0-100) of the samples in the window,
+        as the geometric middle of the bucket holding it.
+        """
+        if self.size == 0:
+            return 0.0
+        rank = max(1, int(math.ceil(q / 100.0 * self.size)))
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank))
+        if bucket == 0:
+            return self.low
+        return self.low * math.exp((bucket - 0.5) * self.log_growth)
+
+    def mean(self):
+        return self.total / self.samples if self.samples else 0.0
+
+# ------------------------------
+# Phase Timer Class
+# ------------------------------
+class PhaseTimer:
+    """
+    Rolling timings for named phases. Phases are created on first use, so
+    callers outside the simulation (e.g. the GUI) can add their own.
+    When `enabled` is False, timing calls cost a single attribute check.
+    Phases timed with record() or measure() also appear as spans in the
+    profiler's trace while it is recording.
+    """
+    def __init__(self, phases=(), window=600, clock=time.perf_counter):
+        self.window = window
+        self.clock = clock
+        self.enabled = True
+        self.histograms = OrderedDict()  # Phases in the order they were first timed
+        for phase in phases:
+            self.histogram(phase)
+
+    def histogram(self, phase):
+        if phase not in self.histograms:
+            self.histograms[phase] = RollingHistogram(self.window)
+        return self.histograms[phase]
+
+    def add(self, phase, seconds):
+        if self.enabled:
+            self.histogram(phase).add(seconds)
+
+    def record(self, phase, start, end):
+        # Times a phase from clock readings taken by the caller
+        if self.enabled:
+            self.histogram(phase).add(end - start)
+        profiler.complete(phase, start, end)
+
+    @contextmanager
+    def measure(self, phase):
+        if not self.enabled and not profiler.enabled:
+            yield
+            return
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(phase, start, self.clock())
+
+    def clear(self):
+        for histogram in self.histograms.values():
+            histogram.clear()
+
+    def metrics(self):
+        """
+        Returns {phase: {'p50_ms', 'p99_ms', 'mean_ms', 'last_ms', 'count'}}
+        for every phase that has samples.
+        """
+        metrics = OrderedDict()
+        for phase, histogram in self.histograms.items():
+            if histogram.samples:
+                metrics[phase] = {
+                    'p50_ms': histogram.percentile(50) * 1000.0,
+                    'p99_ms': histogram.percentile(99) * 1000.0,
+                    'mean_ms': histogram.mean() * 1000.0,
+                    'last_ms': histogram.last * 1000.0,
+                    'count': histogram.samples,
+                }
+        return metrics
+
+    def summary(self):
+        # One line per phase, for the HUD and console reports
+        lines = []
+        for phase, values in self.metrics().items():
+            lines.append("{:<13} p50 {:7.2f} ms  p99 {:7.2f} ms".format(phase, values['p50_ms'], values['p99_ms']))
+        return "\n".join(lines)
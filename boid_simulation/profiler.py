@@ -0,0 +1,195 @@
+"""
+Runtime profiling with Chrome trace-event export.
+
+The module-level `profiler` records spans (name, start, duration, thread)
+while enabled and writes them as trace-event JSON, which chrome://tracing
+and https://ui.perfetto.dev display as a timeline per thread. Garbage
+collections are recorded as spans too, so GC pauses show up next to the
+frame that suffered them. When disabled, span() returns a shared no-op
+context manager and complete() returns at once, so instrumentation can stay
+in the hot path.
+
+profile_frames(n) additionally runs cProfile over the next n GUI frames and
+produces an aggregated pstats report.
+"""
+import cProfile
+import gc
+import io
+import json
+import os
+import pstats
+import threading
+import time
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = self.profiler.clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.complete(self.name, self.start, self.profiler.clock(), self.category, **self.args)
+        return False
+
+# ------------------------------
+# Profiler Class
+# ------------------------------
+class Profiler:
+    """
+    Collects trace spans while enabled. Safe to use from several threads:
+    events are appended to a list, which is atomic in CPython.
+    """
+    def __init__(self, clock=time.perf_counter, max_events=2000000):
+        self.clock = clock
+        self.max_events = max_events
+        self.enabled = False
+        self.events = []
+        self.dropped = 0
+        self.origin = clock()
+        self._gc_start = None
+        self._cprofile = None
+        self._cprofile_frames = 0
+        self._cprofile_callback = None
+        self.report = None  # Text of the last cProfile report
+
+    def start(self):
+        """
+        Starts recording spans, discarding any previous trace.
+        """
+        self.events = []
+        self.dropped = 0
+        self.origin = self.clock()
+        if self._on_gc not in gc.callbacks:
+            gc.callbacks.append(self._on_gc)
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+
+    def span(self, name, category='sim', **args):
+        """
+        Context manager recording the enclosed block as a span.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def complete(self, name, start, end, category='sim', **args):
+        """
+        Records a span from clock readings taken by the caller.
+        """
+        if not self.enabled:
+            return
+        if len(self.events) >= self.max_events:
+            self.dropped += 1  # Bound memory on very long traces
+            return
+        self.events.append((name, category, start, end, threading.current_thread(), args))
+
+    def _on_gc(self, phase, info):
+        if phase == 'start':
+            self._gc_start = self.clock()
+        elif self._gc_start is not None:
+            self.complete('gc', self._gc_start, self.clock(), 'gc',
+                          generation=info.get('generation'), collected=info.get('collected'))
+            self._gc_start = None
+
+    def trace_events(self):
+        """
+        Returns the recorded spans as a list of Chrome trace-event dicts,
+        with timestamps in microseconds since start().
+        """
+        pid = os.getpid()
+        threads = {}
+        events = []
+        for name, category, start, end, thread, args in list(self.events):
+            threads.setdefault(thread.ident, thread.name)
+            event = {
+                'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': thread.ident,
+                'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6,
+            }
+            if args:
+                event['args'] = args
+            events.append(event)
+        for tid, thread_name in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+        return events
+
+    def save_trace(self, file_path):
+        """
+        Writes the trace as trace-event JSON. Returns the file path.
+        """
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_path, 'w') as f:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms',
+                       'otherData': {'dropped_events': self.dropped}}, f)
+        return file_path
+
+    def profile_frames(self, frames, callback=None, sort='cumulative', limit=40):
+        """
+        Runs cProfile on the calling thread for the next `frames` calls to
+        frame_done(). callback(report) is called with the pstats text when done.
+        """
+        self._cprofile = cProfile.Profile()
+        self._cprofile_frames = frames
+        self._cprofile_total = frames
+        self._cprofile_callback = callback
+        self._cprofile_sort = sort
+        self._cprofile_limit = limit
+        self._cprofile.enable()
+
+    def profiling_frames(self):
+        return self._cprofile is not None
+
+    def frame_done(self):
+        if self._cprofile is None:
+            return
+        self._cprofile_frames -= 1
+        if self._cprofile_frames > 0:
+            return
+        self._finish_profile(self._cprofile_total)
+
+    def stop_profile(self, report=True):
+        """
+        Ends a profile_frames() run early, e.g. when the simulation pauses and
+        no more frames will come. With report=True the callback still gets the
+        report over the frames profiled so far, if there were any.
+        """
+        if self._cprofile is None:
+            return
+        frames = self._cprofile_total - self._cprofile_frames
+        if report and frames > 0:
+            self._finish_profile(frames)
+            return
+        self._cprofile.disable()
+        self._cprofile = None
+
+    def _finish_profile(self, frames):
+        self._cprofile.disable()
+        stream = io.StringIO()
+        stream.write("cProfile over {} frames\n".format(frames))
+        stats = pstats.Stats(self._cprofile, stream=stream)
+        stats.strip_dirs().sort_stats(self._cprofile_sort).print_stats(self._cprofile_limit)
+        self.report = stream.getvalue()
+        self._cprofile = None
+        if self._cprofile_callback is not None:
+            self._cprofile_callback(self.report)
+
+profiler = Profiler()
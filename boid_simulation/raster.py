@@ -0,0 +1,182 @@
+"""
+Raster rendering of boids into a NumPy RGB framebuffer.
+
+Boids are splatted as filled disks with vectorized scatter writes, one pass
+per distinct radius, so the cost grows with the number of covered pixels and
+not with the number of drawable items. Pixels are stored packed as one
+little-endian uint32 per pixel in a buffer with a fixed margin around the
+visible area, so a disk that stays within the margin needs no per-pixel
+bounds checks. Disks reaching past it, such as obstacles or boids when zoomed
+in, are clipped to the buffer, and disks larger than the buffer are drawn as
+one span per buffer row, so no disk costs more than the buffer's pixels.
+Obstacles are drawn once into a cached background layer that is only
+redrawn when the obstacles change. Nothing here depends on Tk, so the same
+code serves the GUI and headless rendering.
+"""
+import numpy as np
+
+PAD = 32  # Margin around the visible area, in pixels
+
+_NAMED_COLORS = {}
+_DISK_OFFSETS = {}
+
+def color_to_rgb(color):
+    """
+    Converts a color name or '#rrggbb' string to an (r, g, b) tuple of ints.
+    """
+    if color in _NAMED_COLORS:
+        return _NAMED_COLORS[color]
+    if color.startswith('#') and len(color) == 7:
+        rgb = tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+    else:
+        # Named colors (Tk and CSS share the common ones) via matplotlib
+        from matplotlib.colors import to_rgb
+        rgb = tuple(int(round(channel * 255)) for channel in to_rgb(color))
+    _NAMED_COLORS[color] = rgb
+    return rgb
+
+def pack_rgb(colors):
+    # (n, 3) uint8 -> (n,) uint32 whose little-endian bytes are r, g, b, 0
+    colors = np.asarray(colors, dtype='uint32').reshape(-1, 3)
+    return (colors[:, 0] | (colors[:, 1] << 8) | (colors[:, 2] << 16)).astype('<u4')
+
+def disk_offsets(radius):
+    """
+    Returns (dy, dx) pixel offsets covering a filled disk of the given radius.
+    """
+    radius = int(radius)
+    if radius not in _DISK_OFFSETS:
+        span = np.arange(-radius, radius + 1)
+        dy, dx = np.meshgrid(span, span, indexing='ij')
+        inside = dx * dx + dy * dy <= radius * radius + radius  # Slightly rounder edge on small disks
+        _DISK_OFFSETS[radius] = (dy[inside], dx[inside])
+    return _DISK_OFFSETS[radius]
+
+def to_ppm(frame):
+    # Binary PPM, which Tk's PhotoImage can load directly from memory
+    height, width = frame.shape[:2]
+    header = 'P6 {} {} 255\n'.format(width, height).encode('ascii')
+    return header + np.ascontiguousarray(frame, dtype='uint8').tobytes()
+
+# ------------------------------
+# Raster Renderer Class
+# ------------------------------
+class RasterRenderer:
+    """
+    Renders boids and obstacles into a reusable framebuffer.
+    """
+    def __init__(self, width, height, background='black'):
+        self.width = int(width)
+        self.height = int(height)
+        self.background_color = color_to_rgb(background)
+        self.pad = PAD
+        self.stride = self.width + 2 * self.pad
+        self.background = None  # Packed background layer including the margin
+        self.packed = np.zeros((self.height + 2 * self.pad, self.stride), dtype='<u4')  # Working buffer, same layout
+        self._obstacles = ()
+        self._obstacle_key = None
+
+    def splat(self, buffer, x, y, radius, packed_colors):
+        """
+        Draws filled disks into a packed, padded buffer in place. x, y and
+        radius are per-point arrays, packed_colors one uint32 per point.
+        """
+        flat = buffer.reshape(-1)
+        xi = np.rint(np.asarray(x, dtype='float64')).astype('int64')
+        yi = np.rint(np.asarray(y, dtype='float64')).astype('int64')
+        radius = np.asarray(radius, dtype='int64')
+        for r in np.unique(radius):
+            # Drop whole disks that cannot touch the visible area
+            selected = ((radius == r) & (xi >= -r) & (xi < self.width + r) &
+                        (yi >= -r) & (yi < self.height + r))
+            # Disks reaching past the margin are clipped; the rest need no bounds checks
+            clipped = selected & ((xi - r < -self.pad) | (xi + r >= self.width + self.pad) |
+                                  (yi - r < -self.pad) | (yi + r >= self.height + self.pad))
+            if clipped.any() and 2 * r + 1 > min(buffer.shape):
+                self._splat_spans(buffer, xi[clipped], yi[clipped], int(r), packed_colors[clipped])
+                selected &= ~clipped
+                clipped[:] = False
+            if not selected.any():
+                continue
+            dy, dx = disk_offsets(r)
+            cy, cx = yi[selected] + self.pad, xi[selected] + self.pad
+            pixels = (cy * self.stride + cx)[:, None] + (dy * self.stride + dx)
+            colors = np.broadcast_to(packed_colors[selected][:, None], pixels.shape)
+            if not clipped.any():
+                flat[pixels.ravel()] = colors.ravel()
+                continue
+            # Only the clipped disks' pixels are checked, and all are written in one
+            # assignment so overlapping disks keep their drawing order
+            inside = np.ones(pixels.shape, dtype=bool)
+            edge = clipped[selected]
+            py, px = cy[edge, None] + dy, cx[edge, None] + dx
+            inside[edge] = (py >= 0) & (py < buffer.shape[0]) & (px >= 0) & (px < self.stride)
+            flat[pixels[inside]] = colors[inside]
+
+    def _splat_spans(self, buffer, xi, yi, radius, packed_colors):
+        # Disks larger than the buffer, one span per buffer row they cross, so
+        # the work is bounded by the buffer and not by the disk's area
+        rows, cols = buffer.shape
+        columns = np.arange(cols)
+        for cx, cy, color in zip((xi + self.pad).tolist(), (yi + self.pad).tolist(), packed_colors.tolist()):
+            top, bottom = max(cy - radius, 0), min(cy + radius + 1, rows)
+            if top >= bottom:
+                continue
+            dy = np.arange(top, bottom) - cy
+            # Widest dx with dx * dx + dy * dy <= radius * radius + radius, as in disk_offsets()
+            limit = radius * radius + radius - dy * dy
+            half = np.floor(np.sqrt(limit)).astype('int64')
+            half += (half + 1) * (half + 1) <= limit
+            half -= half * half > limit
+            inside = (columns >= cx - half[:, None]) & (columns <= cx + half[:, None])
+            buffer[top:bottom][inside] = color
+
+    def _draw_background(self):
+        background = np.empty_like(self.packed)
+        background[:] = pack_rgb([self.background_color])[0]
+        grey = pack_rgb([color_to_rgb('grey')])
+        for x, y, radius, color in self._obstacles:
+            # Grey outline first, then the fill, like the canvas obstacles
+            self.splat(background, [x], [y], [radius + 1], grey)
+            self.splat(background, [x], [y], [max(radius - 1, 0)], pack_rgb([color_to_rgb(color)]))
+        self.background = background
+
+    def set_obstacles(self, obstacles):
+        """
+        Redraws the cached background layer if the obstacles changed.
+        obstacles is a sequence of (x, y, radius, color). Returns True if redrawn.
+        """
+        key = tuple((float(x), float(y), int(radius), color) for x, y, radius, color in obstacles)
+        if key == self._obstacle_key and self.background is not None:
+            return False
+        self._obstacles = key
+        self._obstacle_key = key
+        self._draw_background()
+        return True
+
+    def visible(self, buffer):
+        # (height, width, 3) uint8 view of the visible part of a packed buffer
+        rgba = buffer.view('uint8').reshape(buffer.shape[0], buffer.shape[1], 4)
+        return rgba[self.pad:self.pad + self.height, self.pad:self.pad + self.width, :3]
+
+    def render(self, x, y, radius, colors):
+        """
+        Draws one frame of boids over the background and returns it as a
+        (height, width, 3) uint8 array. colors is an (n, 3) array of RGB values.
+        """
+        if self.background is None:
+            self._draw_background()
+        np.copyto(self.packed, self.background)
+        if len(x):
+            self.splat(self.packed, x, y, radius, pack_rgb(colors))
+        return self.visible(self.packed)
+
+    def render_boids(self, boids):
+        """
+        Convenience wrapper drawing Boid objects, sized and colored by their flock.
+        """
+        n = len(boids)
+        positions = np.array([boid.position for boid in boids], dtype='float64').reshape(n, 2)
+        radius = np.array([boid.flock.size for boid in boids], dtype='int64')
+        colors = np.array([color_to_rgb(boid.flock.color) for boid in boids], dtype='uint8').reshape(n, 3)
+        return self.render(positions[:, 0], positions[:, 1], radius, colors)
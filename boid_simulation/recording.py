@@ -0,0 +1,264 @@
+import collections
+
+import numpy as np
+import pandas as pd
+
+from spill import SpillStore
+
+# Column order of recorded data, matching the exported CSV
+RECORD_COLUMNS = ['frame', 'boid_id', 'flock_id', 'x', 'y', 'vx', 'vy']
+RECORD_DTYPES = {
+    'frame': 'int64',
+    'boid_id': 'int64',
+    'flock_id': 'int64',
+    'x': 'float64',
+    'y': 'float64',
+    'vx': 'float64',
+    'vy': 'float64',
+}
+
+def snapshot_boids(frame_number, boids):
+    """
+    Captures the state of the given boids as a column block: a dict mapping
+    each record column to a NumPy array with one entry per boid.
+    """
+    n = len(boids)
+    positions = np.array([boid.position for boid in boids], dtype='float64').reshape(n, 2)
+    velocities = np.array([boid.velocity for boid in boids], dtype='float64').reshape(n, 2)
+    return {
+        'frame': np.full(n, frame_number, dtype='int64'),
+        'boid_id': np.array([boid.id for boid in boids], dtype='int64'),
+        'flock_id': np.array([boid.flock.flock_id for boid in boids], dtype='int64'),
+        'x': positions[:, 0],
+        'y': positions[:, 1],
+        'vx': velocities[:, 0],
+        'vy': velocities[:, 1],
+    }
+
+def block_rows(block):
+    return len(block['frame'])
+
+def take_rows(block, mask):
+    # Select rows of a column block with a boolean mask or index array
+    return {column: values[mask] for column, values in block.items()}
+
+def concat_blocks(blocks, columns=RECORD_COLUMNS):
+    if not blocks:
+        return {column: np.empty(0, dtype=RECORD_DTYPES.get(column, 'float64')) for column in columns}
+    return {column: np.concatenate([block[column] for block in blocks]) for column in columns}
+
+# ------------------------------
+# Recording Policy Classes
+# ------------------------------
+class RecordingPolicy:
+    """
+    Decides which frames and boids are recorded and how many frames are kept.
+    The base policy records every boid on every frame and keeps everything.
+    """
+    max_frames = None  # Number of most recent frames to retain, None for unlimited
+
+    def should_record(self, frame_number):
+        return True
+
+    def select(self, block):
+        return block
+
+class FrameDecimation(RecordingPolicy):
+    """
+    Records only every k-th frame.
+    """
+    def __init__(self, every=1):
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        self.every = int(every)
+
+    def should_record(self, frame_number):
+        return frame_number % self.every == 0
+
+class FlockSampling(RecordingPolicy):
+    """
+    Records a fixed random subset of boids from each flock (stratified by flock_id).
+    Either a fraction of each flock or a maximum count per flock can be given.
+    Boids are assigned to the sample the first time they are seen, so the same
+    boids are tracked on every recorded frame.
+    """
+    def __init__(self, fraction=None, per_flock=None, seed=None):
+        if (fraction is None) == (per_flock is None):
+            raise ValueError("Specify exactly one of fraction or per_flock")
+        if fraction is not None and not 0 < fraction <= 1:
+            raise ValueError("fraction must be in (0, 1]")
+        self.fraction = fraction
+        self.per_flock = per_flock
+        self.random_state = np.random.RandomState(seed)
+        self._decided = np.zeros(0, dtype=bool)
+        self._selected = np.zeros(0, dtype=bool)
+        self._selected_per_flock = collections.Counter()
+
+    def _grow(self, size):
+        if size > len(self._decided):
+            new_size = max(size, 2 * len(self._decided))
+            self._decided = np.concatenate([self._decided, np.zeros(new_size - len(self._decided), dtype=bool)])
+            self._selected = np.concatenate([self._selected, np.zeros(new_size - len(self._selected), dtype=bool)])
+
+    def _decide(self, boid_ids, flock_ids):
+        # Pick the sample for boids that have not been seen before, flock by flock
+        flocks, inverse = np.unique(flock_ids, return_inverse=True)
+        for index, flock_id in enumerate(flocks):
+            members = boid_ids[inverse == index]
+            if self.fraction is not None:
+                count = int(np.ceil(self.fraction * len(members)))
+            else:
+                count = min(len(members), max(0, self.per_flock - self._selected_per_flock[flock_id]))
+            chosen = self.random_state.permutation(members)[:count]
+            self._selected[chosen] = True
+            self._selected_per_flock[flock_id] += count
+        self._decided[boid_ids] = True
+
+    def select(self, block):
+        boid_ids = block['boid_id']
+        if len(boid_ids) == 0:
+            return block
+        self._grow(int(boid_ids.max()) + 1)
+        new = ~self._decided[boid_ids]
+        if new.any():
+            self._decide(boid_ids[new], block['flock_id'][new])
+        return take_rows(block, self._selected[boid_ids])
+
+class RollingWindow(RecordingPolicy):
+    """
+    Keeps only the most recent frames: either max_frames directly, or the last
+    `seconds` of simulation at the given frame rate.
+    """
+    def __init__(self, max_frames=None, seconds=None, fps=60):
+        if (max_frames is None) == (seconds is None):
+            raise ValueError("Specify exactly one of max_frames or seconds")
+        if max_frames is None:
+            max_frames = int(round(seconds * fps))
+        if max_frames < 1:
+            raise ValueError("The rolling window must hold at least one frame")
+        self.max_frames = int(max_frames)
+
+class CombinedPolicy(RecordingPolicy):
+    """
+    Chains several policies: a frame is recorded only if every policy accepts it,
+    boid selections are applied in order, and the tightest frame window wins.
+    """
+    def __init__(self, *policies):
+        self.policies = policies
+        windows = [policy.max_frames for policy in policies if policy.max_frames is not None]
+        self.max_frames = min(windows) if windows else None
+
+    def should_record(self, frame_number):
+        return all(policy.should_record(frame_number) for policy in self.policies)
+
+    def select(self, block):
+        for policy in self.policies:
+            block = policy.select(block)
+        return block
+
+# ------------------------------
+# Recording Buffer Class
+# ------------------------------
+def block_nbytes(block):
+    return sum(values.nbytes for values in block.values())
+
+class RecordingBuffer:
+    """
+    Holds recorded frames as column blocks, one block per frame. When the
+    policy has a rolling window, the oldest frames are dropped automatically.
+
+    With a memory_budget (in bytes), the oldest frames in memory are spilled
+    to a SpillStore on disk (under spill_dir, or the system temp directory)
+    whenever the blocks in memory would exceed the budget. Spilling frees
+    memory down to half the budget at a time, so each spill writes one
+    sizeable segment. Spilled frames stay part of the recording: snapshot(),
+    len() and to_dataframe() cover them, oldest first.
+    """
+    def __init__(self, policy=None, memory_budget=None, spill_dir=None):
+        self.policy = policy if policy is not None else RecordingPolicy()
+        self.blocks = collections.deque()
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.spill = None       # SpillStore, created on the first spill
+        self._nbytes = 0        # Bytes of the blocks in memory
+        self._rows = 0          # Rows of the blocks in memory
+
+    def record(self, frame_number, boids):
+        # Skip gathering boid state entirely on frames the policy rejects
+        if not self.policy.should_record(frame_number):
+            return
+        block = self.policy.select(snapshot_boids(frame_number, boids))
+        self.blocks.append(block)
+        self._nbytes += block_nbytes(block)
+        self._rows += block_rows(block)
+        max_frames = self.policy.max_frames
+        if max_frames is not None and self.num_frames() > max_frames:
+            self._drop_oldest(self.num_frames() - max_frames)
+        if self.memory_budget is not None and self._nbytes > self.memory_budget:
+            self._spill(self.memory_budget // 2)
+
+    def _pop_oldest(self):
+        block = self.blocks.popleft()
+        self._nbytes -= block_nbytes(block)
+        self._rows -= block_rows(block)
+        return block
+
+    def _drop_oldest(self, count):
+        # Rolling window: spilled frames are the oldest, so they go first
+        if self.spill is not None:
+            dropped = min(count, len(self.spill))
+            self.spill.drop_oldest(dropped)
+            count -= dropped
+        for _ in range(count):
+            self._pop_oldest()
+
+    def _spill(self, target):
+        blocks = []
+        while self.blocks and self._nbytes > target:
+            blocks.append(self._pop_oldest())
+        if self.spill is None:
+            self.spill = SpillStore(self.spill_dir)
+        self.spill.append(blocks)
+
+    def clear(self):
+        self.blocks.clear()
+        self._nbytes = 0
+        self._rows = 0
+        if self.spill is not None:
+            self.spill.clear()
+
+    def __len__(self):
+        # Number of recorded rows, in memory and spilled
+        return self._rows + (self.spill.rows if self.spill is not None else 0)
+
+    def num_frames(self):
+        return len(self.blocks) + (len(self.spill) if self.spill is not None else 0)
+
+    def nbytes(self):
+        # Bytes held in memory
+        return self._nbytes
+
+    def spilled_nbytes(self):
+        # Bytes on disk for the spilled frames still part of the recording
+        return self.spill.nbytes() if self.spill is not None else 0
+
+    def spilled_frames(self):
+        return len(self.spill) if self.spill is not None else 0
+
+    def snapshot(self):
+        """
+        Returns every recorded frame as a list of column blocks, oldest first.
+        Blocks are never modified once recorded, and spilled blocks are
+        read-only views of their segment files, so this is a consistent view.
+        """
+        spilled = self.spill.blocks() if self.spill is not None else []
+        return spilled + list(self.blocks)
+
+    def close(self):
+        # Deletes any spill files; call when the recording is no longer needed
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+    def to_dataframe(self):
+        return pd.DataFrame(concat_blocks(self.snapshot()), columns=RECORD_COLUMNS)
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+import numpy as np
+
+from canvas_batch import RenderStats, move_ovals, recolor_changed, set_state
+from trajectory import TrajectoryPlayer, TrajectoryReader, convert_csv
+
+# ------------------------------
+# Replay Window Class
+# ------------------------------
+class ReplayWindow:
+    """
+    Plays a recorded .traj file on the main canvas with play/pause, a scrub
+    bar and frame stepping. Playback follows the wall clock at the chosen
+    frame rate, skipping frames when drawing falls behind rather than slowing
+    down, while a TrajectoryPlayer prefetches upcoming frames in the background.
+
+    Frames are drawn through the main window's camera, so the replay can be
+    zoomed and panned like the live view; redraw() repaints the current frame
+    after the camera moves.
+    """
+    def __init__(self, root, canvas, file_path, camera, fps=60, on_close=None):
+        self.root = root
+        self.canvas = canvas
+        self.camera = camera
+        self.reader = TrajectoryReader(file_path)
+        self.player = TrajectoryPlayer(self.reader, window=2 * fps)
+        self.fps = fps
+        self.on_close = on_close
+        self.playing = False
+        self.current = 0
+        self.play_origin = None  # (wall clock time, frame index) when playback last started
+        self.items = []          # Pool of canvas ovals reused across frames
+        self.item_colors = []
+        self.visible_boids = 0
+        self.frames_drawn = 0
+        self.render_stats = RenderStats()
+        self.draw_fps = 0.0
+        self._fps_window_start = time.time()
+        self._scrubbing = False
+
+        # Hide the live simulation while the recording is shown
+        self.canvas.itemconfigure('all', state='hidden')
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Replay: {}".format(os.path.basename(file_path)))
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        controls = ttk.Frame(self.window)
+        controls.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(controls, text="<", width=3, command=lambda: self.step(-1)).pack(side=tk.LEFT)
+        self.play_button = ttk.Button(controls, text="Play", command=self.toggle_play)
+        self.play_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls, text=">", width=3, command=lambda: self.step(1)).pack(side=tk.LEFT)
+
+        self.position = tk.DoubleVar(value=0)
+        self.scrubber = ttk.Scale(self.window, from_=0, to=max(0, len(self.reader) - 1), variable=self.position,
+                                  command=self.scrub, length=500)
+        self.scrubber.pack(fill=tk.X, padx=10)
+        self.scrubber.bind('<ButtonPress-1>', lambda event: setattr(self, '_scrubbing', True))
+        self.scrubber.bind('<ButtonRelease-1>', lambda event: setattr(self, '_scrubbing', False))
+
+        self.frame_label = ttk.Label(self.window, text="")
+        self.frame_label.pack(pady=5)
+
+        self.show(0)
+
+    def toggle_play(self):
+        if self.playing:
+            self.playing = False
+            self.play_button.config(text="Play")
+            return
+        if self.current >= len(self.reader) - 1:
+            self.current = 0  # Restart from the beginning once the end was reached
+        self.playing = True
+        self.play_button.config(text="Pause")
+        self.play_origin = (time.time(), self.current)
+        self.tick()
+
+    def step(self, delta):
+        self.playing = False
+        self.play_button.config(text="Play")
+        self.show(self.current + delta)
+
+    def scrub(self, value):
+        index = int(float(value))
+        if index != self.current:
+            self.show(index)
+            if self.playing:
+                self.play_origin = (time.time(), self.current)
+
+    def tick(self):
+        if not self.playing:
+            return
+        started, origin = self.play_origin
+        # Derive the frame from the wall clock so slow draws skip frames instead of lagging
+        target = origin + int((time.time() - started) * self.fps)
+        if target >= len(self.reader):
+            target = len(self.reader) - 1
+            self.playing = False
+            self.play_button.config(text="Play")
+        if target != self.current:
+            self.show(target)
+        if self.playing:
+            self.root.after(max(1, int(1000 / self.fps / 2)), self.tick)
+
+    def redraw(self):
+        # Repaints the current frame, e.g. after the camera was panned or zoomed
+        self.show(self.current)
+
+    def show(self, index):
+        if len(self.reader) == 0:
+            self.frame_label.config(text="Empty recording")
+            return
+        index = min(max(0, index), len(self.reader) - 1)
+        self.current = index
+        self.draw(self.player.get_frame(index))
+        if not self._scrubbing:
+            self.position.set(index)
+        self.update_fps()
+        self.frame_label.config(text="Frame {} ({}/{})  {:.0f} FPS  prefetched {}  drawn {}\n{}".format(
+            self.reader.frame_number(index), index + 1, len(self.reader), self.draw_fps, len(self.player.cache),
+            self.visible_boids, self.render_stats.summary()))
+
+    def draw(self, rows):
+        self.render_stats.start()
+        flock_ids, inverse = np.unique(rows['flock_id'], return_inverse=True)
+        infos = [self.reader.flocks.get(int(flock_id), {}) for flock_id in flock_ids]
+        flock_sizes = np.array([info.get('size', 3) for info in infos], dtype='float64')
+        # Cull to the camera's view, keeping boids whose disk only partly overlaps it
+        x0, y0, x1, y1 = self.camera.visible_rect(flock_sizes.max() if len(flock_sizes) else 0)
+        x, y = rows['x'], rows['y']
+        visible = np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+        inverse = inverse[visible]
+        sizes = flock_sizes[inverse] * self.camera.zoom
+        colors = [infos[i].get('color', 'white') for i in inverse.tolist()]
+        # Grow the item pool as needed and hide items beyond the visible boid count
+        while len(self.items) < len(visible):
+            self.items.append(self.canvas.create_oval(0, 0, 0, 0, outline='', tags=('replay',)))
+            self.item_colors.append(None)
+        items = self.items[:len(visible)]
+        screen_x, screen_y = self.camera.world_to_screen(x[visible], y[visible])
+        move_ovals(self.canvas, items, screen_x, screen_y, sizes)
+        set_state(self.canvas, [item for item, color in zip(items, self.item_colors) if color is None], 'normal')
+        recolor_changed(self.canvas, items, colors, self.item_colors)
+        hide = [i for i in range(len(visible), len(self.items)) if self.item_colors[i] is not None]
+        set_state(self.canvas, [self.items[i] for i in hide], 'hidden')
+        for i in hide:
+            self.item_colors[i] = None
+        self.visible_boids = len(visible)
+        self.render_stats.stop(len(visible))
+
+    def update_fps(self):
+        self.frames_drawn += 1
+        now = time.time()
+        if now - self._fps_window_start >= 0.5:
+            self.draw_fps = self.frames_drawn / (now - self._fps_window_start)
+            self.frames_drawn = 0
+            self._fps_window_start = now
+
+    def close(self):
+        self.playing = False
+        self.player.close()
+        self.canvas.delete('replay')
+        self.canvas.itemconfigure('all', state='normal')
+        self.window.destroy()
+        if self.on_close:
+            self.on_close()
+
+def prepare_trajectory(file_path, on_ready, root):
+    """
+    Resolves a replay file chosen by the user. CSV exports are converted to a
+    .traj file next to them on a background thread (once; later replays reuse
+    it). on_ready(traj_path, error) is called back on the Tk thread.
+    """
+    if not file_path.endswith('.csv'):
+        on_ready(file_path, None)
+        return
+    traj_path = os.path.splitext(file_path)[0] + '.traj'
+    if os.path.exists(traj_path) and os.path.getmtime(traj_path) >= os.path.getmtime(file_path):
+        on_ready(traj_path, None)
+        return
+    result = {}
+
+    def convert():
+        try:
+            convert_csv(file_path, traj_path)
+        except Exception as e:
+            result['error'] = e
+        result['done'] = True
+
+    def poll():
+        if 'done' not in result:
+            root.after(100, poll)
+        else:
+            on_ready(traj_path, result.get('error'))
+
+    thread = threading.Thread(target=convert, name='trajectory-convert')
+    thread.daemon = True
+    thread.start()
+    poll()
+
+def show_error(error):
+    messagebox.showerror("Replay Error", "Could not open the recording:\n{}".format(error))
@@ -0,0 +1,137 @@
+import time
+
+# ------------------------------
+# Frame Scheduler Class
+# ------------------------------
+class FrameScheduler:
+    """
+    Decouples simulation steps from displayed frames.
+
+    Simulation time advances in fixed steps of 1/sim_rate seconds, driven by
+    an accumulator of elapsed wall-clock time. When rendering is slow,
+    several steps run per displayed frame; when the simulation is slower
+    than the display, frames with no new step are drawn with positions
+    interpolated by `alpha`, the fraction of a step accumulated so far.
+    With sim_rate=None the simulation runs as fast as possible: each frame
+    runs as many steps as fit in the time left before the next display
+    deadline.
+
+    A render is skipped when the frame is already more than one display
+    interval late (but never twice in a row). At most max_steps_per_frame
+    steps run per frame; simulated time beyond that is dropped and counted
+    as drift, so a slow machine slows the simulation down instead of
+    spiralling into ever longer frames.
+    """
+    def __init__(self, sim_rate=60.0, display_rate=60.0, max_steps_per_frame=8, clock=time.perf_counter):
+        self.sim_rate = sim_rate
+        self.display_interval = 1.0 / display_rate
+        self.max_steps_per_frame = max_steps_per_frame
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.accumulator = 0.0
+        self.last_time = None
+        self.next_deadline = None
+        self.frame_start = None
+        self.frames = 0           # Scheduler ticks
+        self.rendered = 0         # Frames actually drawn
+        self.dropped = 0          # Renders skipped because the frame was late
+        self.steps = 0            # Simulation steps run
+        self.drift = 0.0          # Simulated seconds dropped to keep up with the wall clock
+        self.step_time = 0.0      # Moving average of seconds per simulation step
+        self.render_time = 0.0    # Moving average of seconds per render
+        self._skipped_last = False
+
+    def resume(self):
+        # Forget the time spent paused so it is not simulated or counted as drift
+        self.last_time = None
+        self.accumulator = 0.0
+
+    @property
+    def step_interval(self):
+        return 1.0 / self.sim_rate if self.sim_rate else None
+
+    @property
+    def alpha(self):
+        # Interpolation factor between the previous and current simulation state
+        if not self.sim_rate:
+            return 1.0
+        return min(1.0, self.accumulator / self.step_interval)
+
+    def set_sim_rate(self, sim_rate):
+        self.sim_rate = sim_rate
+        self.accumulator = 0.0
+
+    def begin_frame(self):
+        """
+        Returns the number of simulation steps to run for this frame.
+        """
+        now = self.clock()
+        self.frame_start = now
+        if self.last_time is None:
+            self.last_time = now
+            self.next_deadline = now
+        elapsed = now - self.last_time
+        self.last_time = now
+        self.frames += 1
+        if not self.sim_rate:
+            # As fast as possible: fill the time left before the display deadline
+            budget = max(self.display_interval - self.render_time, 0.0)
+            if self.step_time > 0:
+                steps = int(budget / self.step_time)
+            else:
+                steps = 1
+            return max(1, min(steps, self.max_steps_per_frame))
+        self.accumulator += elapsed
+        steps = int(self.accumulator / self.step_interval)
+        if steps > self.max_steps_per_frame:
+            self.drift += (steps - self.max_steps_per_frame) * self.step_interval
+            self.accumulator -= (steps - self.max_steps_per_frame) * self.step_interval
+            steps = self.max_steps_per_frame
+        self.accumulator -= steps * self.step_interval
+        return steps
+
+    def record_steps(self, steps, seconds):
+        if steps:
+            self.steps += steps
+            self._smooth('step_time', seconds / steps)
+
+    def should_render(self):
+        """
+        False when this frame is already a full display interval past its
+        deadline, in which case drawing it would only delay the next one.
+        """
+        # Never skip two renders in a row, or a slow step rate would freeze the display
+        if not self._skipped_last and self.clock() - self.next_deadline > self.display_interval:
+            self.dropped += 1
+            self._skipped_last = True
+            self._advance_deadline()
+            return False
+        self._skipped_last = False
+        return True
+
+    def record_render(self, seconds):
+        self.rendered += 1
+        self._smooth('render_time', seconds)
+        self._advance_deadline()
+
+    def next_delay_ms(self):
+        # Milliseconds until the next display deadline, for root.after
+        return max(1, int(round((self.next_deadline - self.clock()) * 1000)))
+
+    def _advance_deadline(self):
+        now = self.clock()
+        self.next_deadline += self.display_interval
+        if self.next_deadline < now:
+            # Too far behind to catch up: realign instead of bursting frames
+            self.next_deadline = now + self.display_interval
+
+    def _smooth(self, name, value, smoothing=0.1):
+        current = getattr(self, name)
+        setattr(self, name, value if current == 0 else current + smoothing * (value - current))
+
+    def summary(self):
+        steps_per_frame = self.steps / float(self.frames) if self.frames else 0.0
+        return "Steps/frame {:.2f}, dropped {}/{}, drift {:.1f} s".format(
+            steps_per_frame, self.dropped, self.frames, self.drift)
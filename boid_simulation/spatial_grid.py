@@ -0,0 +1,83 @@
+"""
+Uniform grid index over boid positions.
+
+Points are bucketed into square cells with a counting sort (one argsort and
+one bincount), so building the index is a few vectorized passes over the
+positions and a rectangle query only touches the cells it overlaps.
+"""
+import numpy as np
+
+# ------------------------------
+# Spatial Grid Class
+# ------------------------------
+class SpatialGrid:
+    """
+    Buckets points of a width x height world into cells of cell_size.
+    Call build() with the current positions before querying.
+    """
+    def __init__(self, width, height, cell_size):
+        self.width = width
+        self.height = height
+        self.cell_size = float(cell_size)
+        self.grid_width = max(1, int(np.ceil(width / self.cell_size)))
+        self.grid_height = max(1, int(np.ceil(height / self.cell_size)))
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.cells = np.empty(0, dtype='int64')
+        self.order = np.empty(0, dtype='int64')   # Point indices sorted by cell
+        self.starts = np.zeros(self.grid_width * self.grid_height + 1, dtype='int64')
+
+    def cell_coords(self, x, y):
+        cx = np.clip((np.asarray(x, dtype='float64') // self.cell_size).astype('int64'), 0, self.grid_width - 1)
+        cy = np.clip((np.asarray(y, dtype='float64') // self.cell_size).astype('int64'), 0, self.grid_height - 1)
+        return cx, cy
+
+    def build(self, x, y):
+        self.x = np.asarray(x, dtype='float64')
+        self.y = np.asarray(y, dtype='float64')
+        cx, cy = self.cell_coords(self.x, self.y)
+        self.cells = cy * self.grid_width + cx
+        self.order = np.argsort(self.cells, kind='stable')
+        counts = np.bincount(self.cells, minlength=self.grid_width * self.grid_height)
+        self.starts = np.concatenate(([0], np.cumsum(counts)))
+        return self
+
+    def counts(self):
+        # Number of points per cell, as a (grid_height, grid_width) array
+        return np.diff(self.starts).reshape(self.grid_height, self.grid_width)
+
+    def cell_range(self, x0, y0, x1, y1):
+        """
+        Returns the (cx0, cy0, cx1, cy1) cell bounds, inclusive, overlapping
+        the rectangle, or None if it lies outside the grid.
+        """
+        if x1 < 0 or y1 < 0 or x0 > self.width or y0 > self.height:
+            return None
+        cx0, cy0 = self.cell_coords(max(x0, 0), max(y0, 0))
+        cx1, cy1 = self.cell_coords(min(x1, self.width), min(y1, self.height))
+        return int(cx0), int(cy0), int(cx1), int(cy1)
+
+    def query_rect(self, x0, y0, x1, y1):
+        """
+        Returns the indices of the points inside the rectangle, sorted.
+        """
+        bounds = self.cell_range(x0, y0, x1, y1)
+        if bounds is None or len(self.order) == 0:
+            return np.empty(0, dtype='int64')
+        cx0, cy0, cx1, cy1 = bounds
+        # Each row of overlapped cells is one contiguous run of the sorted order
+        rows = np.arange(cy0, cy1 + 1) * self.grid_width
+        runs = [self.order[self.starts[row + cx0]:self.starts[row + cx1 + 1]] for row in rows]
+        candidates = np.concatenate(runs)
+        px, py = self.x[candidates], self.y[candidates]
+        inside = (px >= x0) & (px <= x1) & (py >= y0) & (py <= y1)
+        return np.sort(candidates[inside])
+
+    def cell_labels(self, labels, num_labels):
+        """
+        Counts points per cell and label, returning a (num_labels, grid_height,
+        grid_width) array. labels gives each point an integer in range(num_labels).
+        """
+        flat = np.asarray(labels, dtype='int64') * (self.grid_width * self.grid_height) + self.cells
+        counts = np.bincount(flat, minlength=num_labels * self.grid_width * self.grid_height)
+        return counts.reshape(num_labels, self.grid_height, self.grid_width)
@@ -0,0 +1,166 @@
+"""
+On-disk columnar storage for recorded frames that no longer fit in memory.
+
+Each spill writes one segment file holding a batch of frames column by
+column (all frame numbers, then all boid ids, and so on), in the recorded
+dtypes, so nothing is lost. Segments are read back through np.memmap, so
+spilled frames come back as column blocks whose arrays are views of the
+file and are only paged in when read. Old frames are dropped a segment at
+a time, and the spill directory is removed when the store is cleared or
+garbage collected.
+"""
+import collections
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy as np
+
+# ------------------------------
+# Spill Segment Class
+# ------------------------------
+class SpillSegment:
+    """
+    One file of spilled frames. rows[i]:rows[i + 1] are the rows of frame i.
+    """
+    def __init__(self, path, blocks):
+        self.path = path
+        self.columns = list(blocks[0].keys())
+        counts = [len(block[self.columns[0]]) for block in blocks]
+        self.rows = np.concatenate(([0], np.cumsum(counts))).astype('int64')
+        self.layout = collections.OrderedDict()  # Column -> (byte offset, dtype)
+        offset = 0
+        with open(path, 'wb') as f:
+            for column in self.columns:
+                values = np.concatenate([block[column] for block in blocks])
+                self.layout[column] = (offset, values.dtype)
+                f.write(values.tobytes())
+                offset += values.nbytes
+        self.nbytes = offset
+        self.row_nbytes = sum(dtype.itemsize for _, dtype in self.layout.values())  # Bytes per row, all columns
+        self._arrays = None
+
+    def __len__(self):
+        return len(self.rows) - 1
+
+    def arrays(self):
+        # Memory-mapped columns, opened on first read
+        if self._arrays is None:
+            total = int(self.rows[-1])
+            self._arrays = {}
+            for column, (offset, dtype) in self.layout.items():
+                if total == 0:
+                    self._arrays[column] = np.empty(0, dtype=dtype)
+                else:
+                    self._arrays[column] = np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=(total,))
+        return self._arrays
+
+    def nbytes_from(self, i):
+        # Bytes of the rows of frames i onward
+        return int(self.rows[-1] - self.rows[i]) * self.row_nbytes
+
+    def block(self, i):
+        arrays = self.arrays()
+        start, stop = self.rows[i], self.rows[i + 1]
+        return {column: arrays[column][start:stop] for column in self.columns}
+
+# ------------------------------
+# Spill Store Class
+# ------------------------------
+class SpillStore:
+    """
+    Append-only sequence of spilled frames in a temporary directory (under
+    `directory` if given), oldest first.
+    """
+    def __init__(self, directory=None):
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix='boid_spill_', dir=directory)
+        self.segments = collections.deque()
+        self.first = 0            # Frames already dropped from the oldest segment
+        self.frames = 0           # Frames currently stored
+        self.rows = 0             # Rows currently stored
+        self.spilled_bytes = 0    # Bytes written since the store was created or cleared
+        self._next_id = 0
+        self._pending_delete = []  # Files still mapped by a reader when they were dropped
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+    def __len__(self):
+        return self.frames
+
+    def append(self, blocks):
+        """
+        Writes blocks (oldest first) to a new segment.
+        """
+        if not blocks:
+            return
+        path = os.path.join(self.directory, 'segment_{:06d}.bin'.format(self._next_id))
+        self._next_id += 1
+        segment = SpillSegment(path, blocks)
+        self.segments.append(segment)
+        self.frames += len(segment)
+        self.rows += int(segment.rows[-1])
+        self.spilled_bytes += segment.nbytes
+
+    def nbytes(self):
+        # Bytes of the frames still stored; frames dropped from the oldest segment
+        # are not counted, though its file keeps them until it is deleted
+        return sum(segment.nbytes_from(self.first if index == 0 else 0)
+                   for index, segment in enumerate(self.segments))
+
+    def blocks(self):
+        """
+        Returns every stored frame as a column block of memory-mapped arrays.
+        """
+        blocks = []
+        for index, segment in enumerate(self.segments):
+            start = self.first if index == 0 else 0
+            blocks.extend(segment.block(i) for i in range(start, len(segment)))
+        return blocks
+
+    def drop_oldest(self, count):
+        """
+        Forgets the `count` oldest frames. A segment's file is deleted once
+        all of its frames are dropped.
+        """
+        while count > 0 and self.segments:
+            segment = self.segments[0]
+            take = min(count, len(segment) - self.first)
+            self.rows -= int(segment.rows[self.first + take] - segment.rows[self.first])
+            self.first += take
+            self.frames -= take
+            count -= take
+            if self.first == len(segment):
+                self.segments.popleft()
+                self.first = 0
+                self._delete(segment.path)
+        self._retry_deletes()
+
+    def _delete(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            # Still mapped by an export in progress (Windows); try again later
+            self._pending_delete.append(path)
+
+    def _retry_deletes(self):
+        pending, self._pending_delete = self._pending_delete, []
+        for path in pending:
+            self._delete(path)
+
+    def clear(self):
+        paths = [segment.path for segment in self.segments]
+        self.segments.clear()
+        self.first = 0
+        self.frames = 0
+        self.rows = 0
+        self.spilled_bytes = 0
+        for path in paths:
+            self._delete(path)
+        self._retry_deletes()
+
+    def close(self):
+        # Removes the spill directory; the store must not be used afterwards
+        self.segments.clear()
+        self._finalizer()
@@ -0,0 +1,33 @@
+"""
+Golden-trajectory checks of the fast step backends against the reference
+"object" backend, on a short run of every verify_backends.py scenario.
+
+    python -m pytest test_backends.py
+"""
+import argparse
+
+import pytest
+
+from backends import BACKENDS
+from verify_backends import REFERENCE, SCENARIOS, compare, run
+
+FRAMES = 20
+TOLERANCES = argparse.Namespace(position_tol=1e-6, velocity_tol=1e-6, stats_tol=1e-6)
+
+_references = {}
+
+def reference_run(scenario, seed=0):
+    # The reference trajectories are shared by the backends compared against them
+    if scenario not in _references:
+        state = SCENARIOS[scenario](seed)
+        positions, velocities, _ = run(REFERENCE, state, FRAMES)
+        _references[scenario] = (state, (positions, velocities))
+    return _references[scenario]
+
+@pytest.mark.parametrize('scenario', list(SCENARIOS))
+@pytest.mark.parametrize('backend', [name for name in BACKENDS if name != REFERENCE])
+def test_backend_matches_reference(backend, scenario):
+    state, reference = reference_run(scenario)
+    positions, velocities, _ = run(backend, state, FRAMES)
+    result = compare(reference, (positions, velocities), state.flock_index, TOLERANCES)
+    assert result['passed'], "{} diverges from {} on '{}': {}".format(backend, REFERENCE, scenario, dict(result))
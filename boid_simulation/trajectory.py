@@ -0,0 +1,279 @@
+"""
+Indexed on-disk trajectory format for recorded simulation runs.
+
+Layout of a .traj file:
+
+    magic (8 bytes)
+    row data: one fixed-size row per boid per frame, frames stored contiguously
+    frame index: (frame number, first row, row count) per frame, int64
+    JSON header: world size and each flock's color and size
+    footer: index offset | number of frames | header length (uint64 each) | magic
+
+Everything but the row data is written on close, so flocks can still be
+registered while frames are being appended. Rows are memory-mapped on
+read, so any frame can be sliced out without reading the rest of the file,
+regardless of how large the run is.
+"""
+import argparse
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b'BOIDTRJ1'
+FOOTER = struct.Struct('<QQQ8s')
+ROW_DTYPE = np.dtype([
+    ('boid_id', '<i4'),
+    ('flock_id', '<i4'),
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('vx', '<f4'),
+    ('vy', '<f4'),
+])
+INDEX_DTYPE = np.dtype([('frame', '<i8'), ('start', '<i8'), ('count', '<i8')])
+
+# ------------------------------
+# Trajectory Writer Class
+# ------------------------------
+class TrajectoryWriter:
+    """
+    Appends frames to a .traj file. The frame index is written when the
+    writer is closed, so a file is only readable after close().
+    """
+    def __init__(self, file_path, width=800, height=600, flocks=None):
+        self.file_path = file_path
+        self.header = {
+            'width': width,
+            'height': height,
+            # flock_id (as string, for JSON) -> {'color': ..., 'size': ...}
+            'flocks': {str(flock_id): info for flock_id, info in (flocks or {}).items()},
+        }
+        self.index = []
+        self.num_rows = 0
+        self.file = open(file_path, 'wb')
+        self.file.write(MAGIC)
+        self.data_offset = len(MAGIC)
+
+    def write_block(self, block):
+        """
+        Appends one recorded frame (a column block from recording.py).
+        """
+        count = len(block['frame'])
+        rows = np.empty(count, dtype=ROW_DTYPE)
+        for column in ROW_DTYPE.names:
+            rows[column] = block[column]
+        frame = int(block['frame'][0]) if count else (self.index[-1][0] + 1 if self.index else 0)
+        self.index.append((frame, self.num_rows, count))
+        self.file.write(rows.tobytes())
+        self.num_rows += count
+
+    def close(self):
+        if self.file is None:
+            return
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        header = json.dumps(self.header).encode('utf-8')
+        self.file.write(header)
+        self.file.write(FOOTER.pack(index_offset, len(self.index), len(header), MAGIC))
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_trajectory(blocks, file_path, width=800, height=600, flocks=None):
+    """
+    Writes recorded column blocks (one per frame) to a .traj file, going
+    through a temporary file so a partially written trajectory is never visible.
+    """
+    temp_path = file_path + '.tmp'
+    with TrajectoryWriter(temp_path, width, height, flocks) as writer:
+        for block in blocks:
+            writer.write_block(block)
+    os.replace(temp_path, file_path)
+    return file_path
+
+# ------------------------------
+# Trajectory Reader Class
+# ------------------------------
+class TrajectoryReader:
+    """
+    Random access to the frames of a .traj file through a memory map.
+    Frames are returned as structured arrays with the ROW_DTYPE fields.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("{} is not a trajectory file".format(file_path))
+            data_offset = len(MAGIC)
+            f.seek(-FOOTER.size, os.SEEK_END)
+            index_offset, num_frames, header_length, magic = FOOTER.unpack(f.read(FOOTER.size))
+            if magic != MAGIC:
+                raise ValueError("{} is incomplete (missing frame index)".format(file_path))
+            f.seek(index_offset)
+            self.index = np.frombuffer(f.read(num_frames * INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)
+            self.header = json.loads(f.read(header_length).decode('utf-8'))
+        num_rows = (index_offset - data_offset) // ROW_DTYPE.itemsize
+        if num_rows:
+            self.rows = np.memmap(file_path, dtype=ROW_DTYPE, mode='r', offset=data_offset, shape=(num_rows,))
+        else:
+            self.rows = np.zeros(0, dtype=ROW_DTYPE)
+        self.width = self.header['width']
+        self.height = self.header['height']
+        self.flocks = {int(flock_id): info for flock_id, info in self.header['flocks'].items()}
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame_number(self, i):
+        return int(self.index['frame'][i])
+
+    def read_frame(self, i):
+        # A view into the memory map; pages are only read when touched
+        start = self.index['start'][i]
+        return self.rows[start:start + self.index['count'][i]]
+
+    def load_frame(self, i):
+        # A copy in RAM, so the page reads happen on the calling thread
+        return np.array(self.read_frame(i))
+
+# ------------------------------
+# Trajectory Player Class
+# ------------------------------
+class TrajectoryPlayer:
+    """
+    Serves frames of a trajectory for playback while a background thread
+    prefetches a bounded window of upcoming frames. Memory use is limited to
+    `window` frames however long the recording is. Seeking discards frames
+    outside the new window and restarts prefetching from the target.
+    """
+    def __init__(self, reader, window=120):
+        self.reader = reader
+        self.window = max(1, int(window))
+        self.position = 0
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._prefetch, name='trajectory-prefetch')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __len__(self):
+        return len(self.reader)
+
+    def seek(self, i):
+        with self._condition:
+            self.position = min(max(0, int(i)), len(self.reader) - 1)
+            # Drop frames that fall outside the new prefetch window
+            for key in list(self.cache.keys()):
+                if not self.position <= key < self.position + self.window:
+                    del self.cache[key]
+            self._condition.notify()
+
+    def get_frame(self, i):
+        """
+        Returns frame i and makes it the current playback position.
+        """
+        self.seek(i)
+        with self._condition:
+            frame = self.cache.get(self.position)
+        if frame is not None:
+            self.hits += 1
+            return frame
+        # Not prefetched yet (e.g. right after a seek), read it directly
+        self.misses += 1
+        frame = self.reader.load_frame(self.position)
+        with self._condition:
+            if self.position not in self.cache:
+                self.cache[self.position] = frame
+        return frame
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _next_missing(self):
+        stop = min(self.position + self.window, len(self.reader))
+        for i in range(self.position, stop):
+            if i not in self.cache:
+                return i
+        return None
+
+    def _prefetch(self):
+        while True:
+            with self._condition:
+                target = self._next_missing()
+                while target is None and not self._closed:
+                    self._condition.wait()
+                    target = self._next_missing()
+                if self._closed:
+                    return
+            # Read outside the lock so playback never waits on disk
+            frame = self.reader.load_frame(target)
+            with self._condition:
+                if self.position <= target < self.position + self.window:
+                    self.cache[target] = frame
+
+def convert_csv(csv_path, traj_path, chunk_size=1000000, width=None, height=None):
+    """
+    Converts an exported CSV (sorted by frame, as the simulation writes it)
+    into a .traj file, streaming it in chunks so it never has to fit in memory.
+
+    The CSV does not record the world size, so unless width and height are
+    given it is taken from the data: its largest x and y, rounded up (boids
+    wrap around at the edges, so they reach close to them).
+    """
+    temp_path = traj_path + '.tmp'
+    extent = [0.0, 0.0]
+    with TrajectoryWriter(temp_path, width, height) as writer:
+        pending = None
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+            if len(chunk):
+                extent = [max(extent[0], float(chunk['x'].max())), max(extent[1], float(chunk['y'].max()))]
+            if 'color' in chunk.columns:
+                for flock_id, color in chunk.groupby('flock_id')['color'].first().items():
+                    writer.header['flocks'].setdefault(str(flock_id), {'color': color, 'size': 3})
+            if pending is not None:
+                chunk = pd.concat([pending, chunk])
+            # The last frame of a chunk may continue in the next one
+            last_frame = chunk['frame'].iloc[-1]
+            pending = chunk[chunk['frame'] == last_frame]
+            complete = chunk[chunk['frame'] != last_frame]
+            for _, frame_data in complete.groupby('frame', sort=False):
+                writer.write_block({column: frame_data[column].values for column in frame_data.columns})
+        if pending is not None:
+            writer.write_block({column: pending[column].values for column in pending.columns})
+        # The header is only written on close, so the extent can still be filled in here
+        if width is None:
+            writer.header['width'] = int(np.ceil(extent[0])) or 800
+        if height is None:
+            writer.header['height'] = int(np.ceil(extent[1])) or 600
+    os.replace(temp_path, traj_path)
+    return traj_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an exported CSV into an indexed .traj file for replay.")
+    parser.add_argument('csv_path')
+    parser.add_argument('traj_path')
+    parser.add_argument('--width', type=int, default=None,
+                        help="World width of the recorded run (default: the largest x in the data)")
+    parser.add_argument('--height', type=int, default=None,
+                        help="World height of the recorded run (default: the largest y in the data)")
+    args = parser.parse_args()
+    convert_csv(args.csv_path, args.traj_path, width=args.width, height=args.height)
+    reader = TrajectoryReader(args.traj_path)
+    print("Wrote {} frames ({:,} rows) to {}".format(len(reader), len(reader.rows), args.traj_path))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Checks that accelerated backends reproduce the reference Boid semantics.
+
+Each scenario builds a seeded SwarmState, runs the "object" backend (the
+original Simulation.update) and every other backend from it for K frames,
+and compares:
+
+    trajectories  largest position and velocity difference per frame, which
+                  must stay within --position-tol / --velocity-tol
+    statistics    per-frame mean speed, polarization (length of the mean
+                  unit velocity) and per-flock centroids, which must stay
+                  within --stats-tol relative difference
+
+Scenarios stress the rules that are easy to get subtly wrong: the
+distance weighting of separation and coincident boids, steer() clamping
+to max_force in dense flocks, the edge bounce, and obstacle avoidance.
+The speedup over the reference is reported next to the deviation, and the
+script exits with status 1 if any backend fails:
+
+    python verify_backends.py --frames 200
+    python verify_backends.py --save-golden data/golden.npz
+    python verify_backends.py --golden data/golden.npz --backends numpy
+"""
+import argparse
+import json
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from backends import BACKENDS, SwarmState, create_backend
+
+REFERENCE = 'object'
+RADII = (25, 50, 50)
+
+# ------------------------------
+# Scenarios
+# ------------------------------
+def scenario_default(seed):
+    # Three flocks and a few obstacles in the GUI's 800x600 world
+    return SwarmState.random(150, 3, 4, 800, 600, seed=seed)
+
+def scenario_dense(seed):
+    # Many neighbours per boid, so steering is clamped to max_force almost everywhere
+    return SwarmState.random(200, 1, 0, 150, 120, seed=seed)
+
+def scenario_edges(seed):
+    # Boids on and just inside the walls, heading out of the world
+    state = SwarmState.random(120, 2, 0, 400, 300, seed=seed)
+    rng = np.random.RandomState(seed)
+    side = rng.randint(0, 4, len(state))
+    inset = rng.uniform(0, 3, len(state))
+    x, y = state.positions[:, 0], state.positions[:, 1]
+    x[side == 0] = inset[side == 0]
+    x[side == 1] = state.width - inset[side == 1]
+    y[side == 2] = inset[side == 2]
+    y[side == 3] = state.height - inset[side == 3]
+    state.velocities[side == 0, 0] = -np.abs(state.velocities[side == 0, 0])
+    state.velocities[side == 1, 0] = np.abs(state.velocities[side == 1, 0])
+    state.velocities[side == 2, 1] = -np.abs(state.velocities[side == 2, 1])
+    state.velocities[side == 3, 1] = np.abs(state.velocities[side == 3, 1])
+    return state
+
+def scenario_obstacles(seed):
+    # Dense obstacle field with overlapping avoidance buffers
+    return SwarmState.random(150, 2, 40, 800, 600, seed=seed)
+
+def scenario_coincident(seed):
+    # Pairs of boids at exactly the same position (distance 0 in separation)
+    state = SwarmState.random(80, 1, 0, 300, 200, seed=seed)
+    state.positions[1::2] = state.positions[0::2]
+    return state
+
+SCENARIOS = OrderedDict([
+    ('default', scenario_default),
+    ('dense', scenario_dense),
+    ('edges', scenario_edges),
+    ('obstacles', scenario_obstacles),
+    ('coincident', scenario_coincident),
+])
+
+def run(backend_name, state, frames):
+    """
+    Runs a backend for `frames` steps. Returns (positions, velocities) of
+    shape (frames, n, 2) and the total seconds spent stepping.
+    """
+    backend = create_backend(backend_name, state)
+    n = len(state)
+    positions = np.empty((frames, n, 2))
+    velocities = np.empty((frames, n, 2))
+    elapsed = 0.0
+    for frame in range(frames):
+        start = time.perf_counter()
+        backend.step(*RADII)
+        elapsed += time.perf_counter() - start
+        snapshot = backend.snapshot()
+        positions[frame] = snapshot.positions
+        velocities[frame] = snapshot.velocities
+    return positions, velocities, elapsed
+
+def frame_statistics(positions, velocities, flock_index):
+    """
+    Per-frame aggregate statistics: mean speed, polarization and the
+    centroid of each flock. Returns an (frames, 2 + 2 * flocks) array.
+    """
+    speed = np.sqrt((velocities ** 2).sum(axis=2))
+    unit = velocities / np.where(speed > 0, speed, 1)[:, :, None]
+    polarization = np.sqrt((unit.mean(axis=1) ** 2).sum(axis=1))
+    columns = [speed.mean(axis=1), polarization]
+    for flock in np.unique(flock_index):
+        centroid = positions[:, flock_index == flock].mean(axis=1)
+        columns.extend([centroid[:, 0], centroid[:, 1]])
+    return np.column_stack(columns)
+
+def compare(reference, candidate, flock_index, args):
+    ref_positions, ref_velocities = reference
+    positions, velocities = candidate
+    position_error = np.abs(positions - ref_positions).max(axis=(1, 2))
+    velocity_error = np.abs(velocities - ref_velocities).max(axis=(1, 2))
+    ref_stats = frame_statistics(ref_positions, ref_velocities, flock_index)
+    stats = frame_statistics(positions, velocities, flock_index)
+    stats_error = (np.abs(stats - ref_stats) / np.maximum(np.abs(ref_stats), 1.0)).max(axis=1)
+    bad = (position_error > args.position_tol) | (velocity_error > args.velocity_tol) | (stats_error > args.stats_tol)
+    return OrderedDict([
+        ('max_position_error', float(position_error.max())),
+        ('max_velocity_error', float(velocity_error.max())),
+        ('max_stats_error', float(stats_error.max())),
+        ('first_failing_frame', int(np.argmax(bad)) + 1 if bad.any() else None),
+        ('passed', not bad.any()),
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify accelerated backends against the reference Boid implementation.")
+    parser.add_argument('--backends', default=','.join(name for name in BACKENDS if name != REFERENCE))
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--position-tol', type=float, default=1e-6)
+    parser.add_argument('--velocity-tol', type=float, default=1e-6)
+    parser.add_argument('--stats-tol', type=float, default=1e-6, help="Relative tolerance for aggregate statistics")
+    parser.add_argument('--save-golden', default=None, help="Write the reference trajectories to this .npz file")
+    parser.add_argument('--golden', default=None, help="Compare against a saved .npz instead of rerunning the reference")
+    parser.add_argument('--json', default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    backends = [name for name in args.backends.split(',') if name]
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    for name in backends:
+        if name not in BACKENDS:
+            parser.error("unknown backend '{}' (available: {})".format(name, ', '.join(BACKENDS)))
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error("unknown scenario '{}' (available: {})".format(name, ', '.join(SCENARIOS)))
+
+    golden = dict(np.load(args.golden)) if args.golden else {}
+    if golden and int(golden['seed']) != args.seed:
+        parser.error("golden file was recorded with --seed {}".format(int(golden['seed'])))
+    saved = {'seed': args.seed}
+    report = []
+    print("{:<11} {:<8} {:>6} {:>11} {:>11} {:>11} {:>10} {:>9}  {}".format(
+        'scenario', 'backend', 'boids', 'pos err', 'vel err', 'stats err', 'ref s', 'speedup', 'result'))
+    for scenario in scenarios:
+        state = SCENARIOS[scenario](args.seed)
+        if scenario + '/positions' in golden:
+            reference = (golden[scenario + '/positions'][:args.frames], golden[scenario + '/velocities'][:args.frames])
+            # Scale the recorded reference time to the number of frames compared
+            reference_seconds = float(golden[scenario + '/seconds']) * args.frames / len(golden[scenario + '/positions'])
+            if len(reference[0]) < args.frames:
+                parser.error("golden file has only {} frames for '{}'".format(len(reference[0]), scenario))
+        else:
+            positions, velocities, reference_seconds = run(REFERENCE, state, args.frames)
+            reference = (positions, velocities)
+        saved[scenario + '/positions'], saved[scenario + '/velocities'] = reference
+        saved[scenario + '/seconds'] = reference_seconds
+
+        for name in backends:
+            positions, velocities, seconds = run(name, state, args.frames)
+            result = OrderedDict([('scenario', scenario), ('backend', name), ('boids', len(state)),
+                                  ('frames', args.frames)])
+            result.update(compare(reference, (positions, velocities), state.flock_index, args))
+            result['reference_seconds'] = reference_seconds
+            result['backend_seconds'] = seconds
+            result['speedup'] = reference_seconds / seconds if seconds > 0 else float('inf')
+            report.append(result)
+            outcome = 'PASS' if result['passed'] else 'FAIL (frame {})'.format(result['first_failing_frame'])
+            print("{:<11} {:<8} {:>6} {:>11.2e} {:>11.2e} {:>11.2e} {:>10.2f} {:>8.1f}x  {}".format(
+                scenario, name, len(state), result['max_position_error'], result['max_velocity_error'],
+                result['max_stats_error'], reference_seconds, result['speedup'], outcome))
+            sys.stdout.flush()
+
+    if args.save_golden:
+        np.savez_compressed(args.save_golden, **saved)
+        print("Reference trajectories written to {}".format(args.save_golden))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': report}, f, indent=2)
+    if not all(result['passed'] for result in report):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
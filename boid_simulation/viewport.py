@@ -0,0 +1,74 @@
+import numpy as np
+
+# ------------------------------
+# Camera Class
+# ------------------------------
+class Camera:
+    """
+    Maps world coordinates to a view of view_width x view_height pixels.
+
+    The camera shows the world rectangle starting at (left, top) scaled by
+    zoom, so a world larger than the window can be zoomed and panned. zoom
+    is limited so the whole world fits at the lowest zoom, and panning is
+    limited to keep the view over the world where possible.
+    """
+    def __init__(self, view_width, view_height, world_width, world_height, max_zoom=8.0):
+        self.view_width = view_width
+        self.view_height = view_height
+        self.world_width = world_width
+        self.world_height = world_height
+        self.max_zoom = max_zoom
+        self.fit()
+
+    @property
+    def min_zoom(self):
+        return min(self.view_width / float(self.world_width), self.view_height / float(self.world_height))
+
+    def fit(self):
+        # Show the whole world, centred in the view
+        self.zoom = self.min_zoom
+        self.left = (self.world_width - self.view_width / self.zoom) / 2.0
+        self.top = (self.world_height - self.view_height / self.zoom) / 2.0
+
+    def world_to_screen(self, x, y):
+        return (np.asarray(x) - self.left) * self.zoom, (np.asarray(y) - self.top) * self.zoom
+
+    def screen_to_world(self, sx, sy):
+        return sx / self.zoom + self.left, sy / self.zoom + self.top
+
+    def visible_rect(self, margin=0.0):
+        """
+        Returns the (x0, y0, x1, y1) world rectangle in view, grown by margin
+        world units so partly visible boids are kept.
+        """
+        return (self.left - margin, self.top - margin,
+                self.left + self.view_width / self.zoom + margin,
+                self.top + self.view_height / self.zoom + margin)
+
+    def pan(self, dx, dy):
+        # Move the view by a screen-space offset, e.g. a mouse drag
+        self.left -= dx / self.zoom
+        self.top -= dy / self.zoom
+        self._clamp()
+
+    def zoom_at(self, factor, sx, sy):
+        """
+        Zooms by factor while keeping the world point under (sx, sy) fixed.
+        """
+        wx, wy = self.screen_to_world(sx, sy)
+        self.zoom = min(max(self.zoom * factor, self.min_zoom), self.max_zoom)
+        self.left = wx - sx / self.zoom
+        self.top = wy - sy / self.zoom
+        self._clamp()
+
+    def _clamp(self):
+        for attr, world, view in (('left', self.world_width, self.view_width),
+                                  ('top', self.world_height, self.view_height)):
+            span = view / self.zoom
+            if span >= world:
+                setattr(self, attr, (world - span) / 2.0)  # Whole axis fits: keep it centred
+            else:
+                setattr(self, attr, min(max(getattr(self, attr), 0.0), world - span))
+
+    def summary(self):
+        return "Zoom {:.2f}x, view {:.0f},{:.0f}".format(self.zoom, self.left, self.top)
@@ -0,0 +1,28 @@
+"""
+Flock detection on recorded boid trajectories, extracted from DBScan_analysis.ipynb.
+
+    from flock_detection import PipelineConfig, run_pipeline
+    metrics = run_pipeline(boid, PipelineConfig(features='position_velocity'))
+
+or from the command line (in the data_analysis directory):
+
+    python -m flock_detection data/boid_simulation_datav2.csv --output data/metrics.csv
+"""
+from .batch_metrics import FrameTables, score_frames
+from .cache import AnalysisCache
+from .chunked import run_chunked
+from .frames import FrameIndex
+from .grid_dbscan import grid_dbscan
+from .grid_search import NeighbourGraph, grid_search, surface
+from .incremental import IncrementalSTDBSCAN, iter_st_dbscan
+from .metrics import (apply_mapping, assign_colors, calculate_metrics, correct_mask, map_clusters_to_flocks,
+                      score_frame)
+from .pipeline import ALGORITHMS, ENGINES, FEATURE_SETS, PipelineConfig, cluster_frame, run_pipeline
+from .st_dbscan import st_dbscan
+
+__all__ = [
+    'ALGORITHMS', 'AnalysisCache', 'ENGINES', 'FEATURE_SETS', 'FrameIndex', 'FrameTables', 'IncrementalSTDBSCAN',
+    'NeighbourGraph', 'PipelineConfig', 'apply_mapping', 'assign_colors', 'calculate_metrics', 'cluster_frame',
+    'correct_mask', 'grid_dbscan', 'grid_search', 'iter_st_dbscan', 'map_clusters_to_flocks', 'run_chunked',
+    'run_pipeline', 'score_frame', 'score_frames', 'st_dbscan', 'surface',
+]
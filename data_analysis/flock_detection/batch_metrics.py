@@ -0,0 +1,244 @@
+"""
+ARI, NMI and flock mappings of many frames at once.
+
+score_frame() builds a confusion matrix and calls the sklearn scorers for
+each frame. Both scores only depend on the frame's contingency table (the
+number of points of each flock in each cluster), so FrameTables builds the
+tables of all frames with one np.bincount over encoded (frame, flock,
+cluster) triples, and the scores are computed from the stack of tables with
+array operations. They equal sklearn's adjusted_rand_score and
+normalized_mutual_info_score up to floating-point rounding.
+
+The Hungarian mapping of clusters to flocks is only solved where it can
+differ from the obvious one: when every cluster has a single largest flock
+and no two clusters share it, mapping each cluster to that flock is the
+unique best assignment, which linear_sum_assignment would return too.
+
+    tables = FrameTables(offsets, flock_ids, labels)
+    ari, nmi = tables.scores('mapped')
+    correct = tables.correct_mask()
+"""
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from .metrics import NOISE
+
+
+def _codes_per_frame(frame_of_row, values, num_frames):
+    """
+    Numbers the distinct values of each frame 0, 1, ... in increasing order.
+
+    Returns:
+    - codes: code of each row's value within its frame
+    - table: (num_frames, width) array of the value of each code (NOISE where unused)
+    - sizes: number of distinct values of each frame
+    """
+    distinct, value_codes = np.unique(values, return_inverse=True)
+    keys, key_of_row = np.unique(frame_of_row * len(distinct) + value_codes, return_inverse=True)
+    key_frames = keys // len(distinct)
+    local = np.arange(len(keys)) - np.searchsorted(key_frames, key_frames)
+    table = np.full((num_frames, int(local.max()) + 1), NOISE, dtype=distinct.dtype)
+    table[key_frames, local] = distinct[keys % len(distinct)]
+    return local[key_of_row], table, np.bincount(key_frames, minlength=num_frames)
+
+
+def _bincount_tables(frame_of_row, flock_codes, cluster_codes, shape, weights=None):
+    # One bincount over the encoded (frame, flock, cluster) triples
+    num_frames, num_flocks, num_clusters = shape
+    flat = (frame_of_row * num_flocks + flock_codes) * num_clusters + cluster_codes
+    counts = np.bincount(flat, weights=weights, minlength=num_frames * num_flocks * num_clusters)
+    return counts.astype(np.int64).reshape(shape)
+
+
+def adjusted_rand_scores(tables):
+    """
+    adjusted_rand_score of each (flocks, clusters) contingency table of a stack.
+    """
+    n = tables.sum(axis=(1, 2))
+    sum_squares = (tables ** 2).sum(axis=(1, 2))
+    # The pair confusion matrix, as in sklearn.metrics.cluster.pair_confusion_matrix
+    tp = sum_squares - n
+    fp = (tables.sum(axis=1) ** 2).sum(axis=1) - sum_squares
+    fn = (tables.sum(axis=2) ** 2).sum(axis=1) - sum_squares
+    tn = n ** 2 - fp - fn - sum_squares
+    tp, fp, fn, tn = (values.astype(np.float64) for values in (tp, fp, fn, tn))
+    denominator = (tp + fn) * (fn + tn) + (tp + fp) * (fp + tn)
+    agree = (fn == 0) & (fp == 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ari = 2.0 * (tp * tn - fn * fp) / denominator
+    return np.where(agree, 1.0, ari)
+
+
+def _ordered_sum(values, axis):
+    # Sum from left to right: unlike np.sum's pairwise summation, the zero
+    # padding of narrower tables leaves it unchanged to the last bit, so a
+    # frame's scores do not depend on the frames it is batched with
+    return np.add.accumulate(values, axis=axis).take(-1, axis=axis)
+
+
+def _entropies(counts):
+    # Entropy of each row of label counts (0 for a single label)
+    n = counts.sum(axis=1, keepdims=True).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = (counts / n) * (np.log(counts) - np.log(n))
+    return -_ordered_sum(np.where(counts > 0, terms, 0.0), axis=1)
+
+
+def normalized_mutual_info_scores(tables):
+    """
+    normalized_mutual_info_score (arithmetic normalization) of each
+    (flocks, clusters) contingency table of a stack.
+    """
+    flock_counts = tables.sum(axis=2)
+    cluster_counts = tables.sum(axis=1)
+    num_flocks = (flock_counts > 0).sum(axis=1)
+    num_clusters = (cluster_counts > 0).sum(axis=1)
+    n = tables.sum(axis=(1, 2)).astype(np.float64)[:, None, None]
+    log_n = np.log(n)
+    outer = flock_counts[:, :, None] * cluster_counts[:, None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = tables / n
+        mi = share * (np.log(tables) - log_n) + share * (-np.log(outer) + log_n + log_n)
+    mi = np.where((tables > 0) & (np.abs(mi) >= np.finfo(np.float64).eps), mi, 0.0)
+    mi = np.clip(_ordered_sum(_ordered_sum(mi, axis=2), axis=1), 0.0, None)
+    # Any labelling with a single label has no mutual information
+    mi[(num_flocks == 1) | (num_clusters == 1)] = 0.0
+    normalizer = (_entropies(flock_counts) + _entropies(cluster_counts)) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        nmi = np.where(mi == 0, 0.0, mi / normalizer)
+    # Neither labelling splits the frame: a perfect match
+    return np.where((num_flocks == 1) & (num_clusters == 1), 1.0, nmi)
+
+
+class FrameTables:
+    """
+    Contingency tables of flocks against clusters for consecutive frames.
+
+    Parameters:
+    - offsets: row offsets of the frames, starting at 0 and ending at the
+      number of rows (e.g. FrameIndex.offsets)
+    - true_labels: flock IDs of all rows
+    - cluster_labels: cluster labels of all rows, -1 for noise
+
+    Attributes:
+    - tables: (frames, flocks, clusters) int64 counts; flocks and clusters
+      are numbered within each frame in increasing order of their labels, so
+      the noise column, when a frame has noise, is cluster 0
+    - flock_values, cluster_values: label of each flock and cluster number
+    - num_clusters: clusters in each frame, not counting noise
+    """
+    def __init__(self, offsets, true_labels, cluster_labels):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.sizes = np.diff(self.offsets)
+        num_frames = len(self.sizes)
+        self.true_labels = np.asarray(true_labels)
+        self.cluster_labels = np.asarray(cluster_labels)
+        self.frame_of_row = np.repeat(np.arange(num_frames), self.sizes)
+        self.flock_codes, self.flock_values, _ = _codes_per_frame(self.frame_of_row, self.true_labels, num_frames)
+        self.cluster_codes, self.cluster_values, self.num_labels = _codes_per_frame(
+            self.frame_of_row, self.cluster_labels, num_frames)
+        shape = (num_frames, self.flock_values.shape[1], self.cluster_values.shape[1])
+        self.tables = _bincount_tables(self.frame_of_row, self.flock_codes, self.cluster_codes, shape)
+        self.has_noise = (self.cluster_values[:, 0] == NOISE) & (self.num_labels > 0)
+        self.num_clusters = self.num_labels - self.has_noise
+        self._flock_numbers = None
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def noise_fractions(self):
+        return np.where(self.has_noise, self.tables[:, :, 0].sum(axis=1), 0) / self.sizes
+
+    def mapping(self):
+        """
+        Flock ID each cluster number of each frame is mapped to by the
+        Hungarian algorithm, as map_clusters_to_flocks() maps them.
+
+        Returns:
+        - (frames, clusters) array of flock IDs, -1 for noise, unmapped
+          clusters and unused cluster numbers
+        """
+        flock_numbers = self._map()
+        mapped = np.take_along_axis(self.flock_values, np.maximum(flock_numbers, 0), axis=1)
+        return np.where(flock_numbers >= 0, mapped, NOISE)
+
+    def _map(self):
+        # Flock number each cluster number is mapped to, -1 when it is not
+        if self._flock_numbers is not None:
+            return self._flock_numbers
+        clustered = self.tables.copy()
+        clustered[self.has_noise, :, 0] = 0
+        used = clustered.sum(axis=1) > 0
+        # Each cluster's largest flock, and whether it is its only largest one
+        largest = clustered.max(axis=1)
+        best = clustered.argmax(axis=1)
+        unique_best = ((clustered == largest[:, None, :]).sum(axis=1) == 1) | ~used
+        frames, clusters = np.nonzero(used)
+        claims = np.bincount(frames * self.tables.shape[1] + best[frames, clusters],
+                             minlength=len(self) * self.tables.shape[1]).reshape(len(self), -1)
+        obvious = unique_best.all(axis=1) & (claims.max(axis=1) <= 1)
+
+        flock_numbers = np.where(used, best, -1)
+        for frame in np.flatnonzero(~obvious & used.any(axis=1)).tolist():
+            flock_numbers[frame] = -1
+            cluster_numbers = np.flatnonzero(used[frame])
+            flocks = np.flatnonzero(clustered[frame].sum(axis=1) > 0)
+            cm = clustered[frame][np.ix_(flocks, cluster_numbers)]
+            row_ind, col_ind = linear_sum_assignment(-cm)
+            flock_numbers[frame, cluster_numbers[col_ind]] = flocks[row_ind]
+        self._flock_numbers = flock_numbers
+        return flock_numbers
+
+    def mapped_labels(self):
+        """
+        Each row's cluster relabelled with its mapped flock ID, as
+        apply_mapping() does; -1 for noise and unmapped clusters.
+        """
+        return self.mapping()[self.frame_of_row, self.cluster_codes]
+
+    def correct_mask(self):
+        """
+        Rows whose cluster is mapped to their own flock: the 'blue' points of
+        assign_colors(). Noise rows are never correct.
+        """
+        return (self.cluster_labels != NOISE) & (self.mapped_labels() == self.true_labels)
+
+    def scores(self, scoring='mapped'):
+        """
+        ARI and NMI of every frame, as score_frame() computes them.
+
+        Returns:
+        - (ari, nmi): float arrays with one entry per frame
+        """
+        if scoring == 'raw':
+            return adjusted_rand_scores(self.tables), normalized_mutual_info_scores(self.tables)
+        if scoring != 'mapped':
+            raise ValueError(f"Unknown scoring '{scoring}' (expected 'raw' or 'mapped')")
+        # Merge the columns of the clusters mapped to the same label: column
+        # 0 holds noise and unmapped clusters, column 1 + f the clusters mapped
+        # to the frame's flock number f. Frames with at most one label are
+        # scored raw, keeping their columns.
+        num_flocks = self.tables.shape[1]
+        merged = self._map() + 1
+        raw = self.num_labels <= 1
+        merged[raw] = np.arange(self.tables.shape[2])
+        width = max(self.tables.shape[2], num_flocks + 1)
+        frames, flocks, clusters = np.nonzero(self.tables)
+        tables = _bincount_tables(frames, flocks, merged[frames, clusters], (len(self), num_flocks, width),
+                                  weights=self.tables[frames, flocks, clusters])
+        return adjusted_rand_scores(tables), normalized_mutual_info_scores(tables)
+
+
+def score_frames(offsets, true_labels, cluster_labels, scoring='mapped'):
+    """
+    score_frame() for every frame at once.
+
+    Parameters:
+    - offsets: row offsets of the frames, starting at 0
+    - true_labels, cluster_labels: labels of all rows, frame after frame
+    - scoring: 'mapped' or 'raw'
+
+    Returns:
+    - (ari, nmi): float arrays with one entry per frame
+    """
+    return FrameTables(offsets, true_labels, cluster_labels).scores(scoring)
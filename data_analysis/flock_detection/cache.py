@@ -0,0 +1,190 @@
+"""
+Persistent on-disk cache of analysis results.
+
+Entries are sets of numpy arrays (neighbour graphs, cluster labels, metric
+rows) keyed by what they were computed from: the dataset's content hash,
+the frame, the feature set, the scaler, the algorithm and its parameters.
+Re-running with the same dataset and settings reads the entries back
+instead of recomputing them, and changing one parameter only recomputes
+the entries that depend on it.
+
+The store is a single SQLite file with one compressed blob per entry. When
+it grows past max_bytes, the least recently used entries are evicted.
+
+    with AnalysisCache('data/analysis_cache.sqlite') as cache:
+        metrics = run_pipeline(boid, config, cache=cache)
+"""
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+# SQLite limits the number of parameters of one statement
+_KEYS_PER_QUERY = 500
+
+
+def dataset_fingerprint(arrays):
+    """
+    Content hash of a dataset's columns (e.g. FrameIndex.arrays): the same
+    data gives the same fingerprint, whatever file it was read from.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name in sorted(arrays):
+        values = np.ascontiguousarray(arrays[name])
+        if values.dtype == object:
+            values = values.astype(str)
+        digest.update(f"{name}:{values.dtype.str}:{values.shape}".encode())
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def make_key(kind, dataset, frame, features, scaler, algorithm, params):
+    """
+    Cache key of one entry.
+
+    Parameters:
+    - kind: what is stored, e.g. 'labels', 'metrics' or 'neighbour_graph'
+    - dataset: dataset_fingerprint() of the data
+    - frame: frame number, or None for an entry covering every frame
+    - features: feature set the entry was computed on
+    - scaler: how the features were scaled, e.g. 'standard' or 'none'
+    - algorithm: algorithm name
+    - params: dict of the parameters the entry depends on
+    """
+    description = [kind, dataset, frame, features, scaler, algorithm, params]
+    return hashlib.blake2b(json.dumps(description, sort_keys=True).encode(), digest_size=20).hexdigest()
+
+
+def _pack(arrays):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _unpack(blob):
+    with np.load(io.BytesIO(blob), allow_pickle=False) as stored:
+        return {name: stored[name] for name in stored.files}
+
+
+class AnalysisCache:
+    """
+    Size-bounded key -> arrays store in a SQLite file.
+
+    Parameters:
+    - path: database file; created with its directory if missing
+    - max_bytes: total size of the stored entries (compressed) above which
+      the least recently used ones are evicted
+    """
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                        "key TEXT PRIMARY KEY, kind TEXT, size INTEGER, last_used REAL, value BLOB)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def __contains__(self, key):
+        return self.db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key):
+        """
+        The arrays stored under key, as a dict, or None.
+        """
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """
+        The entries found for keys, as a dict of key -> arrays; missing keys are left out.
+        """
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), _KEYS_PER_QUERY):
+            chunk = keys[start:start + _KEYS_PER_QUERY]
+            marks = ', '.join('?' * len(chunk))
+            for key, blob in self.db.execute(f"SELECT key, value FROM entries WHERE key IN ({marks})", chunk):
+                found[key] = _unpack(blob)
+        if found:
+            now = time.time()
+            self.db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self.db.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key, arrays, kind=''):
+        self.put_many([(key, arrays)], kind)
+
+    def put_many(self, items, kind=''):
+        """
+        Stores (key, arrays) pairs, replacing entries with the same key, then
+        evicts down to max_bytes.
+        """
+        now = time.time()
+        rows = []
+        for key, arrays in items:
+            blob = _pack(arrays)
+            rows.append((key, kind, len(blob), now, blob))
+        self.db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+        self.db.commit()
+        self.evict()
+
+    def nbytes(self):
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self, max_bytes=None):
+        """
+        Deletes the least recently used entries until the rest fit in
+        max_bytes (default: the cache's). Returns the number deleted.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        excess = self.nbytes() - max_bytes
+        if excess <= 0:
+            return 0
+        doomed = []
+        for key, size in self.db.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        self.db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        self.db.commit()
+        return len(doomed)
+
+    def clear(self):
+        self.db.execute("DELETE FROM entries")
+        self.db.commit()
+        self.db.execute("VACUUM")
+
+    def stats(self):
+        """
+        Entries and bytes stored per kind, plus this session's hits and misses.
+        """
+        kinds = {kind: {'entries': count, 'bytes': size} for kind, count, size in
+                 self.db.execute("SELECT kind, COUNT(*), SUM(size) FROM entries GROUP BY kind")}
+        return {'kinds': kinds, 'bytes': self.nbytes(), 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
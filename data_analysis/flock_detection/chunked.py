@@ -0,0 +1,194 @@
+"""
+Out-of-core flock detection for datasets larger than memory.
+
+run_pipeline() needs the whole dataset in a DataFrame. run_chunked() reads
+it in batches instead (loader.iter_batches: the sidecar when it is up to
+date, otherwise the CSV with pandas' chunked reader), regroups the batches
+into chunks of whole frames, and runs the pipeline on one chunk at a time.
+Every frame is clustered and scored on its own rows only, so the metrics
+are the same as those of run_pipeline() on the loaded dataset, and memory
+is bounded by the chunk size rather than by the dataset.
+
+ST-DBSCAN with st_scope='stream' feeds the frames of every chunk to one
+IncrementalSTDBSCAN, which only keeps the frames within its time window.
+Each frame is kept as the counts of its (flock, cluster) pairs until the
+last frame is in and the cluster ids are resolved, so the metrics are those
+of the 'trajectory' scope, which clusters all frames at once and cannot be
+chunked.
+
+The rows must be sorted by frame, as the simulation exports them.
+
+    metrics = run_chunked('data/boid_simulation_datav2.csv', PipelineConfig(), chunk_rows=2_000_000)
+"""
+import numpy as np
+import pandas as pd
+
+from .frames import FrameIndex
+from .incremental import IncrementalSTDBSCAN
+from .loader import PARQUET_ROW_GROUP, iter_batches
+from .pipeline import COLUMNS, METRIC_COLUMNS, PipelineConfig, run_pipeline, score_frames
+
+DEFAULT_CHUNK_ROWS = 1 << 21
+
+
+def frame_chunks(batches, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Regroups batches of rows sorted by frame into chunks of whole frames.
+
+    Parameters:
+    - batches: iterable of DataFrames with a 'frame' column, in frame order
+    - chunk_rows: a chunk is yielded once it has at least this many rows; a
+      chunk is larger by at most one batch, or one frame when a single frame
+      has more rows
+
+    Yields:
+    - DataFrames of consecutive whole frames
+    """
+    pending = []
+    pending_rows = 0
+    last_frame = None
+    for batch in batches:
+        if not len(batch):
+            continue
+        frame = batch['frame'].to_numpy()
+        if (last_frame is not None and frame[0] < last_frame) or np.any(frame[1:] < frame[:-1]):
+            raise ValueError("The dataset's rows are not sorted by frame; load it whole with load_dataset()")
+        last_frame = frame[-1]
+        pending.append(batch)
+        pending_rows += len(batch)
+        if pending_rows < chunk_rows:
+            continue
+        data = pd.concat(pending, ignore_index=True)
+        # The last frame may go on in the next batch, so it is held back
+        split = int(np.searchsorted(data['frame'].to_numpy(), last_frame))
+        if split == 0:
+            pending = [data]
+            continue
+        yield data.iloc[:split]
+        pending = [data.iloc[split:].reset_index(drop=True)]
+        pending_rows = len(pending[0])
+    if pending_rows:
+        yield pd.concat(pending, ignore_index=True)
+
+
+def iter_chunks(path, columns=COLUMNS, chunk_rows=DEFAULT_CHUNK_ROWS, sidecar=True):
+    """
+    Reads a dataset in chunks of whole frames (see frame_chunks).
+
+    Parameters:
+    - path: CSV exported by the boid simulation
+    - columns: columns to read, including 'frame'
+    - chunk_rows: rows per chunk
+    - sidecar: read the columnar sidecar when it is up to date (default)
+    """
+    batches = iter_batches(path, list(columns), batch_rows=max(1, min(chunk_rows, PARQUET_ROW_GROUP)),
+                           sidecar=sidecar)
+    return frame_chunks(batches, chunk_rows)
+
+
+def run_chunked(path, config=None, chunk_rows=DEFAULT_CHUNK_ROWS, workers=None, progress=None, cache=None,
+                sidecar=True):
+    """
+    run_pipeline() over a dataset read chunk by chunk.
+
+    Parameters:
+    - path: CSV exported by the boid simulation
+    - config: PipelineConfig (defaults to the notebook's DBSCAN settings)
+    - chunk_rows: rows per chunk; memory use grows with it
+    - workers: processes per chunk; 1 runs in this process (default: all CPUs)
+    - progress: optional callable(frames_done, rows_done), called after each chunk
+    - cache: optional cache.AnalysisCache, used for each chunk as run_pipeline()
+      does; entries are keyed by the chunk's contents, so they are reused by
+      runs with the same chunk_rows
+    - sidecar: read the columnar sidecar when it is up to date (default)
+
+    Returns:
+    - metrics: DataFrame with one row per frame (METRIC_COLUMNS), sorted by
+      frame, the same as run_pipeline() returns for the whole dataset
+    """
+    config = config if config is not None else PipelineConfig()
+    if config.algorithm == 'st_dbscan' and config.st_scope == 'trajectory':
+        raise ValueError("st_scope='trajectory' clusters all frames at once and needs the whole dataset; "
+                         "use st_scope='stream' for a chunked run")
+    stream = config.algorithm == 'st_dbscan' and config.st_scope == 'stream'
+    if stream and cache is not None:
+        raise ValueError("The analysis cache is not supported with st_scope='stream'")
+    chunks = iter_chunks(path, COLUMNS, chunk_rows, sidecar)
+    if stream:
+        return _stream_chunks(chunks, config, chunk_rows, progress)
+    metrics = []
+    frames_done = rows_done = 0
+    for chunk in chunks:
+        index = FrameIndex(chunk)
+        metrics.append(run_pipeline(index, config, workers=workers, cache=cache))
+        frames_done += len(index)
+        rows_done += index.num_rows()
+        if progress is not None:
+            progress(frames_done, rows_done)
+    if not metrics:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+    return pd.concat(metrics, ignore_index=True)
+
+
+def _stream_chunks(chunks, config, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    # st_scope='stream' over chunks: one clusterer for the whole stream. Labels
+    # emitted early miss the merges of later frames, so each emitted frame is
+    # kept as its (flock, cluster id) counts, and scored once the ids are
+    # resolved at the end. Border points next to several clusters are kept
+    # one by one, as resolving them needs the point.
+    clusterer = IncrementalSTDBSCAN(config.eps_space, config.eps_time, config.min_samples, keep_history=False)
+    flock_ids = {}
+    frames = []
+    tallies = []    # (frame position, flock, cluster id, count)
+    ambiguous = []  # (frame position, flock, point, cluster id)
+    frames_done = rows_done = points_emitted = 0
+
+    def tally(emitted):
+        nonlocal points_emitted
+        if not emitted:
+            return
+        sizes = [len(labels) for _, labels in emitted]
+        positions = np.repeat(np.arange(len(frames), len(frames) + len(emitted)), sizes)
+        frames.extend(frame for frame, _ in emitted)
+        true = np.concatenate([flock_ids.pop(frame) for frame, _ in emitted]).astype(np.int64)
+        labels = np.concatenate([labels for _, labels in emitted])
+        points = np.arange(points_emitted, points_emitted + len(labels))
+        several = clusterer.ambiguous(points_emitted, points_emitted + len(labels))
+        points_emitted += len(labels)
+        ambiguous.append(np.column_stack((positions, true, points, labels))[several])
+        counted, counts = np.unique(np.column_stack((positions, true, labels))[~several], axis=0, return_counts=True)
+        tallies.append(np.column_stack((counted, counts)))
+
+    for chunk in chunks:
+        index = FrameIndex(chunk)
+        for frame in index:
+            flock_ids[frame] = index.column(frame, 'flock_id').copy()
+            tally(clusterer.add_frame(frame, index.features(frame, ('x', 'y'))))
+        frames_done += len(index)
+        rows_done += index.num_rows()
+        if progress is not None:
+            progress(frames_done, rows_done)
+    tally(clusterer.flush())
+    if not frames:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+
+    counted = np.concatenate(tallies)
+    counted[:, 2] = clusterer.current_ids(counted[:, 2])
+    single = np.concatenate(ambiguous)
+    resolved = clusterer.resolve(single[:, 3], single[:, 2])
+    single = np.column_stack((single[:, :2], resolved, np.ones(len(single), dtype=np.int64)))
+    counted = np.concatenate((counted, single))
+    positions, true, labels, counts = counted[np.argsort(counted[:, 0], kind='stable')].T
+    sizes = np.bincount(positions, weights=counts, minlength=len(frames)).astype(np.int64)
+    ends = np.cumsum(sizes)
+    rows = []
+    first = 0
+    # Rows are expanded back from the counts for about chunk_rows rows at a time
+    while first < len(frames):
+        last = max(first + 1, int(np.searchsorted(ends, ends[first] - sizes[first] + chunk_rows, side='right')))
+        low, high = np.searchsorted(positions, [first, last])
+        offsets = np.concatenate(([0], np.cumsum(sizes[first:last])))
+        rows.extend(score_frames(frames[first:last], offsets, np.repeat(true[low:high], counts[low:high]),
+                                 np.repeat(labels[low:high], counts[low:high]), config.scoring))
+        first = last
+    return pd.DataFrame(rows, columns=METRIC_COLUMNS)
@@ -0,0 +1,125 @@
+"""
+Frame-partitioned access to a boid dataset.
+
+`boid[boid['frame'] == frame]` scans every row for each frame, so a loop
+over all frames costs O(frames x rows). FrameIndex sorts the dataset by
+frame once and keeps the (start, stop) row range of every frame, so a
+frame's rows are a slice: its column arrays are views into the sorted
+columns, and no per-frame mask or copy is made.
+"""
+import numpy as np
+
+STATE_COLUMNS = ('x', 'y', 'vx', 'vy')
+
+
+class FrameIndex:
+    """
+    A dataset sorted by frame with a frame -> (start, stop) row index.
+
+    Parameters:
+    - data: DataFrame with a 'frame' column (e.g. from loader.load_dataset)
+
+    The sorted rows are kept as numpy arrays: one per column, plus `state`,
+    an (n, 4) array of x, y, vx, vy in one block, so the position or
+    position + velocity features of a frame are a view as well.
+    """
+    def __init__(self, data):
+        frame = data['frame'].to_numpy()
+        if len(frame) and np.all(frame[1:] >= frame[:-1]):
+            self.order = None  # Already sorted, as the simulation's exports are
+            self.data = data.reset_index(drop=True)
+        else:
+            self.order = np.argsort(frame, kind='stable')
+            self.data = data.iloc[self.order].reset_index(drop=True)
+        self.frames, starts = np.unique(self.data['frame'].to_numpy(), return_index=True)
+        self.offsets = np.append(starts, len(self.data)).astype(np.int64)
+        self._position = {value: i for i, value in enumerate(self.frames.tolist())}
+        self.arrays = {column: self.data[column].to_numpy() for column in self.data.columns}
+        state = [column for column in STATE_COLUMNS if column in self.data.columns]
+        self.state = np.column_stack([self.arrays[column] for column in state]) if state else None
+        self.state_columns = tuple(state)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return iter(self.frames.tolist())
+
+    def __contains__(self, frame):
+        return frame in self._position
+
+    def num_rows(self):
+        return len(self.data)
+
+    def bounds(self, frame):
+        """
+        (start, stop) of the frame's rows in the sorted dataset.
+        """
+        i = self._position[frame]
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def column(self, frame, name):
+        # View of one column for one frame
+        start, stop = self.bounds(frame)
+        return self.arrays[name][start:stop]
+
+    def columns(self, frame, names=None):
+        """
+        Views of the frame's columns, as a dict of column name -> array.
+        """
+        start, stop = self.bounds(frame)
+        names = self.arrays.keys() if names is None else names
+        return {name: self.arrays[name][start:stop] for name in names}
+
+    def features(self, frame, names=('x', 'y')):
+        """
+        The frame's feature matrix of shape (n, len(names)). A view when the
+        names are a leading run of x, y, vx, vy (e.g. position, or position
+        and velocity); otherwise the columns are stacked into a copy.
+        """
+        start, stop = self.bounds(frame)
+        names = tuple(names)
+        if names == self.state_columns[:len(names)]:
+            return self.state[start:stop, :len(names)]
+        return np.column_stack([self.arrays[name][start:stop] for name in names])
+
+    def frame_data(self, frame):
+        """
+        The frame's rows as a DataFrame with a fresh index, like
+        boid[boid['frame'] == frame].reset_index(drop=True).
+        """
+        start, stop = self.bounds(frame)
+        return self.data.iloc[start:stop].reset_index(drop=True)
+
+    def iter_frames(self, names=None):
+        """
+        Yields (frame, columns) for every frame in order; see columns().
+        """
+        names = list(self.arrays) if names is None else names
+        for i, frame in enumerate(self.frames.tolist()):
+            start, stop = self.offsets[i], self.offsets[i + 1]
+            yield frame, {name: self.arrays[name][start:stop] for name in names}
+
+    def new_column(self, fill=-1, dtype=np.int64):
+        """
+        An array with one entry per sorted row, for results such as cluster
+        labels that are written back frame by frame with put().
+        """
+        return np.full(len(self.data), fill, dtype=dtype)
+
+    def put(self, values, frame, frame_values):
+        # Write one frame's results into an array from new_column()
+        start, stop = self.bounds(frame)
+        values[start:stop] = frame_values
+
+    def to_original(self, values):
+        """
+        Reorders a per-row array from sorted order to the row order of the
+        DataFrame the index was built from, so it can be assigned as a column:
+        boid['ST_DBSCAN_cluster'] = index.to_original(labels).
+        """
+        if self.order is None:
+            return values
+        original = np.empty_like(values)
+        original[self.order] = values
+        return original
@@ -0,0 +1,337 @@
+"""
+Exact grid-based DBSCAN for low-dimensional data.
+
+Points are hashed into a grid of cells with side eps / sqrt(d), so any two
+points in the same cell are within eps of each other and need no distance
+check. Neighbours in other cells can only lie in the few cells whose
+closest corners are within eps; those cell pairs are found with one sorted
+lookup of the cell keys. Cell pairs whose bounding boxes are entirely
+within eps are counted and joined as whole cells, pairs entirely out of
+range are dropped, and only the points of the rest are compared. Clusters
+are labelled with the same union-find and border rule as st_dbscan, which
+give sklearn's labels: clusters are numbered in order of their first core
+point, and a border point joins the lowest-numbered cluster next to it.
+
+Points can be split into groups (e.g. frames) that are never neighbours,
+so many frames are clustered in one call and labelled per group:
+
+    labels = grid_dbscan(X_scaled, eps=0.5, min_samples=5)
+    labels = grid_dbscan(X_scaled, eps=0.5, min_samples=5, groups=frames)
+
+Run as a script to validate against sklearn.cluster.DBSCAN on a dataset:
+
+    python -m flock_detection.grid_dbscan data/boid_simulation_datav2.csv --features position_velocity
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from .unionfind import component_labels, union_find
+
+_NO_CLUSTER = np.iinfo(np.int64).max
+
+
+def neighbour_offsets(dims, reach):
+    """
+    Offsets of the cells that can hold neighbours of a cell's points, for
+    cells with side eps / reach, excluding (0, ..., 0). Only one of each
+    pair of opposite offsets is returned, so every cell pair is visited once.
+    """
+    offsets = np.array(list(itertools.product(range(-reach, reach + 1), repeat=dims)), dtype=np.int64)
+    # Closest approach between the cells, in cell sides, must be within reach sides (= eps)
+    gap = np.maximum(np.abs(offsets) - 1, 0)
+    offsets = offsets[(gap ** 2).sum(axis=1) <= reach ** 2]
+    # Keep the lexicographically positive half
+    first = np.argmax(offsets != 0, axis=1)
+    sign = offsets[np.arange(len(offsets)), first]
+    return offsets[sign > 0]
+
+
+def _segment_products(first_a, count_a, first_b, count_b, same):
+    """
+    All (i, j) point pairs between the runs [first_a, first_a + count_a) and
+    [first_b, first_b + count_b) of each cell pair; within a cell (same=True)
+    only i < j.
+    """
+    sizes = count_a * count_b
+    total = int(sizes.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pair = np.repeat(np.arange(len(sizes)), sizes)
+    local = np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    width = count_b[pair]
+    i = first_a[pair] + local // width
+    j = first_b[pair] + local % width
+    if same:
+        keep = i < j
+        i, j = i[keep], j[keep]
+    return i, j
+
+
+def _squared_distances(X, i, j):
+    # Column by column, without gathering (len(i), d) blocks
+    total = np.zeros(len(i))
+    for axis in range(X.shape[1]):
+        column = X[:, axis]
+        total += (column[i] - column[j]) ** 2
+    return total
+
+
+def _cell_spread(lo_a, hi_a, lo_b, hi_b):
+    # Squared smallest and largest distances between two cells' bounding boxes
+    nearest = np.maximum(np.maximum(lo_b - hi_a, lo_a - hi_b), 0)
+    farthest = np.maximum(hi_b - lo_a, hi_a - lo_b)
+    return (nearest ** 2).sum(axis=1), (farthest ** 2).sum(axis=1)
+
+
+class _Grid:
+    """
+    Points hashed into grid cells and sorted by cell, with every pair of
+    cells that can hold neighbours sorted into one of three kinds by the
+    bounding boxes of their points:
+
+    - clique: cells whose points are all within eps of each other, which
+      cells of side eps / sqrt(d) always are (the default for d <= 2)
+    - full: (a, b) pairs of clique cells whose points are all within eps of
+      each other's
+    - pairs: (i, j) sorted-point pairs within eps from all other cell pairs,
+      found by comparing their points
+
+    Cells of different groups never pair. Indices are into the sorted points
+    (`order` maps them back) and the cells (`first`, `count`, `cell_of`).
+    """
+    def __init__(self, X, eps, groups=None):
+        n, dims = X.shape
+        # Above 2 dimensions eps / sqrt(d) cells need too many neighbour offsets
+        reach = int(np.ceil(np.sqrt(dims))) if dims <= 2 else 1
+        side = eps / reach
+        cells = np.floor((X - X.min(axis=0)) / side).astype(np.int64) + reach
+        # Mixed-radix cell keys, padded by `reach` on every side so neighbour offsets never wrap
+        extent = cells.max(axis=0) + reach + 1
+        strides = np.ones(dims + 1, dtype=np.int64)
+        for axis in range(dims - 1, -1, -1):
+            strides[axis] = strides[axis + 1] * extent[axis]
+        keys = cells @ strides[1:]
+        if groups is not None:
+            _, group_codes = np.unique(groups, return_inverse=True)
+            if (group_codes.max() + 1) * float(strides[0]) >= 2 ** 62:
+                raise ValueError("Too many grid cells for 64-bit keys; use a larger eps or fewer groups")
+            keys += group_codes.astype(np.int64) * strides[0]
+        elif float(strides[0]) >= 2 ** 62:
+            raise ValueError("Too many grid cells for 64-bit keys; use a larger eps")
+
+        self.order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self.order]
+        self.first = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        self.count = np.diff(np.append(self.first, n))
+        cell_keys = sorted_keys[self.first]
+        self.cell_of = np.repeat(np.arange(len(cell_keys)), self.count)
+        sorted_X = X[self.order]
+        lo = np.minimum.reduceat(sorted_X, self.first)
+        hi = np.maximum.reduceat(sorted_X, self.first)
+        limit = eps * eps
+        self.clique = ((hi - lo) ** 2).sum(axis=1) <= limit
+
+        # Neighbouring cells of every cell, for all offsets in one lookup
+        offset_keys = neighbour_offsets(dims, reach) @ strides[1:]
+        wanted = (cell_keys[:, None] + offset_keys[None, :]).ravel()
+        found = np.searchsorted(cell_keys, wanted)
+        found[found == len(cell_keys)] = 0
+        hit = cell_keys[found] == wanted
+        a = np.repeat(np.arange(len(cell_keys)), len(offset_keys))[hit]
+        b = found[hit]
+        nearest, farthest = _cell_spread(lo[a], hi[a], lo[b], hi[b])
+        full = (farthest <= limit) & self.clique[a] & self.clique[b]
+        self.full = (a[full], b[full])
+        partial = (nearest <= limit) & ~full
+        a, b = a[partial], b[partial]
+
+        # Compare the points of the remaining cell pairs, and within non-clique cells
+        loose = np.flatnonzero(~self.clique)
+        across = _segment_products(self.first[a], self.count[a], self.first[b], self.count[b], same=False)
+        within = _segment_products(self.first[loose], self.count[loose], self.first[loose], self.count[loose], same=True)
+        i = np.concatenate((across[0], within[0]))
+        j = np.concatenate((across[1], within[1]))
+        close = _squared_distances(sorted_X, i, j) <= limit
+        self.pairs = (i[close], j[close])
+
+
+def grid_pairs(X, eps, groups=None):
+    """
+    All pairs of distinct points within eps of each other (and in the same group).
+
+    Parameters:
+    - X: array of shape (n, d)
+    - eps: neighbourhood radius
+    - groups: optional array of shape (n,); points in different groups are never paired
+
+    Returns:
+    - (i, j): int64 index arrays with each unordered pair once
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if len(X) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    grid = _Grid(X, eps, groups)
+    cliques = np.flatnonzero(grid.clique)
+    a, b = grid.full
+    first, count = grid.first, grid.count
+    within = _segment_products(first[cliques], count[cliques], first[cliques], count[cliques], same=True)
+    across = _segment_products(first[a], count[a], first[b], count[b], same=False)
+    i = np.concatenate((within[0], across[0], grid.pairs[0]))
+    j = np.concatenate((within[1], across[1], grid.pairs[1]))
+    return grid.order[i], grid.order[j]
+
+
+def grid_dbscan(X, eps=0.5, min_samples=5, groups=None):
+    """
+    DBSCAN with sklearn.cluster.DBSCAN's eps and min_samples (Euclidean metric).
+
+    Neighbours are counted cell by cell where the grid allows: a point in a
+    clique cell has all of its cell's points as neighbours, and all of the
+    points of each clique cell fully within eps; core points of a clique
+    cell are joined through the cell's first core point, and its border
+    points are next to every one of them. Points are only compared pair by
+    pair for the cell pairs that are neither fully in nor out of range.
+
+    Parameters:
+    - X: array-like of shape (n_samples, n_features), e.g. standardized features
+    - eps: maximum distance between two neighbours
+    - min_samples: neighbours (counting the point itself) that make a core point
+    - groups: optional array-like of shape (n_samples,), e.g. frame numbers;
+      each group is clustered on its own and numbered from 0
+
+    Returns:
+    - labels: array of shape (n_samples,), -1 for noise
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X[:, None]
+    n = len(X)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    grid = _Grid(X, eps, groups)
+    num_cells = len(grid.count)
+    # Work in the original point order, so clusters are numbered like sklearn's
+    order = grid.order
+    cell = np.empty(n, dtype=np.int64)
+    cell[order] = grid.cell_of
+    i, j = order[grid.pairs[0]], order[grid.pairs[1]]
+    a, b = grid.full
+
+    in_cells = np.where(grid.clique, grid.count, 1)
+    in_cells += np.bincount(a, weights=grid.count[b], minlength=num_cells).astype(np.int64)
+    in_cells += np.bincount(b, weights=grid.count[a], minlength=num_cells).astype(np.int64)
+    counts = in_cells[cell] + np.bincount(i, minlength=n) + np.bincount(j, minlength=n)
+    core = counts >= min_samples
+
+    # First core point of each cell (n when it has none)
+    cell_core = np.full(num_cells, n, dtype=np.int64)
+    np.minimum.at(cell_core, cell[core], np.flatnonzero(core))
+    joined = np.flatnonzero(core & grid.clique[cell])
+    linked = (cell_core[a] < n) & (cell_core[b] < n)
+    both = core[i] & core[j]
+    roots = union_find(n, np.concatenate((joined, cell_core[a[linked]], i[both])),
+                       np.concatenate((cell_core[cell[joined]], cell_core[b[linked]], j[both])))
+    labels = component_labels(roots, core)
+
+    # Border points: next to the core points of their own clique cell, of
+    # fully neighbouring cells, and of their close pairs
+    cell_label = np.full(num_cells, _NO_CLUSTER, dtype=np.int64)
+    has_core = cell_core < n
+    cell_label[has_core] = labels[cell_core[has_core]]
+    nearest_in_cell = np.where(grid.clique, cell_label, _NO_CLUSTER)
+    np.minimum.at(nearest_in_cell, a, cell_label[b])
+    np.minimum.at(nearest_in_cell, b, cell_label[a])
+    nearest = nearest_in_cell[cell]
+    for p, q in ((i, j), (j, i)):
+        edge = core[p] & ~core[q]
+        np.minimum.at(nearest, q[edge], labels[p[edge]])
+    reached = ~core & (nearest != _NO_CLUSTER)
+    labels[reached] = nearest[reached]
+    if groups is not None:
+        labels = _number_per_group(labels, groups)
+    return labels
+
+
+def _number_per_group(labels, groups):
+    # Renumber clusters from 0 within each group, keeping their order
+    labels = labels.copy()
+    clustered = labels >= 0
+    if not clustered.any():
+        return labels
+    _, group_codes = np.unique(np.asarray(groups)[clustered], return_inverse=True)
+    width = labels.max() + 1
+    combined, inverse = np.unique(group_codes * width + labels[clustered], return_inverse=True)
+    combined_groups = combined // width
+    first = np.searchsorted(combined_groups, combined_groups)
+    labels[clustered] = (np.arange(len(combined)) - first)[inverse]
+    return labels
+
+
+def same_clustering(labels_a, labels_b):
+    """
+    True when two labelings are equal up to renaming the clusters, with the
+    same noise points.
+    """
+    labels_a, labels_b = np.asarray(labels_a), np.asarray(labels_b)
+    if not np.array_equal(labels_a == -1, labels_b == -1):
+        return False
+    clustered = labels_a != -1
+    pairs = np.unique(np.column_stack((labels_a[clustered], labels_b[clustered])), axis=0)
+    return len(pairs) == len(np.unique(pairs[:, 0])) == len(np.unique(pairs[:, 1]))
+
+
+def main(argv=None):
+    from sklearn.cluster import DBSCAN
+    from sklearn.preprocessing import StandardScaler
+
+    from .frames import FrameIndex
+    from .loader import load_dataset
+    from .pipeline import FEATURE_SETS
+
+    parser = argparse.ArgumentParser(prog='python -m flock_detection.grid_dbscan',
+                                     description="Validate and time grid DBSCAN against sklearn, frame by frame.")
+    parser.add_argument('dataset')
+    parser.add_argument('--features', choices=list(FEATURE_SETS), default='position')
+    parser.add_argument('--eps', type=float, default=0.5)
+    parser.add_argument('--min-samples', type=int, default=5)
+    parser.add_argument('--frames', type=int, default=None, help="Only the first N frames")
+    args = parser.parse_args(argv)
+
+    index = FrameIndex(load_dataset(args.dataset))
+    frames = list(index)[:args.frames]
+    names = FEATURE_SETS[args.features]
+    scaled = [StandardScaler().fit_transform(index.features(frame, names)) for frame in frames]
+    sklearn_seconds = grid_seconds = 0.0
+    mismatches = []
+    for frame, X in zip(frames, scaled):
+        start = time.perf_counter()
+        expected = DBSCAN(eps=args.eps, min_samples=args.min_samples).fit(X).labels_
+        sklearn_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        labels = grid_dbscan(X, args.eps, args.min_samples)
+        grid_seconds += time.perf_counter() - start
+        if not same_clustering(expected, labels):
+            mismatches.append(frame)
+    # All frames in one call, as the pipeline's grid engine does
+    start = time.perf_counter()
+    batched = grid_dbscan(np.concatenate(scaled), args.eps, args.min_samples,
+                          groups=np.repeat(frames, [len(X) for X in scaled]))
+    batch_seconds = time.perf_counter() - start
+    per_frame = np.split(batched, np.cumsum([len(X) for X in scaled])[:-1])
+    batch_mismatches = sum(not same_clustering(DBSCAN(eps=args.eps, min_samples=args.min_samples).fit(X).labels_,
+                                               labels) for X, labels in zip(scaled, per_frame))
+
+    print(f"{len(frames)} frames, {sum(len(X) for X in scaled):,} points, features={args.features}, "
+          f"eps={args.eps}, min_samples={args.min_samples}")
+    print(f"sklearn DBSCAN     {sklearn_seconds:8.3f} s")
+    print(f"grid, per frame    {grid_seconds:8.3f} s  ({sklearn_seconds / grid_seconds:.1f}x)")
+    print(f"grid, all frames   {batch_seconds:8.3f} s  ({sklearn_seconds / batch_seconds:.1f}x)")
+    print(f"frames differing from sklearn: {len(mismatches)} per frame, {batch_mismatches} batched")
+    return 1 if mismatches or batch_mismatches else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,255 @@
+"""
+DBSCAN parameter searches over eps and min_samples.
+
+Running the pipeline once per (eps, min_samples) pair recomputes every
+frame's neighbourhoods for each pair. grid_search() instead builds one
+radius-neighbour graph of all frames at the largest eps, with the edges
+sorted by distance: the graph at any smaller eps is a prefix of the edges,
+and min_samples only changes which points are core. Each pair is then
+clustered from its thresholded edges, as DBSCAN(metric='precomputed') on
+the cached distances would (with the same labels as sklearn's DBSCAN), and
+scored against the flocks. The pairs run in parallel over one shared copy
+of the graph.
+
+    results = grid_search(boid, eps_values=[0.3, 0.4, 0.5], min_samples_values=[3, 5, 10])
+    surface(results, 'ARI')
+
+or from the command line (in the data_analysis directory):
+
+    python -m flock_detection.grid_search data/boid_simulation_datav2.csv --eps 0.3 0.4 0.5 --min-samples 3 5 10
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .batch_metrics import FrameTables
+from .cache import DEFAULT_MAX_BYTES, AnalysisCache, dataset_fingerprint, make_key
+from .frames import FrameIndex
+from .grid_dbscan import grid_pairs
+from .loader import load_dataset
+from .pipeline import FEATURE_SETS, SharedArrays, standardized_features
+from .st_dbscan import cluster_pairs
+
+SEARCH_COLUMNS = ['eps', 'min_samples', 'ARI', 'NMI', 'clusters', 'noise_fraction']
+
+
+class NeighbourGraph:
+    """
+    All pairs of points within max_eps of each other in the same frame,
+    sorted by distance.
+
+    Parameters:
+    - X: (n, d) features of consecutive frames, e.g. from standardized_features()
+    - offsets: row offsets of the frames, starting at 0
+    - max_eps: the largest eps the graph is used for
+    """
+    def __init__(self, X, offsets, max_eps):
+        self.num_points = len(X)
+        self.max_eps = max_eps
+        groups = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        i, j = grid_pairs(X, max_eps, groups)
+        squared = ((X[i] - X[j]) ** 2).sum(axis=1)
+        order = np.argsort(squared, kind='stable')
+        index_type = np.int32 if self.num_points < 2 ** 31 else np.int64
+        self.i = i[order].astype(index_type)
+        self.j = j[order].astype(index_type)
+        self.squared_distances = squared[order]
+
+    @classmethod
+    def from_arrays(cls, num_points, max_eps, i, j, squared_distances):
+        # A graph read back from arrays(), e.g. out of an AnalysisCache
+        graph = cls.__new__(cls)
+        graph.num_points, graph.max_eps = int(num_points), float(max_eps)
+        graph.i, graph.j, graph.squared_distances = i, j, squared_distances
+        return graph
+
+    def arrays(self):
+        return {'num_points': np.array(self.num_points), 'max_eps': np.array(self.max_eps), 'i': self.i, 'j': self.j,
+                'squared_distances': self.squared_distances}
+
+    def __len__(self):
+        return len(self.i)
+
+    def num_edges(self, eps):
+        """
+        Number of leading edges within eps.
+        """
+        if eps > self.max_eps:
+            raise ValueError(f"eps={eps} is larger than the graph's max_eps={self.max_eps}")
+        return int(np.searchsorted(self.squared_distances, eps * eps, side='right'))
+
+    def edges(self, eps):
+        # (i, j) of the pairs within eps, as views
+        k = self.num_edges(eps)
+        return self.i[:k], self.j[:k]
+
+
+def evaluate_parameters(arrays, num_points, eps, num_edges, min_samples, scoring):
+    """
+    Clusters every frame from the first num_edges edges of the graph and
+    scores it. Returns a row of the search results.
+    """
+    labels = cluster_pairs(num_points, arrays['i'][:num_edges], arrays['j'][:num_edges], min_samples)
+    tables = FrameTables(arrays['offsets'], arrays['flock_id'], labels)
+    ari, nmi = tables.scores(scoring)
+    return (eps, min_samples, float(ari.mean()), float(nmi.mean()), float(tables.num_clusters.mean()),
+            float(tables.noise_fractions().mean()))
+
+
+# Per-worker state, set by _init_worker
+_worker_shm = None
+_worker_arrays = None
+
+
+def _init_worker(spec):
+    global _worker_shm, _worker_arrays
+    _worker_shm, _worker_arrays = SharedArrays.attach(spec)
+
+
+def _evaluate_task(task):
+    return evaluate_parameters(_worker_arrays, *task)
+
+
+def grid_search(data, eps_values, min_samples_values, features='position', scoring='raw', workers=None,
+                progress=None, cache=None):
+    """
+    Scores DBSCAN on every frame for each (eps, min_samples) pair.
+
+    Parameters:
+    - data: FrameIndex, or DataFrame with the frame, flock_id and feature columns
+    - eps_values, min_samples_values: the values to combine
+    - features: key of FEATURE_SETS, standardized per frame as in the pipeline
+    - scoring: 'raw' or 'mapped', as for PipelineConfig
+    - workers: number of processes; 1 runs in this process (default: all CPUs)
+    - progress: optional callable(pairs_done, total_pairs)
+    - cache: optional cache.AnalysisCache; the neighbour graph and the rows
+      of the pairs already searched on the same data are reused
+
+    Returns:
+    - results: DataFrame with one row per pair (SEARCH_COLUMNS), the ARI,
+      NMI, clusters and noise fraction being means over the frames
+    """
+    if features not in FEATURE_SETS:
+        raise ValueError(f"Unknown feature set '{features}' (available: {', '.join(FEATURE_SETS)})")
+    workers = workers or os.cpu_count() or 1
+    index = data if isinstance(data, FrameIndex) else FrameIndex(data)
+    eps_values = sorted(set(eps_values))
+    min_samples_values = sorted(set(min_samples_values))
+    pairs = [(eps, min_samples) for eps in eps_values for min_samples in min_samples_values]
+    found = {}
+    dataset = None
+    if cache is not None:
+        columns = ('frame', 'flock_id', *FEATURE_SETS[features])
+        dataset = dataset_fingerprint({name: index.arrays[name] for name in columns})
+        keys = {pair: make_key('search', dataset, None, features, 'standard', 'dbscan',
+                               {'eps': pair[0], 'min_samples': pair[1], 'scoring': scoring}) for pair in pairs}
+        stored = cache.get_many(keys.values())
+        found = {pair: tuple(stored[key]['row'].tolist()) for pair, key in keys.items() if key in stored}
+        pairs = [pair for pair in pairs if pair not in found]
+    rows = []
+    if pairs:
+        graph = _neighbour_graph(index, features, eps_values[-1], cache, dataset)
+        rows = _search(graph, index, pairs, scoring, workers, progress)
+        if cache is not None:
+            cache.put_many([(keys[row[:2]], {'row': np.array(row)}) for row in rows], 'search')
+    results = pd.DataFrame(rows + list(found.values()), columns=SEARCH_COLUMNS)
+    results = results.astype({'min_samples': 'int64'})
+    return results.sort_values(['eps', 'min_samples'], ignore_index=True)
+
+
+def _neighbour_graph(index, features, max_eps, cache=None, dataset=None):
+    # The graph of standardized features at max_eps, from the cache when it has it
+    if cache is not None:
+        key = make_key('neighbour_graph', dataset, None, features, 'standard', 'radius', {'max_eps': max_eps})
+        stored = cache.get(key)
+        if stored is not None:
+            return NeighbourGraph.from_arrays(**stored)
+    X = standardized_features(index.arrays, index.offsets, features)
+    graph = NeighbourGraph(X, index.offsets, max_eps)
+    if cache is not None:
+        cache.put(key, graph.arrays(), 'neighbour_graph')
+    return graph
+
+
+def _search(graph, index, pairs, scoring, workers, progress=None):
+    # Rows of the (eps, min_samples) pairs, in parallel over a shared copy of the graph
+    tasks = [(graph.num_points, eps, graph.num_edges(eps), min_samples, scoring) for eps, min_samples in pairs]
+    arrays = {'i': graph.i, 'j': graph.j, 'offsets': index.offsets, 'flock_id': index.arrays['flock_id']}
+    rows = []
+    if workers == 1:
+        for task in tasks:
+            rows.append(evaluate_parameters(arrays, *task))
+            if progress is not None:
+                progress(len(rows), len(tasks))
+    else:
+        shared = SharedArrays(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_worker,
+                                     initargs=(shared.spec(),)) as pool:
+                for row in pool.map(_evaluate_task, tasks):
+                    rows.append(row)
+                    if progress is not None:
+                        progress(len(rows), len(tasks))
+        finally:
+            shared.close()
+    return rows
+
+
+def surface(results, metric='ARI'):
+    """
+    One metric of the search results as an eps x min_samples table.
+    """
+    return results.pivot(index='eps', columns='min_samples', values=metric)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m flock_detection.grid_search',
+                                     description="ARI/NMI of DBSCAN over a grid of eps and min_samples values.")
+    parser.add_argument('dataset', help="CSV exported by the boid simulation")
+    parser.add_argument('--features', choices=list(FEATURE_SETS), default='position')
+    parser.add_argument('--eps', type=float, nargs='+', default=[0.2, 0.3, 0.4, 0.5, 0.6, 0.8],
+                        help="eps values on standardized features")
+    parser.add_argument('--min-samples', type=int, nargs='+', default=[3, 5, 8, 10, 15])
+    parser.add_argument('--scoring', choices=['mapped', 'raw'], default='raw')
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all CPUs)")
+    parser.add_argument('--output', default=None, help="Results table to write (.csv)")
+    parser.add_argument('--cache', default=None, help="Analysis cache file to reuse results from (.sqlite)")
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / 2 ** 20,
+                        help="Cache size limit in MB")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    columns = ['frame', 'flock_id', *FEATURE_SETS[args.features]]
+    index = FrameIndex(load_dataset(args.dataset, columns=columns))
+    print(f"Loaded {index.num_rows():,} rows in {time.perf_counter() - start:.1f} s")
+
+    def progress(done, total):
+        print(f"\r{done}/{total} parameter pairs", end='', file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    cache = AnalysisCache(args.cache, max_bytes=int(args.cache_size * 2 ** 20)) if args.cache else None
+    try:
+        results = grid_search(index, args.eps, args.min_samples, features=args.features, scoring=args.scoring,
+                              workers=args.workers, progress=progress, cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    print(file=sys.stderr)
+    print(f"Searched {len(results)} parameter pairs in {time.perf_counter() - start:.1f} s")
+    for metric in ('ARI', 'NMI'):
+        print(f"\nMean {metric} (rows: eps, columns: min_samples)")
+        print(surface(results, metric).round(3).to_string())
+    best = results.loc[results['ARI'].idxmax()]
+    print(f"\nBest ARI {best['ARI']:.3f} at eps={best['eps']}, min_samples={int(best['min_samples'])}")
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+"""
+Sliding-window ST-DBSCAN over a stream of frames.
+
+Re-running st_dbscan() on overlapping windows recomputes every neighbourhood
+each time the window advances. IncrementalSTDBSCAN instead takes the frames
+one at a time and only does the work each frame brings:
+
+    entering frame   its KD-tree is built and queried against the frames at
+                     most eps_time before it, updating the neighbour counts
+                     of exactly the points the new pairs touch
+    leaving frame    once no later frame can be within eps_time of a frame,
+                     its points' core status is final; the pairs it closes
+                     are merged into a union-find over clusters, and its
+                     tree is dropped
+
+A frame's labels are emitted once every frame within eps_time of it has
+closed, i.e. about 2 * eps_time frames after it was added. Emitted labels
+are cluster ids: the index (in stream order) of the cluster's first core
+point, so a cluster keeps its id from frame to frame. No delay makes them
+final, as two clusters of a frame can still be joined by a chain of
+neighbours through any later frame; resolve() maps emitted labels to the
+clusters as they are now, and after flush() that is the clustering of
+st_dbscan_arrays() over all the frames.
+
+Points are dropped once their frame is emitted and no later frame can pair
+with them, so the state is bounded by the frames in the window, plus one
+union-find node per cluster id ever emitted and the border points that
+were next to several clusters.
+"""
+from collections import deque
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .unionfind import find, merge
+
+_NO_CLUSTER = np.iinfo(np.int64).max
+
+# Points dropped from the state at a time, at least
+_COMPACT_MIN = 1 << 16
+
+
+class _Growing:
+    """
+    A numpy array that is appended to in blocks, with amortized doubling.
+    """
+    def __init__(self, dtype, fill):
+        self.values = np.full(1024, fill, dtype=dtype)
+        self.fill = fill
+        self.size = 0
+
+    def extend(self, count):
+        if self.size + count > len(self.values):
+            grown = np.full(max(2 * len(self.values), self.size + count), self.fill, dtype=self.values.dtype)
+            grown[:self.size] = self.values[:self.size]
+            self.values = grown
+        self.size += count
+
+    def view(self):
+        return self.values[:self.size]
+
+    def keep(self, indices):
+        # Keeps the entries at the given increasing indices, in order
+        self.values[:len(indices)] = self.values[indices]
+        self.values[len(indices):self.size] = self.fill
+        self.size = len(indices)
+
+
+def number_clusters(ids):
+    """
+    Numbers cluster ids 0, 1, ... in increasing order, keeping -1 for noise,
+    as st_dbscan_arrays() numbers clusters by their first core point.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    labels = np.full(len(ids), -1, dtype=np.int64)
+    clustered = ids >= 0
+    labels[clustered] = np.unique(ids[clustered], return_inverse=True)[1]
+    return labels
+
+
+class IncrementalSTDBSCAN:
+    """
+    ST-DBSCAN over frames added in increasing frame order.
+
+    Parameters:
+    - eps_space: Spatial distance threshold.
+    - eps_time: Temporal distance threshold (number of frames).
+    - min_samples: Minimum number of points to form a dense region.
+    - keep_history: keep the emitted labels final_labels() needs (default
+      True); streams that resolve() their labels themselves can turn it off
+    """
+    def __init__(self, eps_space, eps_time, min_samples, keep_history=True):
+        self.eps_space = eps_space
+        self.eps_time = int(eps_time)
+        self.min_samples = min_samples
+        self.keep_history = keep_history
+        self.num_points = 0
+        self.last_frame = None
+        # Union-find nodes: the cluster ids still referred to, then every point
+        # from _base on; points are numbered in stream order, nodes in the same order
+        self._ids = _Growing(np.int64, 0)         # Stream index of each node's point
+        self._counts = _Growing(np.int64, 1)      # Neighbours of each point, itself included
+        self._core = _Growing(bool, False)
+        self._parent = _Growing(np.int64, 0)      # Only core points are merged
+        self._cluster_id = _Growing(bool, False)  # Emitted as a cluster id, so kept when its point is dropped
+        self._base = 0            # First point still in the state
+        self._live_start = 0      # Its node
+        self._drop_until = 0      # Points before it may be dropped
+        self._trees = deque()     # (frame, start, tree) of frames later frames may still pair with
+        self._open = deque()      # (frame, start, stop) of frames whose core status is not final yet
+        self._unemitted = deque() # (frame, start, stop) of closed frames whose labels are not emitted yet
+        self._emitted = deque()   # (frame, start, stop) of emitted frames whose points are still in the state
+        self._pairs = {}          # Frame -> pairs (i, j) whose later point is in that frame
+        self._borders = {}        # Frame -> (border point, core neighbour) pairs of the frame's border points
+        self._several = []        # (border point, cluster id) of border points next to several clusters
+        self._history = []
+
+    def add_frame(self, frame, coordinates):
+        """
+        Adds the (n, 2) positions of the next frame.
+
+        Returns:
+        - list of (frame, labels) for the frames whose labels became final
+        """
+        if self.last_frame is not None and frame <= self.last_frame:
+            raise ValueError(f"Frames must be added in increasing order (got {frame} after {self.last_frame})")
+        emitted = self._advance(frame)
+        coordinates = np.asarray(coordinates, dtype=np.float64)
+        start, n = self.num_points, len(coordinates)
+        node = self._parent.size
+        self.num_points += n
+        self.last_frame = frame
+        for values in (self._ids, self._counts, self._core, self._parent, self._cluster_id):
+            values.extend(n)
+        self._ids.values[node:node + n] = np.arange(start, start + n)
+        self._parent.values[node:node + n] = np.arange(node, node + n)
+
+        tree = cKDTree(coordinates.reshape(-1, 2))
+        pairs = [tree.query_pairs(self.eps_space, output_type='ndarray') + start]
+        for earlier, earlier_start, earlier_tree in self._trees:
+            found = tree.sparse_distance_matrix(earlier_tree, self.eps_space, output_type='ndarray')
+            pairs.append(np.column_stack((found['i'] + start, found['j'] + earlier_start)))
+        pairs = np.concatenate([p.reshape(-1, 2) for p in pairs]).astype(np.int64)
+        if len(pairs):
+            # Only the points of the new pairs change, and they all lie in the window
+            low = pairs.min()
+            touched = np.bincount(pairs.ravel() - low)
+            first = self._node(low)
+            self._counts.values[first:first + len(touched)] += touched
+        self._pairs[frame] = pairs
+        self._trees.append((frame, start, tree))
+        self._open.append((frame, start, start + n))
+        return emitted
+
+    def flush(self):
+        """
+        Closes and emits every remaining frame, as if the stream ended.
+
+        Returns:
+        - list of (frame, labels)
+        """
+        return self._advance(None)
+
+    def _node(self, point):
+        # Node of a point still in the state
+        return point - self._base + self._live_start
+
+    def _nodes(self, points):
+        # Nodes of points still in the state or emitted as cluster ids
+        points = np.asarray(points, dtype=np.int64)
+        nodes = points - self._base + self._live_start
+        dropped = points < self._base
+        if dropped.any():
+            nodes[dropped] = np.searchsorted(self._ids.values[:self._live_start], points[dropped])
+        return nodes
+
+    def _advance(self, next_frame):
+        # Frames more than eps_time before next_frame can get no more neighbours
+        def done(frame):
+            return next_frame is None or next_frame - frame > self.eps_time
+
+        while self._trees and done(self._trees[0][0]):
+            self._trees.popleft()
+        while self._open and done(self._open[0][0]):
+            self._close(*self._open.popleft())
+        emitted = []
+        while self._unemitted:
+            frame, start, stop = self._unemitted[0]
+            # Wait until every frame that can pair with this one has closed
+            if not done(frame) or (self._open and self._open[0][0] - frame <= self.eps_time):
+                break
+            self._unemitted.popleft()
+            self._emitted.append((frame, start, stop))
+            emitted.append((frame, self._emit(frame, start, stop)))
+        self._drop_points()
+        return emitted
+
+    def _drop_points(self):
+        # Points of emitted frames more than eps_time before every pending
+        # frame are in no pending pair or border pair
+        pending = self._unemitted or self._open
+        while self._emitted and (not pending or pending[0][0] - self._emitted[0][0] > self.eps_time):
+            self._drop_until = self._emitted.popleft()[2]
+        # Dropped in batches at least as large as what stays, so the copying is amortized
+        drop_until = self._drop_until
+        if drop_until - self._base < max(_COMPACT_MIN, self.num_points - drop_until):
+            return
+        parent = self._parent.view()
+        # Point every node at its root, so the nodes dropped are in no path
+        parent[:] = find(parent, np.arange(len(parent)))
+        stop = self._node(drop_until)
+        kept_ids = self._live_start + np.flatnonzero(self._cluster_id.values[self._live_start:stop])
+        keep = np.concatenate((np.arange(self._live_start), kept_ids, np.arange(stop, len(parent))))
+        renumber = np.full(len(parent), -1, dtype=np.int64)
+        renumber[keep] = np.arange(len(keep))
+        roots = renumber[parent[keep]]
+        for values in (self._ids, self._counts, self._core, self._parent, self._cluster_id):
+            values.keep(keep)
+        self._parent.values[:len(keep)] = roots
+        self._live_start += len(kept_ids)
+        self._base = drop_until
+
+    def _close(self, frame, start, stop):
+        self._unemitted.append((frame, start, stop))
+        core = self._core.view()
+        first = self._node(start)
+        core[first:first + stop - start] = self._counts.values[first:first + stop - start] >= self.min_samples
+        # Every pair ending in this frame now has both core flags final
+        i, j = self._pairs.pop(frame).T
+        node_i, node_j = self._nodes(i), self._nodes(j)
+        both = core[node_i] & core[node_j]
+        merge(self._parent.view(), node_i[both], node_j[both])
+        # Border pairs are kept with the border point's frame until it is emitted
+        for a, b, node_a, node_b in ((i, j, node_i, node_j), (j, i, node_j, node_i)):
+            edge = core[node_a] & ~core[node_b]
+            border, neighbour = b[edge], a[edge]
+            border_frames = self._frame_of(border)
+            for border_frame in np.unique(border_frames).tolist():
+                in_frame = border_frames == border_frame
+                self._borders.setdefault(border_frame, []).append(
+                    np.column_stack((border[in_frame], neighbour[in_frame])))
+
+    def _frame_of(self, points):
+        # Frame of each point, from the start offsets of the frames not emitted yet
+        tracked = list(self._unemitted) + list(self._open)
+        offsets = np.array([start for _, start, _ in tracked], dtype=np.int64)
+        frames = np.array([frame for frame, _, _ in tracked], dtype=np.int64)
+        return frames[np.searchsorted(offsets, points, side='right') - 1]
+
+    def _cluster_ids(self, nodes):
+        # Ids of the clusters of core nodes, marked so they outlive their points
+        roots = find(self._parent.view(), nodes)
+        self._cluster_id.values[roots] = True
+        return self._ids.values[roots]
+
+    def _emit(self, frame, start, stop):
+        first = self._node(start)
+        nodes = np.arange(first, first + stop - start)
+        core = self._core.values[first:first + stop - start]
+        labels = np.full(stop - start, -1, dtype=np.int64)
+        labels[core] = self._cluster_ids(nodes[core])
+        borders = self._borders.pop(frame, [])
+        if borders:
+            borders = np.concatenate(borders)
+            ids = self._cluster_ids(self._nodes(borders[:, 1]))
+            nearest = np.full(stop - start, _NO_CLUSTER, dtype=np.int64)
+            np.minimum.at(nearest, borders[:, 0] - start, ids)
+            reached = nearest != _NO_CLUSTER
+            labels[reached] = nearest[reached]
+            # Which of several clusters is the lowest can change when they merge with others
+            candidates = np.unique(np.column_stack((borders[:, 0], ids)), axis=0)
+            several = np.bincount(candidates[:, 0] - start, minlength=stop - start) > 1
+            candidates = candidates[several[candidates[:, 0] - start]]
+            if len(candidates):
+                self._several.append(candidates)
+        if self.keep_history:
+            self._history.append(labels)
+        return labels
+
+    def current_ids(self, ids):
+        """
+        The id each emitted cluster id has now: clusters that merged after
+        being emitted take the id of the merged cluster. -1 is kept.
+        """
+        ids = np.array(ids, dtype=np.int64)
+        clustered = ids >= 0
+        roots = find(self._parent.view(), self._nodes(ids[clustered]))
+        ids[clustered] = self._ids.values[roots]
+        return ids
+
+    def ambiguous(self, start, stop):
+        """
+        Mask of the points start..stop-1 that are border points next to
+        several clusters, whose labels resolve() may change beyond current_ids().
+        """
+        mask = np.zeros(stop - start, dtype=bool)
+        points = self._several_points()
+        mask[np.unique(points[(points >= start) & (points < stop)]) - start] = True
+        return mask
+
+    def _several_points(self):
+        if len(self._several) > 1:
+            self._several = [np.concatenate(self._several)]
+        return self._several[0][:, 0] if self._several else np.empty(0, dtype=np.int64)
+
+    def resolve(self, labels, points=None):
+        """
+        Emitted labels as they are now: the current_ids() of their clusters,
+        and each border point in the lowest of the clusters it is next to.
+        After flush() this is the clustering st_dbscan_arrays() gives for the
+        whole stream, with cluster ids for labels (see number_clusters()).
+
+        Parameters:
+        - labels: labels emitted for some points
+        - points: the points' indices in stream order, increasing (default:
+          0, 1, ..., so labels covers the stream from its start)
+        """
+        labels = self.current_ids(labels)
+        several = self._several_points()
+        if not len(several):
+            return labels
+        points = np.arange(len(labels)) if points is None else np.asarray(points, dtype=np.int64)
+        position = np.searchsorted(points, several)
+        found = position < len(points)
+        found[found] = points[position[found]] == several[found]
+        nearest = np.full(len(labels), _NO_CLUSTER, dtype=np.int64)
+        np.minimum.at(nearest, position[found], self.current_ids(self._several[0][found, 1]))
+        reached = nearest != _NO_CLUSTER
+        labels[reached] = nearest[reached]
+        return labels
+
+    def final_labels(self):
+        """
+        Labels of every point added, in stream order, numbered like
+        st_dbscan_arrays(): clusters 0, 1, ... in order of their first core
+        point, and each border point in the lowest-numbered adjacent cluster.
+        Call flush() first.
+        """
+        if self._open or self._unemitted:
+            raise RuntimeError("final_labels() needs every frame closed; call flush() first")
+        if not self.keep_history:
+            raise RuntimeError("final_labels() needs keep_history=True")
+        labels = np.concatenate(self._history) if self._history else np.empty(0, dtype=np.int64)
+        return number_clusters(self.resolve(labels))
+
+
+def iter_st_dbscan(frames, eps_space, eps_time, min_samples):
+    """
+    Streams ST-DBSCAN labels frame by frame.
+
+    Parameters:
+    - frames: iterable of (frame, coordinates) in increasing frame order,
+      e.g. ((frame, index.features(frame)) for frame in index)
+    - eps_space, eps_time, min_samples: as for st_dbscan()
+
+    Yields:
+    - (frame, labels) for every frame, in order, with cluster ids that are
+      stable across frames (see IncrementalSTDBSCAN)
+    """
+    clusterer = IncrementalSTDBSCAN(eps_space, eps_time, min_samples, keep_history=False)
+    for frame, coordinates in frames:
+        yield from clusterer.add_frame(frame, coordinates)
+    yield from clusterer.flush()
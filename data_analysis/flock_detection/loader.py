@@ -0,0 +1,255 @@
+"""
+Reading recorded boid datasets with the dtypes the analysis expects.
+
+Parsing a large CSV takes seconds to minutes, so load_dataset() writes a
+typed columnar sidecar next to it the first time it is read: int32 ids and
+frames, float32 state and a categorical color. Later loads read the
+sidecar instead, as long as the CSV's size and modification time still
+match the ones recorded in it; otherwise it is rebuilt. Only the requested
+columns and frames are read from the sidecar.
+
+The sidecar is a Parquet file (<csv>.parquet) when pyarrow is installed,
+and otherwise a directory of .npy columns (<csv>.columns) that is memory
+mapped, so only the rows of the requested frames are read. iter_batches()
+reads a dataset that does not fit in memory a batch of rows at a time.
+
+    boid = load_dataset('data/boid_simulation_datav2.csv', columns=['frame', 'flock_id', 'x', 'y'],
+                        frames=(0, 500))
+"""
+import json
+import os
+import shutil
+import warnings
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional; the .npy sidecar needs only numpy
+    pa = pq = None
+
+# The dtypes DBScan_analysis.ipynb reads boid_simulation_datav2.csv with
+CSV_DTYPES = {
+    'boid_id': 'int',
+    'color': 'str',
+    'flock_id': 'int',
+    'frame': 'int',
+    'vx': 'float32',
+    'vy': 'float32',
+    'x': 'float32',
+    'y': 'float32',
+}
+
+# The compact dtypes of the sidecar, and of datasets loaded with one
+SIDECAR_DTYPES = {
+    'boid_id': 'int32',
+    'color': 'category',
+    'flock_id': 'int32',
+    'frame': 'int32',
+    'vx': 'float32',
+    'vy': 'float32',
+    'x': 'float32',
+    'y': 'float32',
+}
+
+SIDECAR_VERSION = 1
+PARQUET_ROW_GROUP = 65536
+
+
+def load_dataset(path, columns=None, frames=None, sidecar=True):
+    """
+    Reads a boid simulation CSV (gzip-compressed if the path ends in .gz).
+
+    Parameters:
+    - path: CSV file written by the simulation's export
+    - columns: optional list of columns to read (default: all)
+    - frames: optional (start, stop) range of frame numbers to read, stop excluded
+    - sidecar: read through the columnar sidecar, building it if it is missing
+      or out of date (default); False parses the CSV with CSV_DTYPES
+
+    Returns:
+    - DataFrame with the SIDECAR_DTYPES column types (CSV_DTYPES when sidecar=False)
+    """
+    if sidecar:
+        data = read_sidecar(path, columns, frames)
+        if data is not None:
+            return data
+        data = _to_sidecar_dtypes(pd.read_csv(path, dtype=CSV_DTYPES))
+        try:
+            write_sidecar(path, data)
+        except OSError as error:
+            warnings.warn(f"Could not write the sidecar of {path}: {error}")
+        return _select(data, columns, frames)
+    usecols = columns
+    if columns is not None and frames is not None:
+        usecols = list(columns) + ['frame']  # Needed to select the frames
+    dtypes = {column: dtype for column, dtype in CSV_DTYPES.items() if usecols is None or column in usecols}
+    data = pd.read_csv(path, dtype=dtypes, usecols=usecols)
+    return _select(data, columns, frames)
+
+
+def _to_sidecar_dtypes(data):
+    return data.astype({column: dtype for column, dtype in SIDECAR_DTYPES.items() if column in data.columns})
+
+
+def _select(data, columns, frames):
+    # The rows of the frame range and the requested columns, in file order
+    if frames is not None:
+        frame = data['frame'].to_numpy()
+        data = data[(frame >= frames[0]) & (frame < frames[1])].reset_index(drop=True)
+    if columns is not None:
+        data = data[list(columns)]
+    return data
+
+
+# ------------------------------
+# Sidecar Files
+# ------------------------------
+def sidecar_path(path):
+    """
+    Where the sidecar of a CSV is kept: <csv>.parquet, or <csv>.columns without pyarrow.
+    """
+    return path + ('.parquet' if pq is not None else '.columns')
+
+
+def _source_stamp(path):
+    # Identifies the CSV the sidecar was built from
+    stat = os.stat(path)
+    return {'version': SIDECAR_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def write_sidecar(path, data):
+    """
+    Writes the sidecar of the CSV at path from its data, replacing any old one.
+    """
+    target = sidecar_path(path)
+    stamp = _source_stamp(path)
+    frame = data['frame'].to_numpy()
+    stamp['frames_sorted'] = bool(len(frame) == 0 or np.all(frame[1:] >= frame[:-1]))
+    temporary = target + '.tmp'
+    _remove(temporary)
+    if pq is not None:
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        metadata = dict(table.schema.metadata or {}, boid_sidecar=json.dumps(stamp))
+        pq.write_table(table.replace_schema_metadata(metadata), temporary, row_group_size=PARQUET_ROW_GROUP)
+    else:
+        os.makedirs(temporary)
+        stamp['columns'] = list(data.columns)
+        stamp['categories'] = {}
+        for column in data.columns:
+            values = data[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                stamp['categories'][column] = values.cat.categories.tolist()
+                values = values.cat.codes
+            np.save(os.path.join(temporary, column + '.npy'), values.to_numpy())
+        with open(os.path.join(temporary, 'meta.json'), 'w') as f:
+            json.dump(stamp, f)
+    # Readers never see a half-written sidecar
+    _remove(target)
+    os.replace(temporary, target)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _read_stamp(target):
+    try:
+        if pq is not None:
+            metadata = pq.read_schema(target).metadata or {}
+            return json.loads(metadata[b'boid_sidecar'])
+        with open(os.path.join(target, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, KeyError, ValueError):  # Missing or unreadable: rebuild it
+        return None
+
+
+def _current_stamp(path):
+    # The sidecar's stamp, or None when it is missing or out of date
+    stamp = _read_stamp(sidecar_path(path))
+    if stamp is None or any(stamp.get(key) != value for key, value in _source_stamp(path).items()):
+        return None
+    return stamp
+
+
+def read_sidecar(path, columns=None, frames=None):
+    """
+    The dataset from the CSV's sidecar, or None when there is no sidecar
+    or it was built from a different version of the CSV.
+
+    Parameters:
+    - path: the CSV file
+    - columns, frames: as for load_dataset()
+    """
+    target = sidecar_path(path)
+    stamp = _current_stamp(path)
+    if stamp is None:
+        return None
+    if pq is not None:
+        filters = None if frames is None else [('frame', '>=', frames[0]), ('frame', '<', frames[1])]
+        table = pq.read_table(target, columns=None if columns is None else list(columns), filters=filters)
+        return table.to_pandas()
+
+    names = stamp['columns'] if columns is None else list(columns)
+    arrays = {name: np.load(os.path.join(target, name + '.npy'), mmap_mode='r')
+              for name in set(names) | ({'frame'} if frames is not None else set())}
+    rows = slice(None)
+    if frames is not None:
+        frame = arrays['frame']
+        if stamp['frames_sorted']:
+            rows = slice(*np.searchsorted(frame, frames, side='left'))
+        else:
+            rows = np.flatnonzero((frame >= frames[0]) & (frame < frames[1]))
+    return _npy_rows(stamp, arrays, names, rows)
+
+
+def _npy_rows(stamp, arrays, names, rows):
+    # The rows of memory-mapped .npy columns as a DataFrame, with the categories restored
+    data = {}
+    for name in names:
+        values = np.array(arrays[name][rows])
+        if name in stamp['categories']:
+            values = pd.Categorical.from_codes(values, stamp['categories'][name])
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+# ------------------------------
+# Reading in Batches
+# ------------------------------
+def iter_batches(path, columns=None, batch_rows=PARQUET_ROW_GROUP, sidecar=True):
+    """
+    Reads a dataset in batches of rows, in file order, without loading it
+    whole: from its sidecar when it is up to date, otherwise from the CSV.
+    The sidecar is not built here, as that needs the whole dataset.
+
+    Parameters:
+    - path: the CSV file
+    - columns: optional list of columns to read (default: all)
+    - batch_rows: rows per batch (the last one may be shorter)
+    - sidecar: use the sidecar when it is up to date (default)
+
+    Yields:
+    - DataFrames with the SIDECAR_DTYPES column types
+    """
+    stamp = _current_stamp(path) if sidecar else None
+    if stamp is None:
+        dtypes = {column: dtype for column, dtype in CSV_DTYPES.items() if columns is None or column in columns}
+        for batch in pd.read_csv(path, dtype=dtypes, usecols=columns, chunksize=batch_rows):
+            yield _to_sidecar_dtypes(batch)
+        return
+    target = sidecar_path(path)
+    if pq is not None:
+        for batch in pq.ParquetFile(target).iter_batches(batch_size=batch_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+    names = stamp['columns'] if columns is None else list(columns)
+    arrays = {name: np.load(os.path.join(target, name + '.npy'), mmap_mode='r') for name in names}
+    num_rows = len(arrays[names[0]]) if names else 0
+    for start in range(0, num_rows, batch_rows):
+        yield _npy_rows(stamp, arrays, names, slice(start, start + batch_rows))
@@ -0,0 +1,124 @@
+"""
+Scoring of cluster labels against the simulation's ground-truth flocks.
+
+These are the helpers from DBScan_analysis.ipynb: clusters are matched to
+flocks with the Hungarian algorithm, and a frame is scored with the
+Adjusted Rand Index (ARI) and Normalized Mutual Information (NMI).
+"""
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+
+NOISE = -1
+
+
+def map_clusters_to_flocks(true_labels, cluster_labels):
+    """
+    Maps DBSCAN cluster labels to true flock IDs using the Hungarian algorithm.
+
+    Parameters:
+    - true_labels: array-like of shape (n_samples,)
+    - cluster_labels: array-like of shape (n_samples,)
+
+    Returns:
+    - mapping: dict where keys are cluster labels and values are flock IDs.
+      Noise points are ignored, and clusters left over when there are more
+      clusters than flocks are not mapped.
+    """
+    true_labels = np.asarray(true_labels)
+    cluster_labels = np.asarray(cluster_labels)
+    # Exclude noise points for mapping
+    mask = cluster_labels != NOISE
+    flocks = np.unique(true_labels[mask])
+    clusters = np.unique(cluster_labels[mask])
+    if len(flocks) == 0 or len(clusters) == 0:
+        return {}
+    # Rows are flocks and columns are clusters, so the assignment can be read back as labels
+    # (flock IDs and cluster labels overlap, so they are counted by position, not by value)
+    rows = np.searchsorted(flocks, true_labels[mask])
+    cols = np.searchsorted(clusters, cluster_labels[mask])
+    cm = np.bincount(rows * len(clusters) + cols, minlength=len(flocks) * len(clusters))
+    cm = cm.reshape(len(flocks), len(clusters))
+    row_ind, col_ind = linear_sum_assignment(-cm)
+    return {clusters[col].item(): flocks[row].item() for row, col in zip(row_ind, col_ind)}
+
+
+def calculate_metrics(true_labels, predicted_labels):
+    """
+    Calculates Adjusted Rand Index (ARI) and Normalized Mutual Information (NMI).
+
+    Parameters:
+    - true_labels: array-like of shape (n_samples,)
+    - predicted_labels: array-like of shape (n_samples,)
+
+    Returns:
+    - ari: Adjusted Rand Index
+    - nmi: Normalized Mutual Information
+    """
+    ari = adjusted_rand_score(true_labels, predicted_labels)
+    nmi = normalized_mutual_info_score(true_labels, predicted_labels)
+    return ari, nmi
+
+
+def apply_mapping(cluster_labels, mapping):
+    """
+    Relabels clusters with their mapped flock IDs; noise and unmapped clusters become -1.
+    """
+    cluster_labels = np.asarray(cluster_labels)
+    mapped = np.full(len(cluster_labels), NOISE, dtype=np.int64)
+    if not mapping:
+        return mapped
+    clusters = np.array(sorted(mapping))
+    flocks = np.array([mapping[cluster] for cluster in clusters.tolist()])
+    found = np.minimum(np.searchsorted(clusters, cluster_labels), len(clusters) - 1)
+    hit = clusters[found] == cluster_labels
+    mapped[hit] = flocks[found[hit]]
+    return mapped
+
+
+def correct_mask(true_labels, predicted_labels, mapping):
+    """
+    Points whose cluster is mapped to their own flock. Noise points are never correct.
+    """
+    predicted_labels = np.asarray(predicted_labels)
+    return (predicted_labels != NOISE) & (apply_mapping(predicted_labels, mapping) == np.asarray(true_labels))
+
+
+def score_frame(true_labels, cluster_labels, scoring='mapped'):
+    """
+    Scores one frame's clustering.
+
+    Parameters:
+    - true_labels: flock IDs, array-like of shape (n_samples,)
+    - cluster_labels: cluster labels with -1 for noise, array-like of shape (n_samples,)
+    - scoring: 'raw' scores the cluster labels as they are; 'mapped' first maps
+      clusters to flocks and scores the mapped labels, unless all points are
+      noise or in a single cluster (the DBSCAN vs. ST-DBSCAN comparison in the notebook)
+
+    Returns:
+    - ari, nmi
+    """
+    if scoring == 'raw' or len(np.unique(cluster_labels)) <= 1:
+        return calculate_metrics(true_labels, cluster_labels)
+    if scoring != 'mapped':
+        raise ValueError(f"Unknown scoring '{scoring}' (expected 'raw' or 'mapped')")
+    mapping = map_clusters_to_flocks(true_labels, cluster_labels)
+    return calculate_metrics(true_labels, apply_mapping(cluster_labels, mapping))
+
+
+def assign_colors(true_labels, predicted_labels, mapping):
+    """
+    Assigns colors to boids based on correct or incorrect cluster assignments.
+
+    Parameters:
+    - true_labels: array-like of shape (n_samples,)
+    - predicted_labels: array-like of shape (n_samples,)
+    - mapping: dict mapping cluster labels to flock IDs
+
+    Returns:
+    - colors: list of colors for each boid ('blue' for correct, 'red' for incorrect, 'grey' for noise)
+    """
+    predicted_labels = np.asarray(predicted_labels)
+    correct = correct_mask(true_labels, predicted_labels, mapping)
+    colors = np.where(predicted_labels == NOISE, 'grey', np.where(correct, 'blue', 'red'))
+    return colors.tolist()
@@ -0,0 +1,448 @@
+"""
+Per-frame flock detection: standardize -> cluster -> map to flocks -> ARI/NMI.
+
+This is the loop DBScan_analysis.ipynb runs over every frame, split across a
+process pool. The columns the pipeline reads are copied once into a shared
+memory block, sorted by frame; each worker attaches to it read-only and
+evaluates a contiguous range of frames, so the dataset is neither pickled
+per task nor copied per worker.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import DBSCAN
+from sklearn.preprocessing import StandardScaler
+
+from .frames import FrameIndex
+from .grid_dbscan import grid_dbscan
+from .incremental import IncrementalSTDBSCAN, number_clusters
+from .batch_metrics import FrameTables
+from .cache import dataset_fingerprint, make_key
+from .st_dbscan import st_dbscan_arrays
+
+FEATURE_SETS = {
+    'position': ('x', 'y'),
+    'position_velocity': ('x', 'y', 'vx', 'vy'),
+}
+ALGORITHMS = ('dbscan', 'st_dbscan')
+ENGINES = ('sklearn', 'grid')
+ST_SCOPES = ('frame', 'trajectory', 'stream')
+COLUMNS = ('frame', 'flock_id', 'x', 'y', 'vx', 'vy')
+METRIC_COLUMNS = ['frame', 'ARI', 'NMI', 'clusters', 'noise_fraction', 'points']
+
+
+@dataclass
+class PipelineConfig:
+    """
+    Settings of one pipeline run; the defaults are the notebook's.
+
+    - features: key of FEATURE_SETS used by DBSCAN
+    - algorithm: 'dbscan' (standardized features) or 'st_dbscan' (raw x, y and frame)
+    - eps, min_samples: DBSCAN parameters
+    - engine: DBSCAN implementation, 'sklearn' or 'grid' (grid_dbscan, which
+      gives the same clusters and clusters a whole range of frames per call)
+    - eps_space, eps_time: ST-DBSCAN thresholds (min_samples is shared)
+    - st_scope: 'frame' runs ST-DBSCAN on each frame alone, as the notebook
+      does; 'trajectory' clusters all frames at once, so eps_time links
+      neighbouring frames, and then scores each frame's labels; 'stream'
+      clusters the frames one at a time with IncrementalSTDBSCAN and scores
+      the labels it resolves once the last frame is in, which are those of
+      'trajectory' (run_chunked() uses it for datasets larger than memory)
+    - scoring: 'raw' scores the labels as they are, as the notebook's per-frame
+      loops do; 'mapped' maps clusters to flocks first, as its DBSCAN vs.
+      ST-DBSCAN comparison does (see metrics.score_frame; computed for many
+      frames at once by batch_metrics)
+    """
+    features: str = 'position'
+    algorithm: str = 'dbscan'
+    eps: float = 0.5
+    min_samples: int = 5
+    engine: str = 'sklearn'
+    eps_space: float = 25.0
+    eps_time: int = 1
+    st_scope: str = 'frame'
+    scoring: str = 'raw'
+
+    def __post_init__(self):
+        if self.features not in FEATURE_SETS:
+            raise ValueError(f"Unknown feature set '{self.features}' (available: {', '.join(FEATURE_SETS)})")
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm '{self.algorithm}' (available: {', '.join(ALGORITHMS)})")
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown DBSCAN engine '{self.engine}' (available: {', '.join(ENGINES)})")
+        if self.st_scope not in ST_SCOPES:
+            raise ValueError(f"Unknown ST-DBSCAN scope '{self.st_scope}' (available: {', '.join(ST_SCOPES)})")
+
+
+def cluster_frame(columns, config):
+    """
+    Clusters one frame given its column arrays. Returns labels with -1 for
+    noise; labels computed beforehand over the whole trajectory are passed
+    in as the 'labels' column and returned as they are.
+    """
+    if 'labels' in columns:
+        return columns['labels']
+    if config.algorithm == 'st_dbscan':
+        coordinates = np.column_stack((columns['x'], columns['y']))
+        return st_dbscan_arrays(coordinates, columns['frame'], config.eps_space, config.eps_time,
+                                config.min_samples)
+    X = np.column_stack([columns[name] for name in FEATURE_SETS[config.features]])
+    X_scaled = StandardScaler().fit_transform(X)
+    if config.engine == 'grid':
+        return grid_dbscan(X_scaled, config.eps, config.min_samples)
+    return DBSCAN(eps=config.eps, min_samples=config.min_samples).fit(X_scaled).labels_
+
+
+def standardized_features(arrays, offsets, features):
+    """
+    The features of consecutive frames, each frame standardized on its own
+    as cluster_frame() does.
+
+    Parameters:
+    - arrays: column arrays of the frames' rows
+    - offsets: row offsets of the frames in the arrays, starting at 0
+    - features: key of FEATURE_SETS
+    """
+    X = np.column_stack([arrays[name][:offsets[-1]] for name in FEATURE_SETS[features]])
+    return np.concatenate([StandardScaler().fit_transform(X[start:stop])
+                           for start, stop in zip(offsets[:-1], offsets[1:])])
+
+
+def grid_range_labels(arrays, offsets, config):
+    """
+    DBSCAN labels of consecutive frames from one grid_dbscan() call, each
+    frame standardized on its own as cluster_frame() does.
+
+    Parameters:
+    - arrays: column arrays of the frames' rows
+    - offsets: row offsets of the frames in the arrays, starting at 0
+
+    Returns:
+    - labels: array with one entry per row, numbered from 0 within each frame
+    """
+    X_scaled = standardized_features(arrays, offsets, config.features)
+    groups = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    return grid_dbscan(X_scaled, config.eps, config.min_samples, groups=groups)
+
+
+def uses_grid_batches(config):
+    return config.algorithm == 'dbscan' and config.engine == 'grid'
+
+
+def score_frames(frames, offsets, flock_ids, labels, scoring):
+    """
+    Scores the labels of consecutive frames together (see batch_metrics).
+    Returns the rows of the metrics table.
+    """
+    tables = FrameTables(offsets, flock_ids, labels)
+    ari, nmi = tables.scores(scoring)
+    return list(zip(np.asarray(frames).tolist(), ari.tolist(), nmi.tolist(), tables.num_clusters.tolist(),
+                    tables.noise_fractions().tolist(), tables.sizes.tolist()))
+
+
+def evaluate_frame(frame, columns, config):
+    """
+    Runs the pipeline on one frame. Returns a row of the metrics table.
+    """
+    labels = cluster_frame(columns, config)
+    return score_frames([frame], [0, len(labels)], columns['flock_id'], labels, config.scoring)[0]
+
+
+# ------------------------------
+# Shared Dataset
+# ------------------------------
+class SharedArrays:
+    """
+    Named 1-d arrays in one shared memory block. Created by the parent
+    process; workers attach() to it by name and get read-only array views.
+    """
+    def __init__(self, arrays):
+        self.layout = []
+        size = 0
+        for name, values in arrays.items():
+            self.layout.append((name, values.dtype.str, len(values), size))
+            size += values.nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.arrays = self._views(self.shm, self.layout)
+        for name, values in arrays.items():
+            self.arrays[name][:] = values
+        for values in self.arrays.values():
+            values.flags.writeable = False
+
+    @staticmethod
+    def _views(shm, layout):
+        return {name: np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=offset)
+                for name, dtype, length, offset in layout}
+
+    def spec(self):
+        # Everything a worker needs to attach, small enough to send to each process
+        return (self.shm.name, self.layout)
+
+    @classmethod
+    def attach(cls, spec):
+        name, layout = spec
+        shm = shared_memory.SharedMemory(name=name)
+        arrays = cls._views(shm, layout)
+        for values in arrays.values():
+            values.flags.writeable = False
+        return shm, arrays
+
+    def close(self):
+        self.arrays = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedDataset(SharedArrays):
+    """
+    The pipeline's columns of a FrameIndex in shared memory, plus the row
+    offsets of each frame. `extra` adds per-row arrays in the index's order,
+    such as precomputed labels.
+    """
+    def __init__(self, index, extra=None):
+        arrays = {name: np.ascontiguousarray(index.arrays[name]) for name in COLUMNS}
+        arrays.update(extra or {})
+        arrays['offsets'] = index.offsets
+        super().__init__(arrays)
+        self.frames = index.frames
+
+
+def frame_columns(arrays, index):
+    # Zero-copy views of the rows of the index-th frame
+    start, stop = arrays['offsets'][index], arrays['offsets'][index + 1]
+    return {name: values[start:stop] for name, values in arrays.items() if name != 'offsets'}
+
+
+def label_range(arrays, start, stop, config):
+    # Labels of the rows of frames start..stop-1
+    offsets = arrays['offsets'][start:stop + 1]
+    if uses_grid_batches(config):
+        # The whole range in one clustering call
+        rows = {name: values[offsets[0]:offsets[-1]] for name, values in arrays.items() if name != 'offsets'}
+        return grid_range_labels(rows, offsets - offsets[0], config)
+    return np.concatenate([cluster_frame(frame_columns(arrays, i), config) for i in range(start, stop)])
+
+
+def evaluate_range(arrays, start, stop, config):
+    offsets = arrays['offsets'][start:stop + 1]
+    labels = label_range(arrays, start, stop, config)
+    return score_frames(arrays['frame'][offsets[:-1]], offsets - offsets[0], arrays['flock_id'][offsets[0]:offsets[-1]],
+                        labels, config.scoring)
+
+
+# Per-worker state, set by _init_worker
+_worker_shm = None
+_worker_arrays = None
+_worker_config = None
+
+
+def _init_worker(spec, config):
+    global _worker_shm, _worker_arrays, _worker_config
+    _worker_shm, _worker_arrays = SharedDataset.attach(spec)
+    _worker_config = config
+
+
+def _evaluate_task(bounds):
+    return evaluate_range(_worker_arrays, bounds[0], bounds[1], _worker_config)
+
+
+def _label_task(bounds):
+    return bounds, label_range(_worker_arrays, bounds[0], bounds[1], _worker_config)
+
+
+def run_pipeline(data, config=None, workers=None, frames_per_task=None, progress=None, cache=None):
+    """
+    Evaluates every frame of a boid dataset.
+
+    Parameters:
+    - data: FrameIndex, or DataFrame with at least the frame, flock_id, x, y,
+      vx and vy columns
+    - config: PipelineConfig (defaults to the notebook's DBSCAN settings)
+    - workers: number of processes; 1 runs in this process (default: all CPUs)
+    - frames_per_task: frames handed to a worker at a time (default: about
+      eight tasks per worker, to balance load)
+    - progress: optional callable(frames_done, total_frames)
+    - cache: optional cache.AnalysisCache; frames whose labels or metrics
+      are stored for the same data and settings are not recomputed
+
+    Returns:
+    - metrics: DataFrame with one row per frame (METRIC_COLUMNS), sorted by frame
+    """
+    config = config if config is not None else PipelineConfig()
+    workers = workers or os.cpu_count() or 1
+    index = data if isinstance(data, FrameIndex) else FrameIndex(data)
+    if cache is not None:
+        return cached_pipeline(index, config, cache, workers, frames_per_task, progress)
+    extra = {}
+    if config.algorithm == 'st_dbscan' and config.st_scope != 'frame':
+        # One clustering over all frames; the workers only score it
+        extra['labels'] = trajectory_labels(index, config)
+    if workers == 1:
+        # No processes to share with, so evaluate straight from the index
+        return evaluate_frames(index, config, progress, extra)
+    dataset = SharedDataset(index, extra)
+    try:
+        total = len(dataset.frames)
+        if frames_per_task is None:
+            frames_per_task = max(1, -(-total // (workers * 8)))
+        tasks = [(start, min(start + frames_per_task, total)) for start in range(0, total, frames_per_task)]
+        rows = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(dataset.spec(), config)) as pool:
+            for result in pool.map(_evaluate_task, tasks):
+                rows.extend(result)
+                if progress is not None:
+                    progress(len(rows), total)
+    finally:
+        dataset.close()
+    return pd.DataFrame(rows, columns=METRIC_COLUMNS)
+
+
+def _task_bounds(positions, frames_per_task):
+    # Runs of consecutive frame positions, split into tasks of at most frames_per_task frames
+    positions = np.asarray(positions)
+    breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+    for run in np.split(positions, breaks):
+        for start in range(0, len(run), frames_per_task):
+            chunk = run[start:start + frames_per_task]
+            yield int(chunk[0]), int(chunk[-1]) + 1
+
+
+def label_frames(index, config, positions, workers, frames_per_task=None, progress=None):
+    """
+    Cluster labels of the frames at the given positions of the index (all
+    frames for the ST-DBSCAN scopes that cluster the whole trajectory).
+
+    Returns:
+    - labels: array from index.new_column(), -1 in the frames not labelled
+    """
+    if config.algorithm == 'st_dbscan' and config.st_scope != 'frame':
+        return trajectory_labels(index, config)
+    if frames_per_task is None:
+        frames_per_task = max(1, -(-len(positions) // (workers * 8)))
+    tasks = list(_task_bounds(positions, frames_per_task))
+    labels = index.new_column()
+    done = 0
+
+    def store(bounds, frame_labels):
+        nonlocal done
+        labels[index.offsets[bounds[0]]:index.offsets[bounds[1]]] = frame_labels
+        done += bounds[1] - bounds[0]
+        if progress is not None:
+            progress(done, len(positions))
+
+    if workers == 1:
+        arrays = {name: index.arrays[name] for name in COLUMNS}
+        arrays['offsets'] = index.offsets
+        for bounds in tasks:
+            store(bounds, label_range(arrays, bounds[0], bounds[1], config))
+        return labels
+    dataset = SharedDataset(index)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(dataset.spec(), config)) as pool:
+            for bounds, frame_labels in pool.map(_label_task, tasks):
+                store(bounds, frame_labels)
+    finally:
+        dataset.close()
+    return labels
+
+
+def cache_keys(config, dataset, frames):
+    """
+    AnalysisCache keys of the labels and of the metric rows of each frame.
+    The metrics also depend on the scoring; the DBSCAN engine is left out,
+    as both engines give the same clusters.
+    """
+    if config.algorithm == 'dbscan':
+        features, scaler = config.features, 'standard'
+        params = {'eps': config.eps, 'min_samples': config.min_samples}
+    else:
+        features, scaler = 'position', 'none'
+        params = {'eps_space': config.eps_space, 'eps_time': config.eps_time, 'min_samples': config.min_samples,
+                  'st_scope': config.st_scope}
+    scored = dict(params, scoring=config.scoring)
+    label_keys = [make_key('labels', dataset, frame, features, scaler, config.algorithm, params) for frame in frames]
+    metric_keys = [make_key('metrics', dataset, frame, features, scaler, config.algorithm, scored) for frame in frames]
+    return label_keys, metric_keys
+
+
+def cached_pipeline(index, config, cache, workers, frames_per_task=None, progress=None):
+    """
+    run_pipeline() through an AnalysisCache. Metric rows and labels found in
+    the cache are reused, only the frames without labels are clustered, and
+    all frames are then scored together; new labels and rows are stored.
+    """
+    dataset = dataset_fingerprint({name: index.arrays[name] for name in COLUMNS})
+    frames = index.frames.tolist()
+    label_keys, metric_keys = cache_keys(config, dataset, frames)
+    stored_rows = cache.get_many(metric_keys)
+    if len(stored_rows) == len(frames):
+        rows = [(frame, *stored_rows[key]['row'].tolist()) for frame, key in zip(frames, metric_keys)]
+        metrics = pd.DataFrame(rows, columns=METRIC_COLUMNS)
+        return metrics.astype({'clusters': 'int64', 'points': 'int64'})
+
+    stored_labels = cache.get_many(label_keys)
+    missing = [position for position, key in enumerate(label_keys) if key not in stored_labels]
+    labels = index.new_column()
+    if missing:
+        labels = label_frames(index, config, missing, workers, frames_per_task, progress)
+        cache.put_many([(label_keys[position], {'labels': labels[index.offsets[position]:index.offsets[position + 1]]})
+                        for position in missing], 'labels')
+    for position, key in enumerate(label_keys):
+        if key in stored_labels:
+            labels[index.offsets[position]:index.offsets[position + 1]] = stored_labels[key]['labels']
+
+    rows = score_frames(index.frames, index.offsets, index.arrays['flock_id'], labels, config.scoring)
+    cache.put_many([(key, {'row': np.array(row[1:], dtype=np.float64)}) for key, row in zip(metric_keys, rows)],
+                   'metrics')
+    return pd.DataFrame(rows, columns=METRIC_COLUMNS)
+
+
+def trajectory_labels(index, config):
+    """
+    ST-DBSCAN labels of every row of the index, for the 'trajectory' and
+    'stream' scopes.
+    """
+    if config.st_scope == 'trajectory':
+        coordinates = np.column_stack((index.arrays['x'], index.arrays['y']))
+        return st_dbscan_arrays(coordinates, index.arrays['frame'], config.eps_space, config.eps_time,
+                                config.min_samples)
+    # Labels emitted early miss the merges of later frames; they are resolved once all frames are in
+    clusterer = IncrementalSTDBSCAN(config.eps_space, config.eps_time, config.min_samples, keep_history=False)
+    labels = index.new_column()
+    for frame in index:
+        for emitted, frame_labels in clusterer.add_frame(frame, index.features(frame, ('x', 'y'))):
+            index.put(labels, emitted, frame_labels)
+    for emitted, frame_labels in clusterer.flush():
+        index.put(labels, emitted, frame_labels)
+    return number_clusters(clusterer.resolve(labels))
+
+
+def evaluate_frames(index, config, progress=None, extra=None):
+    """
+    Serial run_pipeline() over a FrameIndex, in this process.
+    """
+    total = len(index)
+    if uses_grid_batches(config):
+        labels = grid_range_labels(index.arrays, index.offsets, config)
+    elif extra and 'labels' in extra:
+        labels = extra['labels']
+    else:
+        labels = index.new_column()
+        for done, (frame, columns) in enumerate(index.iter_frames(COLUMNS), 1):
+            index.put(labels, frame, cluster_frame(columns, config))
+            if progress is not None and (done % 100 == 0 or done == total):
+                progress(done, total)
+    rows = score_frames(index.frames, index.offsets, index.arrays['flock_id'], labels, config.scoring)
+    if progress is not None:
+        progress(total, total)
+    return pd.DataFrame(rows, columns=METRIC_COLUMNS)
+
+
+def describe_config(config):
+    return ', '.join(f"{key}={value}" for key, value in asdict(config).items())
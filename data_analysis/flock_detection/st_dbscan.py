@@ -0,0 +1,154 @@
+"""
+Space-Temporal DBSCAN.
+
+Two points are neighbours when they are within eps_space of each other and
+at most eps_time frames apart; a point with at least min_samples neighbours
+(counting itself) is a core point. Clusters are the connected groups of
+core points plus the non-core points next to them, as in DBSCAN.
+
+st_dbscan() finds all neighbour pairs with a KD-tree on (x, y, scaled
+frame) and labels the clusters with a vectorized union-find, so it runs on
+whole trajectories rather than one frame at a time. st_dbscan_reference()
+is the point-by-point implementation from DBScan_analysis.ipynb, kept to
+validate against; both give the same labels.
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .unionfind import component_labels, union_find
+
+
+def st_dbscan(data, eps_space, eps_time, min_samples):
+    """
+    Space-Temporal DBSCAN clustering algorithm.
+
+    Parameters:
+    - data: pandas DataFrame containing 'x', 'y', 'frame' columns, over any
+      number of frames.
+    - eps_space: Spatial distance threshold.
+    - eps_time: Temporal distance threshold (number of frames).
+    - min_samples: Minimum number of points to form a dense region.
+
+    Returns:
+    - cluster_labels: numpy array of cluster labels assigned to each row of
+      data, in the data's row order (-1 for noise).
+    """
+    # Ensure required columns are present
+    required_columns = ['x', 'y', 'frame']
+    for col in required_columns:
+        if col not in data.columns:
+            raise ValueError(f"Column '{col}' is missing from the data.")
+    return st_dbscan_arrays(data[['x', 'y']].to_numpy(), data['frame'].to_numpy(), eps_space, eps_time, min_samples)
+
+
+def neighbour_pairs(coordinates, frames, eps_space, eps_time):
+    """
+    All pairs of distinct points that are spatio-temporal neighbours.
+
+    Frames are scaled onto a third axis so far apart that points of
+    different frames are never within eps_space of each other. One batched
+    query on a KD-tree of the points then finds the pairs within a frame,
+    and one query per frame offset 1..eps_time against a copy of the tree
+    shifted by that many frames finds the pairs across frames.
+
+    Returns:
+    - (i, j): int64 arrays with each unordered pair once
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    scale = 2.0 * eps_space + 1.0
+    points = np.column_stack((coordinates, frames * scale))
+    tree = cKDTree(points)
+    pairs = [tree.query_pairs(eps_space, output_type='ndarray')]
+    for offset in range(1, int(eps_time) + 1):
+        shifted = points.copy()
+        shifted[:, 2] += offset * scale
+        # Pairs (i, j) with frame[i] == frame[j] + offset
+        found = tree.sparse_distance_matrix(cKDTree(shifted), eps_space, output_type='ndarray')
+        pairs.append(np.column_stack((found['i'], found['j'])))
+    pairs = np.concatenate([p.reshape(-1, 2) for p in pairs]).astype(np.int64)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def cluster_pairs(n, i, j, min_samples):
+    """
+    DBSCAN labels from the neighbour pairs of n points.
+
+    Clusters are numbered in order of their first core point, and a border
+    point joins the lowest-numbered cluster it is next to, which is the
+    order in which the notebook's point-by-point expansion assigns them.
+
+    Returns:
+    - labels: array of shape (n,), -1 for noise
+    """
+    counts = np.bincount(i, minlength=n) + np.bincount(j, minlength=n) + 1  # Each point is its own neighbour
+    core = counts >= min_samples
+    both = core[i] & core[j]
+    labels = component_labels(union_find(n, i[both], j[both]), core)
+    # Border points: non-core points next to a core point
+    border = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    for a, b in ((i, j), (j, i)):
+        edge = core[a] & ~core[b]
+        np.minimum.at(border, b[edge], labels[a[edge]])
+    reached = ~core & (border != np.iinfo(np.int64).max)
+    labels[reached] = border[reached]
+    return labels
+
+
+def st_dbscan_arrays(coordinates, frames, eps_space, eps_time, min_samples):
+    """
+    st_dbscan() on an (n, 2) coordinate array and the matching frame numbers.
+    Points are visited in frame order (stable), and the labels are returned
+    in the order of the input.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    frames = np.asarray(frames)
+    n = len(coordinates)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    order = np.argsort(frames, kind='stable')
+    i, j = neighbour_pairs(coordinates[order], frames[order], eps_space, eps_time)
+    labels = np.empty(n, dtype=np.int64)
+    labels[order] = cluster_pairs(n, i, j, min_samples)
+    return labels
+
+
+def st_dbscan_reference(coordinates, frames, eps_space, eps_time, min_samples):
+    """
+    The notebook's implementation: each unvisited point scans the temporal
+    window for spatial neighbours and grows a cluster from it. Quadratic in
+    the points per window; use st_dbscan_arrays() for real workloads. Points
+    are visited in the given order, which should be sorted by frame.
+    """
+    n = len(coordinates)
+    # Initialize cluster labels (-1 for noise)
+    cluster_labels = np.full(n, -1, dtype=int)
+    cluster_id = 0
+    visited = np.zeros(n, dtype=bool)
+
+    def neighbours(idx):
+        # Points within the temporal window and the spatial threshold
+        temporal_mask = (frames >= frames[idx] - eps_time) & (frames <= frames[idx] + eps_time)
+        temporal_indices = np.where(temporal_mask)[0]
+        spatial_distances = np.linalg.norm(coordinates[temporal_indices] - coordinates[idx], axis=1)
+        return temporal_indices[spatial_distances <= eps_space].tolist()
+
+    for idx in range(n):
+        if visited[idx]:
+            continue
+        visited[idx] = True
+        seeds = neighbours(idx)
+        if len(seeds) < min_samples:
+            continue  # Noise, unless a later cluster reaches it
+        cluster_labels[idx] = cluster_id
+        while seeds:
+            current_seed = seeds.pop(0)
+            if not visited[current_seed]:
+                visited[current_seed] = True
+                seed_neighbours = neighbours(current_seed)
+                if len(seed_neighbours) >= min_samples:
+                    seeds.extend(seed_neighbours)
+            # Assign cluster ID if the point is not yet assigned
+            if cluster_labels[current_seed] == -1:
+                cluster_labels[current_seed] = cluster_id
+        cluster_id += 1
+    return cluster_labels
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+FLOCK_COLORS = ['#46cefb', '#ccf849', '#f2542d', '#9b5de5']
+
+
+def random_points(seed, n, num_frames, size):
+    # n points scattered over a size x size square, in frame order
+    rng = np.random.default_rng(seed)
+    coordinates = rng.uniform(0, size, (n, 2))
+    frames = np.sort(rng.integers(0, num_frames, n))
+    return coordinates, frames
+
+
+def moving_flocks(seed, num_frames, num_boids):
+    # Boids drifting around a few flock centres, as the simulation exports them
+    rng = np.random.default_rng(seed)
+    flock_ids = rng.integers(0, 4, num_boids)
+    centres = rng.uniform(0, 300, (4, 2))
+    positions = centres[flock_ids] + rng.normal(0, 15, (num_boids, 2))
+    colors = np.array(FLOCK_COLORS)[flock_ids]
+    frames = []
+    for frame in range(num_frames):
+        positions = positions + rng.normal(0, 2, positions.shape)
+        frames.append(pd.DataFrame({'frame': frame, 'boid_id': np.arange(num_boids), 'flock_id': flock_ids,
+                                    'x': positions[:, 0], 'y': positions[:, 1], 'vx': 0.0, 'vy': 0.0,
+                                    'color': colors}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_csv(data, tmp_path, name='boids.csv'):
+    # The loader derives its sidecar paths from the CSV path, so hand it a str
+    path = str(tmp_path / name)
+    data.to_csv(path, index=False)
+    return path
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+
+from flock_detection.batch_metrics import FrameTables, score_frames
+from flock_detection.metrics import apply_mapping, correct_mask, map_clusters_to_flocks, score_frame
+
+# (flock IDs, cluster labels) of one frame each
+DEGENERATE_FRAMES = {
+    'all_noise': ([0, 0, 1, 1, 2], [-1, -1, -1, -1, -1]),
+    'single_cluster': ([0, 0, 1, 1, 2], [0, 0, 0, 0, 0]),
+    'single_point': ([3], [0]),
+    'single_noise_point': ([3], [-1]),
+    'single_flock': ([5, 5, 5, 5], [0, 1, -1, 1]),
+    'single_flock_single_cluster': ([5, 5, 5], [2, 2, 2]),
+    'perfect': ([0, 0, 1, 1, 2, 2], [4, 4, 0, 0, 1, 1]),
+    'noise_and_one_cluster': ([0, 0, 1, 1], [-1, -1, 0, 0]),
+    'more_clusters_than_flocks': ([0, 0, 0, 1, 1, 1], [0, 1, 2, 3, 4, 5]),
+    'overlapping_ids': ([1, 1, 0, 0, 2], [0, 0, 1, 1, 2]),
+    'tied_mapping': ([0, 0, 1, 1], [0, 0, 0, 0]),
+}
+
+
+def random_frame(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 60))
+    return rng.integers(0, 4, n), rng.integers(-1, 6, n)
+
+
+def frame_cases():
+    cases = [pytest.param(*frame, id=name) for name, frame in DEGENERATE_FRAMES.items()]
+    return cases + [pytest.param(*random_frame(seed), id=f'random_{seed}') for seed in range(20)]
+
+
+@pytest.mark.parametrize('true_labels, cluster_labels', frame_cases())
+def test_raw_scores_match_sklearn(true_labels, cluster_labels):
+    ari, nmi = score_frames([0, len(true_labels)], true_labels, cluster_labels, 'raw')
+    assert ari[0] == pytest.approx(adjusted_rand_score(true_labels, cluster_labels), abs=1e-12)
+    assert nmi[0] == pytest.approx(normalized_mutual_info_score(true_labels, cluster_labels), abs=1e-12)
+
+
+@pytest.mark.parametrize('true_labels, cluster_labels', frame_cases())
+def test_mapped_scores_match_score_frame(true_labels, cluster_labels):
+    ari, nmi = score_frames([0, len(true_labels)], true_labels, cluster_labels, 'mapped')
+    expected_ari, expected_nmi = score_frame(np.asarray(true_labels), np.asarray(cluster_labels), 'mapped')
+    assert ari[0] == pytest.approx(expected_ari, abs=1e-12)
+    assert nmi[0] == pytest.approx(expected_nmi, abs=1e-12)
+
+
+@pytest.mark.parametrize('true_labels, cluster_labels', frame_cases())
+def test_mapping_matches_map_clusters_to_flocks(true_labels, cluster_labels):
+    true_labels, cluster_labels = np.asarray(true_labels), np.asarray(cluster_labels)
+    tables = FrameTables([0, len(true_labels)], true_labels, cluster_labels)
+    mapping = map_clusters_to_flocks(true_labels, cluster_labels)
+    np.testing.assert_array_equal(tables.mapped_labels(), apply_mapping(cluster_labels, mapping))
+    np.testing.assert_array_equal(tables.correct_mask(), correct_mask(true_labels, cluster_labels, mapping))
+
+
+@pytest.mark.parametrize('scoring', ['raw', 'mapped'])
+def test_frames_scored_together_as_alone(scoring):
+    # Batching pads each frame's table to the widest frame; the scores must not change
+    frames = list(DEGENERATE_FRAMES.values()) + [random_frame(seed) for seed in range(20)]
+    offsets = np.cumsum([0] + [len(true_labels) for true_labels, _ in frames])
+    true_labels = np.concatenate([np.asarray(true, dtype=np.int64) for true, _ in frames])
+    cluster_labels = np.concatenate([np.asarray(labels, dtype=np.int64) for _, labels in frames])
+    ari, nmi = score_frames(offsets, true_labels, cluster_labels, scoring)
+    for k, (true, labels) in enumerate(frames):
+        alone = score_frames([0, len(true)], true, labels, scoring)
+        assert (ari[k], nmi[k]) == (alone[0][0], alone[1][0])
+
+
+def test_counts():
+    tables = FrameTables([0, 5, 5 + 3], [0, 0, 1, 1, 2, 7, 7, 7], [-1, 0, 0, 1, -1, 3, 3, -1])
+    np.testing.assert_array_equal(tables.num_clusters, [2, 1])
+    np.testing.assert_allclose(tables.noise_fractions(), [2 / 5, 1 / 3])
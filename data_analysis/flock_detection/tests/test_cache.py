@@ -0,0 +1,88 @@
+import dataclasses
+import itertools
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from flock_detection import cache as cache_module
+from flock_detection import pipeline
+from flock_detection.cache import AnalysisCache
+from flock_detection.frames import FrameIndex
+from flock_detection.pipeline import PipelineConfig, run_pipeline
+from flock_detection.tests.helpers import moving_flocks
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with AnalysisCache(str(tmp_path / 'cache' / 'analysis.sqlite')) as cache:
+        yield cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Each call to time.time() in the cache is one second later, so the LRU order is exact
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(cache_module, 'time', types.SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("recomputed an entry the cache holds")
+
+
+def test_put_get_round_trip(cache):
+    arrays = {'labels': np.array([3, -1, 0], dtype=np.int32), 'row': np.linspace(0, 1, 6).reshape(2, 3)}
+    cache.put('a', arrays, 'labels')
+    assert 'a' in cache and 'b' not in cache and len(cache) == 1
+    stored = cache.get('a')
+    assert sorted(stored) == ['labels', 'row']
+    for name, values in arrays.items():
+        assert stored[name].dtype == values.dtype
+        np.testing.assert_array_equal(stored[name], values)
+    assert cache.get('b') is None
+    cache.put('a', {'labels': np.arange(4)}, 'labels')
+    np.testing.assert_array_equal(cache.get('a')['labels'], np.arange(4))
+    assert len(cache) == 1
+    assert cache.stats()['kinds'] == {'labels': {'entries': 1, 'bytes': cache.nbytes()}}
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_get_many_refreshes_lru_order(cache, clock):
+    for key in 'abcd':
+        cache.put(key, {'values': np.full(100, ord(key))})
+    assert set(cache.get_many(['b', 'missing'])) == {'b'}
+    size = cache.nbytes() // 4
+    assert cache.evict(3 * size) == 1
+    assert 'a' not in cache
+    assert cache.evict(2 * size) == 1
+    assert 'c' not in cache
+    assert cache.evict(size) == 1
+    assert list(cache.get_many(['b', 'd'])) == ['b']
+
+
+def test_put_evicts_to_max_bytes(tmp_path, clock):
+    with AnalysisCache(str(tmp_path / 'analysis.sqlite'), max_bytes=1) as cache:
+        cache.put('a', {'values': np.arange(10)})
+        assert len(cache) == 0
+
+
+@pytest.mark.parametrize('config', [PipelineConfig(), PipelineConfig(algorithm='st_dbscan', eps_space=12.0)])
+def test_second_run_is_served_from_cache(config, cache, monkeypatch):
+    index = FrameIndex(moving_flocks(0, 40, 30))
+    expected = run_pipeline(index, config, workers=1)
+    pd.testing.assert_frame_equal(run_pipeline(index, config, workers=1, cache=cache), expected)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(pipeline, 'label_frames', fail)
+        patch.setattr(pipeline, 'score_frames', fail)
+        hits = cache.hits
+        pd.testing.assert_frame_equal(run_pipeline(index, config, workers=1, cache=cache), expected)
+        assert cache.hits - hits == len(index)
+
+    # Only the scoring changed, so the labels are reused and just rescored
+    mapped = dataclasses.replace(config, scoring='mapped')
+    with monkeypatch.context() as patch:
+        patch.setattr(pipeline, 'label_frames', fail)
+        cached = run_pipeline(index, mapped, workers=1, cache=cache)
+    pd.testing.assert_frame_equal(cached, run_pipeline(index, mapped, workers=1))
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from flock_detection.chunked import frame_chunks, run_chunked
+from flock_detection.frames import FrameIndex
+from flock_detection.loader import load_dataset, read_sidecar
+from flock_detection.pipeline import PipelineConfig, run_pipeline
+from flock_detection.tests.helpers import moving_flocks, write_csv
+
+
+def batches_of(data, batch_rows):
+    return [data.iloc[start:start + batch_rows] for start in range(0, len(data), batch_rows)]
+
+
+@pytest.mark.parametrize('engine', ['sklearn', 'grid'])
+def test_run_chunked_matches_run_pipeline(engine, tmp_path):
+    path = write_csv(moving_flocks(0, 50, 40), tmp_path)
+    config = PipelineConfig(engine=engine)
+    expected = run_pipeline(FrameIndex(load_dataset(path, sidecar=False)), config, workers=1)
+    for sidecar in (False, True):
+        if sidecar:
+            load_dataset(path)
+            assert read_sidecar(path) is not None
+        done = []
+        metrics = run_chunked(path, config, chunk_rows=130, workers=1, sidecar=sidecar,
+                              progress=lambda frames, rows: done.append((frames, rows)))
+        pd.testing.assert_frame_equal(metrics, expected)
+        assert len(done) > 5 and done[-1] == (50, 50 * 40)
+
+
+def test_frame_larger_than_chunk_rows():
+    frames = np.repeat([0, 1, 2, 3], [3, 50, 2, 9])
+    data = pd.DataFrame({'frame': frames, 'x': np.arange(len(frames), dtype=np.float32)})
+    chunks = list(frame_chunks(batches_of(data, 7), chunk_rows=10))
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), data)
+    # Every frame is in a single chunk, including the one with more rows than chunk_rows
+    seen = [set(chunk['frame'].tolist()) for chunk in chunks]
+    assert [frame for frame in range(4) if sum(frame in chunk for chunk in seen) != 1] == []
+    # and a chunk overshoots chunk_rows by at most one batch beyond that frame
+    assert max(len(chunk) for chunk in chunks) <= 50 + 7
+
+
+@pytest.mark.parametrize('batch_rows', [4, 100])
+def test_unsorted_frames_raise(batch_rows, tmp_path):
+    data = pd.DataFrame({'frame': [0, 0, 1, 1, 2, 2, 1, 3], 'x': np.zeros(8)})
+    with pytest.raises(ValueError):
+        list(frame_chunks(batches_of(data, batch_rows), chunk_rows=3))
+    shuffled = moving_flocks(0, 10, 10).sample(frac=1, random_state=0)
+    path = write_csv(shuffled, tmp_path)
+    with pytest.raises(ValueError):
+        run_chunked(path, PipelineConfig(), chunk_rows=batch_rows, workers=1)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from sklearn.cluster import DBSCAN
+
+from flock_detection.grid_dbscan import grid_dbscan, same_clustering
+
+
+def sklearn_labels(X, eps, min_samples):
+    return DBSCAN(eps=eps, min_samples=min_samples).fit(X).labels_
+
+
+@pytest.mark.parametrize('dims', [1, 2, 3, 4])
+@pytest.mark.parametrize('seed', range(15))
+def test_matches_sklearn(dims, seed):
+    rng = np.random.default_rng(100 * dims + seed)
+    X = rng.normal(size=(int(rng.integers(1, 300)), dims))
+    if seed % 3 == 0:
+        X = np.round(X, 1)  # Duplicate points and pairs at exactly eps
+    eps = float(rng.uniform(0.1, 0.8))
+    min_samples = int(rng.integers(1, 10))
+    np.testing.assert_array_equal(grid_dbscan(X, eps, min_samples), sklearn_labels(X, eps, min_samples))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_groups_match_sklearn_per_group(seed):
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(0, 80, 6)
+    groups = np.repeat(np.arange(6) * 7, sizes)
+    X = rng.normal(size=(len(groups), 2))
+    labels = grid_dbscan(X, 0.4, 4, groups=groups)
+    for group in np.unique(groups):
+        rows = groups == group
+        np.testing.assert_array_equal(labels[rows], sklearn_labels(X[rows], 0.4, 4))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_border_point_between_two_clusters(seed):
+    # The point at 0 has too few neighbours to be core, but it is next to a
+    # core point of each cluster; sklearn puts it in the lower-numbered one
+    line = np.array([-2.0, -1.8, -1.6, -0.9, 0.0, 0.9, 1.6, 1.8, 2.0])
+    X = np.column_stack((line, np.zeros_like(line)))[np.random.default_rng(seed).permutation(len(line))]
+    expected = sklearn_labels(X, 1.0, 4)
+    assert len(set(expected.tolist())) == 2 and -1 not in expected
+    np.testing.assert_array_equal(grid_dbscan(X, 1.0, 4), expected)
+
+
+def test_noise_and_empty():
+    X = np.arange(10, dtype=np.float64)[:, None] * 10
+    np.testing.assert_array_equal(grid_dbscan(X, 1.0, 2), np.full(10, -1))
+    assert grid_dbscan(np.empty((0, 2)), 0.5, 5).shape == (0,)
+
+
+def test_same_clustering():
+    assert same_clustering([0, 0, 1, -1], [1, 1, 0, -1])
+    assert not same_clustering([0, 0, 1, -1], [0, 1, 1, -1])
+    assert not same_clustering([0, 0, 1, -1], [0, 0, 1, 1])
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import DBSCAN
+from sklearn.preprocessing import StandardScaler
+
+from flock_detection.frames import FrameIndex
+from flock_detection.grid_search import SEARCH_COLUMNS, NeighbourGraph, grid_search
+from flock_detection.metrics import score_frame
+from flock_detection.tests.helpers import moving_flocks
+
+
+def per_frame_search(data, eps_values, min_samples_values, scoring):
+    # The search as the notebook would run it: DBSCAN and score_frame() on each frame, then means over the frames
+    rows = []
+    for eps in eps_values:
+        for min_samples in min_samples_values:
+            scores = []
+            for _, frame_data in data.groupby('frame'):
+                X = StandardScaler().fit_transform(frame_data[['x', 'y']])
+                labels = DBSCAN(eps=eps, min_samples=min_samples).fit(X).labels_
+                ari, nmi = score_frame(frame_data['flock_id'].to_numpy(), labels, scoring)
+                scores.append((ari, nmi, len(set(labels.tolist()) - {-1}), np.mean(labels == -1)))
+            rows.append((eps, min_samples, *np.mean(scores, axis=0)))
+    return pd.DataFrame(rows, columns=SEARCH_COLUMNS)
+
+
+@pytest.mark.parametrize('scoring', ['raw', 'mapped'])
+def test_matches_per_frame_dbscan(scoring):
+    data = moving_flocks(3, 25, 60)
+    results = grid_search(data, [0.5, 0.2], [5, 3], scoring=scoring, workers=1)
+    expected = per_frame_search(data, [0.2, 0.5], [3, 5], scoring)
+    pd.testing.assert_frame_equal(results, expected, check_exact=False, rtol=1e-9, atol=1e-12)
+
+
+def test_num_edges_above_max_eps():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(50, 2))
+    graph = NeighbourGraph(X, np.array([0, 20, 50]), 0.5)
+    assert graph.num_edges(0.5) == len(graph)
+    assert graph.num_edges(0.2) <= len(graph)
+    with pytest.raises(ValueError):
+        graph.num_edges(0.6)
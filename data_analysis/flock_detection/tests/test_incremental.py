@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from flock_detection import incremental
+from flock_detection.chunked import run_chunked
+from flock_detection.frames import FrameIndex
+from flock_detection.incremental import IncrementalSTDBSCAN, number_clusters
+from flock_detection.pipeline import PipelineConfig, run_pipeline
+from flock_detection.st_dbscan import st_dbscan_arrays
+from flock_detection.tests.helpers import moving_flocks, random_points
+
+
+def stream(clusterer, coordinates, frames):
+    emitted = []
+    for frame in np.unique(frames).tolist():
+        emitted.extend(clusterer.add_frame(frame, coordinates[frames == frame]))
+    emitted.extend(clusterer.flush())
+    return emitted
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # Drops points as soon as possible, so the tests go through the compaction
+    monkeypatch.setattr(incremental, '_COMPACT_MIN', 8)
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_resolved_labels_match_batch(seed, small_batches):
+    rng = np.random.default_rng(2000 + seed)
+    coordinates, frames = random_points(seed, int(rng.integers(1, 400)), int(rng.integers(1, 40)), 50.0)
+    eps_space = float(rng.uniform(3, 12))
+    eps_time = int(rng.integers(0, 4))
+    min_samples = int(rng.integers(1, 8))
+    expected = st_dbscan_arrays(coordinates, frames, eps_space, eps_time, min_samples)
+    clusterer = IncrementalSTDBSCAN(eps_space, eps_time, min_samples)
+    emitted = stream(clusterer, coordinates, frames)
+    assert [frame for frame, _ in emitted] == np.unique(frames).tolist()
+    labels = np.concatenate([frame_labels for _, frame_labels in emitted])
+    np.testing.assert_array_equal(clusterer.final_labels(), expected)
+    np.testing.assert_array_equal(number_clusters(clusterer.resolve(labels)), expected)
+    # Any increasing subset of the points resolves the same way
+    points = np.flatnonzero(rng.random(len(labels)) < 0.5)
+    np.testing.assert_array_equal(clusterer.resolve(labels[points], points), clusterer.resolve(labels)[points])
+
+
+def test_state_stays_bounded():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(0, 200, (300, 2))
+    clusterer = IncrementalSTDBSCAN(5.0, 2, 4, keep_history=False)
+    largest = 0
+    for frame in range(1500):
+        positions = positions + rng.normal(0, 1, positions.shape)
+        clusterer.add_frame(frame, positions)
+        largest = max(largest, clusterer._parent.size)
+    clusterer.flush()
+    assert clusterer.num_points == 450_000
+    assert largest < 2 * incremental._COMPACT_MIN + 10 * 300
+
+
+def test_number_clusters():
+    np.testing.assert_array_equal(number_clusters([7, -1, 3, 7, 12, -1]), [1, -1, 0, 1, 2, -1])
+    np.testing.assert_array_equal(number_clusters([]), [])
+
+
+def test_final_labels_need_flush():
+    clusterer = IncrementalSTDBSCAN(5.0, 1, 2)
+    clusterer.add_frame(0, np.zeros((3, 2)))
+    with pytest.raises(RuntimeError):
+        clusterer.final_labels()
+
+
+@pytest.mark.parametrize('scoring', ['mapped', 'raw'])
+@pytest.mark.parametrize('eps_time', [1, 3])
+def test_stream_scope_scores_like_trajectory(scoring, eps_time, tmp_path, small_batches):
+    data = moving_flocks(eps_time, 60, 80)
+    path = tmp_path / 'boids.csv'
+    data.to_csv(path, index=False)
+    settings = dict(algorithm='st_dbscan', eps_space=12.0, eps_time=eps_time, min_samples=5, scoring=scoring)
+    expected = run_pipeline(FrameIndex(data), PipelineConfig(st_scope='trajectory', **settings), workers=1)
+    stream_config = PipelineConfig(st_scope='stream', **settings)
+    pd.testing.assert_frame_equal(run_pipeline(FrameIndex(data), stream_config, workers=1), expected)
+    chunked = run_chunked(path, stream_config, chunk_rows=700, sidecar=False)
+    pd.testing.assert_frame_equal(chunked, expected)
@@ -0,0 +1,89 @@
+import os
+
+import pandas as pd
+import pytest
+
+from flock_detection import loader
+from flock_detection.loader import SIDECAR_DTYPES, iter_batches, load_dataset, read_sidecar, sidecar_path
+from flock_detection.tests.helpers import moving_flocks, write_csv
+
+
+@pytest.fixture(params=['parquet', 'npy'])
+def sidecar_format(request, monkeypatch):
+    # Runs a test against the Parquet sidecar and the .npy one pyarrow-less installs use
+    if request.param == 'parquet' and loader.pq is None:
+        pytest.skip("pyarrow is not installed")
+    if request.param == 'npy':
+        monkeypatch.setattr(loader, 'pq', None)
+    return request.param
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return write_csv(moving_flocks(0, 30, 20), tmp_path)
+
+
+def from_csv(path):
+    # The dataset parsed straight from the CSV, with the dtypes a sidecar load returns
+    return load_dataset(path, sidecar=False).astype(SIDECAR_DTYPES)
+
+
+def test_sidecar_round_trip(dataset, sidecar_format):
+    expected = from_csv(dataset)
+    assert read_sidecar(dataset) is None
+    pd.testing.assert_frame_equal(load_dataset(dataset), expected)
+    assert os.path.exists(sidecar_path(dataset))
+    assert sidecar_path(dataset).endswith('.parquet' if sidecar_format == 'parquet' else '.columns')
+    pd.testing.assert_frame_equal(read_sidecar(dataset), expected)
+    pd.testing.assert_frame_equal(load_dataset(dataset), expected)
+
+
+def test_sidecar_rebuilt_when_csv_size_changes(dataset, tmp_path, sidecar_format):
+    load_dataset(dataset)
+    write_csv(moving_flocks(1, 35, 20), tmp_path)
+    assert read_sidecar(dataset) is None
+    expected = from_csv(dataset)
+    assert len(expected) == 35 * 20
+    pd.testing.assert_frame_equal(load_dataset(dataset), expected)
+    pd.testing.assert_frame_equal(read_sidecar(dataset), expected)
+
+
+def test_sidecar_rebuilt_when_csv_mtime_changes(dataset, sidecar_format):
+    load_dataset(dataset)
+    stat = os.stat(dataset)
+    os.utime(dataset, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert read_sidecar(dataset) is None
+    pd.testing.assert_frame_equal(load_dataset(dataset), from_csv(dataset))
+    assert read_sidecar(dataset) is not None
+
+
+@pytest.mark.parametrize('sidecar', [True, False])
+def test_columns_and_frames_without_frame_column(dataset, sidecar, sidecar_format):
+    full = from_csv(dataset)
+    rows = (full['frame'] >= 5) & (full['frame'] < 12)
+    expected = full.loc[rows, ['x', 'color']].reset_index(drop=True)
+    if not sidecar:
+        expected = expected.astype({'color': 'str'})
+    # The first load reads the CSV (and builds the sidecar), the second one reads the sidecar
+    for _ in range(2):
+        data = load_dataset(dataset, columns=['x', 'color'], frames=(5, 12), sidecar=sidecar)
+        assert list(data.columns) == ['x', 'color']
+        pd.testing.assert_frame_equal(data, expected)
+    assert os.path.exists(sidecar_path(dataset)) == sidecar
+
+
+@pytest.mark.parametrize('columns', [None, ['frame', 'y', 'color']])
+def test_iter_batches(dataset, columns, sidecar_format):
+    expected = from_csv(dataset)
+    if columns is not None:
+        expected = expected[columns]
+    for built in (False, True):
+        if built:
+            load_dataset(dataset)
+        batches = list(iter_batches(dataset, columns=columns, batch_rows=130))
+        assert [len(batch) for batch in batches] == [130] * 4 + [80]
+        data = pd.concat(batches, ignore_index=True)
+        if not built:
+            # Each CSV batch has the categories of its own rows
+            data = data.astype({'color': 'str'}).astype({'color': 'category'})
+        pd.testing.assert_frame_equal(data, expected)
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from flock_detection.st_dbscan import st_dbscan, st_dbscan_arrays, st_dbscan_reference
+from flock_detection.tests.helpers import random_points
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_matches_reference(seed):
+    rng = np.random.default_rng(1000 + seed)
+    coordinates, frames = random_points(seed, int(rng.integers(1, 120)), int(rng.integers(1, 6)), 50.0)
+    eps_space = float(rng.uniform(3, 15))
+    eps_time = int(rng.integers(0, 3))
+    min_samples = int(rng.integers(1, 8))
+    expected = st_dbscan_reference(coordinates, frames, eps_space, eps_time, min_samples)
+    labels = st_dbscan_arrays(coordinates, frames, eps_space, eps_time, min_samples)
+    np.testing.assert_array_equal(labels, expected)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_single_frame(seed):
+    coordinates, _ = random_points(seed, 80, 1, 40.0)
+    frames = np.zeros(len(coordinates), dtype=np.int64)
+    expected = st_dbscan_reference(coordinates, frames, 6.0, 1, 4)
+    np.testing.assert_array_equal(st_dbscan_arrays(coordinates, frames, 6.0, 1, 4), expected)
+
+
+def test_noise_only():
+    coordinates, frames = random_points(0, 60, 3, 1000.0)
+    labels = st_dbscan_arrays(coordinates, frames, 1.0, 1, 3)
+    np.testing.assert_array_equal(labels, np.full(60, -1))
+    np.testing.assert_array_equal(labels, st_dbscan_reference(coordinates, frames, 1.0, 1, 3))
+
+
+def test_empty():
+    labels = st_dbscan_arrays(np.empty((0, 2)), np.empty(0, dtype=np.int64), 5.0, 1, 3)
+    assert labels.shape == (0,)
+
+
+def test_rows_in_any_frame_order():
+    coordinates, frames = random_points(3, 100, 4, 30.0)
+    expected = st_dbscan_reference(coordinates, frames, 5.0, 1, 4)
+    # Frames in reverse order; rows of the same frame keep their order, so they are visited in the same order
+    shuffled = np.lexsort((np.arange(len(frames)), -frames))
+    data = pd.DataFrame({'x': coordinates[shuffled, 0], 'y': coordinates[shuffled, 1], 'frame': frames[shuffled]})
+    np.testing.assert_array_equal(st_dbscan(data, 5.0, 1, 4), expected[shuffled])